@@ -47,6 +47,7 @@ struct ProcessCPUData {
 struct ProcessCacheData {
     ProcessCPUData cpuData;
     std::wstring name;
+    ULONGLONG creationTime;     // Время создания процесса (FILETIME), 0 - неизвестно
     ULONGLONG lastUpdateTime;
     size_t memoryUsage;
     double diskReadRate;
@@ -128,6 +129,7 @@ public:
 
 // Глобальные переменные
 static std::unordered_map<DWORD, ProcessCacheData> processCache;
+static std::unordered_map<DWORD, std::pair<IO_COUNTERS, ULONGLONG>> lastIoCounters;
 static DWORD numProcessors = 0;
 static const ULONGLONG CACHE_TIMEOUT = 1000; // 1 секунда
 static std::mutex cacheMutex;
@@ -169,6 +171,24 @@ void UpdateProcessData(DWORD processID, ProcessCacheData& cacheEntry) {
         if (!hProcess) return;
     }
 
+    // PID мог достаться новому процессу: сверяем время создания и
+    // сбрасываем имя и базу для расчета скоростей прежнего владельца PID
+    FILETIME now, creation, exit, kernel, user;
+    BOOL haveTimes = GetProcessTimes(hProcess, &creation, &exit, &kernel, &user);
+    if (haveTimes) {
+        ULONGLONG creationTime = *((PULONGLONG)&creation);
+        if (cacheEntry.creationTime != creationTime) {
+            if (cacheEntry.creationTime != 0) {
+                cacheEntry.name.clear();
+                cacheEntry.cpuData = {};
+                cacheEntry.diskReadRate = cacheEntry.diskWriteRate = 0.0;
+                cacheEntry.networkSent = cacheEntry.networkReceived = 0.0;
+                lastIoCounters.erase(processID);
+            }
+            cacheEntry.creationTime = creationTime;
+        }
+    }
+
     // Обновляем имя процесса
     if (cacheEntry.name.empty()) {
         WCHAR szProcessPath[MAX_PATH];
@@ -192,10 +212,9 @@ void UpdateProcessData(DWORD processID, ProcessCacheData& cacheEntry) {
     }
 
     // Улучшенный расчет CPU
-    FILETIME now, creation, exit, kernel, user;
     GetSystemTimeAsFileTime(&now);
 
-    if (GetProcessTimes(hProcess, &creation, &exit, &kernel, &user)) {
+    if (haveTimes) {
         ULONGLONG time = *((PULONGLONG)&now);
         ULONGLONG kernelTime = *((PULONGLONG)&kernel);
         ULONGLONG userTime = *((PULONGLONG)&user);
@@ -227,7 +246,6 @@ void UpdateProcessData(DWORD processID, ProcessCacheData& cacheEntry) {
     IO_COUNTERS ioCounters;
     if (GetProcessIoCounters(hProcess, &ioCounters)) {
         ULONGLONG currentTime = GetTickCount64();
-        static std::unordered_map<DWORD, std::pair<IO_COUNTERS, ULONGLONG>> lastIoCounters;
         
         auto it = lastIoCounters.find(processID);
         if (it != lastIoCounters.end()) {
@@ -293,6 +311,18 @@ ProcessInfo ProcessMonitor::GetProcessInfo(DWORD processID) {
     return info;
 }
 
+ULONGLONG ProcessMonitor::GetProcessStartTime(DWORD processID) {
+    std::lock_guard<std::mutex> lock(cacheMutex);
+    auto it = processCache.find(processID);
+    return it != processCache.end() ? it->second.creationTime : 0;
+}
+
+void ProcessMonitor::ReleaseProcess(DWORD processID) {
+    std::lock_guard<std::mutex> lock(cacheMutex);
+    processCache.erase(processID);
+    lastIoCounters.erase(processID);
+}
+
 // Экспортируемая функция
 extern "C" DLL2_API ProcessInfo __stdcall GetProcessInfo(DWORD processID) {
     // Повышаем привилегии при каждом вызове для максимальной надежности
@@ -302,4 +332,20 @@ extern "C" DLL2_API ProcessInfo __stdcall GetProcessInfo(DWORD processID) {
         g_monitor = new ProcessMonitor();
     }
     return g_monitor->GetProcessInfo(processID);
+}
+
+// Время создания процесса (FILETIME) из кэша, 0 - еще неизвестно.
+// Вместе с PID однозначно определяет процесс при повторном использовании PID
+extern "C" DLL2_API ULONGLONG __stdcall GetProcessStartTime(DWORD processID) {
+    if (!g_monitor) {
+        return 0;
+    }
+    return g_monitor->GetProcessStartTime(processID);
+}
+
+// Удаляет из кэша данные завершившегося процесса
+extern "C" DLL2_API void __stdcall ReleaseProcess(DWORD processID) {
+    if (g_monitor) {
+        g_monitor->ReleaseProcess(processID);
+    }
 }
\ No newline at end of file
@@ -8,6 +8,8 @@ public:
     ProcessMonitor();
     ~ProcessMonitor();
     ProcessInfo GetProcessInfo(DWORD processID);
+    ULONGLONG GetProcessStartTime(DWORD processID);
+    void ReleaseProcess(DWORD processID);
 
 private:
     ProcessMonitor(const ProcessMonitor&) = delete;
@@ -19,8 +21,10 @@ private:
 extern "C" {
 #endif
 
-// Экспортируемая функция
+// Экспортируемые функции
 DLL2_API ProcessInfo __stdcall GetProcessInfo(DWORD processID);
+DLL2_API ULONGLONG __stdcall GetProcessStartTime(DWORD processID);
+DLL2_API void __stdcall ReleaseProcess(DWORD processID);
 
 #ifdef __cplusplus
 }
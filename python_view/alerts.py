@@ -0,0 +1,496 @@
+"""Правила оповещений, проверяемые на каждом снимке метрик.
+
+Правило записывается одной строкой:
+
+    [имя:] process.<колонка> <оп> <порог> [for <длительность>]
+    [имя:] system.<поле> [avg|min|max] <оп> <порог> [for <длительность>]
+
+например "cpu_hot: process.cpu > 80 for 30s" или
+"system.memory.percent > 90 for 2m". Оп - один из >, >=, <, <=; порог
+может иметь множитель K, M, G (степени 1024), длительность - s, m, h.
+
+Условие "for" выполнено, если значение нарушает порог во всех выборках
+скользящего окна длительностью duration, то есть минимум (для > и >=) или
+максимум (для < и <=) по окну нарушает порог. Такой агрегат сводится к
+одному числу - времени начала текущего нарушения, - которое обновляется за
+O(1) на выборку. Для системных полей доступны и явные агрегаты по окну
+(avg, min, max) на монотонных очередях, тоже за амортизированное O(1).
+
+Для правил процессов состояние хранится по паре (правило, PID) и только
+для процессов, нарушающих порог. Правила одной колонки и одного
+направления порога упорядочены по порогу, так что нарушенные процессом
+правила - префикс этого порядка, а его длина находится бинарным поиском.
+На такте проверяются только процессы из дельты снимка: у каждого
+сравнивается длина префикса с прежней, и состояние меняется лишь у правил
+между ними. Ожидающие срабатывания нарушения стоят в очереди по времени
+начала. Стоимость такта растет с размером дельты и числом переходов, а
+не с произведением числа правил на число процессов. Если дельта не
+применима (пропущено поколение), снимок проверяется целиком.
+"""
+import re
+import sys
+import time
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import islice
+
+from diagnostics import debug_print, trace
+from process_table import DERIVED_COLUMNS, NUMERIC_COLUMNS
+
+
+FIRING = 'firing'
+RESOLVED = 'resolved'
+
+_OPERATORS = ('>', '>=', '<', '<=')
+_AGGREGATES = ('avg', 'min', 'max')
+_MULTIPLIERS = {'': 1.0, 'K': 1024.0, 'M': 1024.0 ** 2, 'G': 1024.0 ** 3}
+_SECONDS = {'': 1.0, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+_RULE_RE = re.compile(
+    r'^(?:(?P<name>[\w.-]+)\s*:\s*)?'
+    r'(?P<scope>process|system)\.(?P<metric>[\w.]+)\s+'
+    r'(?:(?P<aggregate>avg|min|max)\s+)?'
+    r'(?P<op>>=|<=|>|<)\s*(?P<threshold>-?\d+(?:\.\d+)?)\s*(?P<multiplier>[KMG]?)B?%?'
+    r'(?:\s+for\s+(?P<duration>\d+(?:\.\d+)?)\s*(?P<unit>[smh]?))?\s*$'
+)
+
+
+def _breaks(op, value, threshold) -> bool:
+    if op == '>':
+        return value > threshold
+    if op == '>=':
+        return value >= threshold
+    if op == '<':
+        return value < threshold
+    return value <= threshold
+
+
+class AlertRule:
+    """Правило оповещения"""
+
+    __slots__ = ('name', 'scope', 'metric', 'op', 'threshold', 'duration', 'aggregate', 'text')
+
+    def __init__(self, name, scope, metric, op, threshold, duration=0.0, aggregate=None, text=''):
+        if op not in _OPERATORS:
+            raise ValueError(f"Неизвестный оператор: {op}")
+        if aggregate is not None and (aggregate not in _AGGREGATES or scope != 'system'):
+            raise ValueError(f"Агрегат {aggregate} доступен только для системных полей")
+        if scope == 'process' and metric not in NUMERIC_COLUMNS and metric not in DERIVED_COLUMNS:
+            raise ValueError(f"Нет числовой колонки процессов {metric}")
+        self.name = name
+        self.scope = scope          # 'process' или 'system'
+        self.metric = metric        # Колонка снимка процессов или поле снимка (memory.percent)
+        self.op = op
+        self.threshold = float(threshold)
+        self.duration = duration    # Секунды
+        self.aggregate = aggregate  # None - порог нарушен во всех выборках окна
+        self.text = text or f"{scope}.{metric} {op} {threshold:g} for {duration:g}s"
+
+    @classmethod
+    def parse(cls, text):
+        """Правило из строки; ValueError, если строка не разобрана"""
+        match = _RULE_RE.match(text.strip())
+        if match is None:
+            raise ValueError(f"Не удалось разобрать правило: {text!r}")
+        threshold = float(match['threshold']) * _MULTIPLIERS[match['multiplier']]
+        duration = float(match['duration'] or 0) * _SECONDS[match['unit'] or '']
+        body = text.split(':', 1)[1].strip() if match['name'] else text.strip()
+        return cls(
+            match['name'] or f"{match['scope']}.{match['metric']}", match['scope'], match['metric'], match['op'],
+            threshold, duration, match['aggregate'], body
+        )
+
+    def __repr__(self):
+        return f"AlertRule({self.name!r}, {self.text!r})"
+
+
+class AlertEvent:
+    """Срабатывание или снятие оповещения"""
+
+    __slots__ = ('rule', 'state', 'timestamp', 'pid', 'process_name', 'value')
+
+    def __init__(self, rule, state, timestamp, pid=None, process_name=None, value=None):
+        self.rule = rule
+        self.state = state                # FIRING или RESOLVED
+        self.timestamp = timestamp
+        self.pid = pid                    # None - системное правило
+        self.process_name = process_name
+        self.value = value                # None - процесс завершился
+
+    def describe(self) -> str:
+        """Текст оповещения без времени"""
+        subject = f"{self.process_name} (PID {self.pid})" if self.pid is not None else "система"
+        if self.state == FIRING:
+            return f"{self.rule.name}: {subject}, значение {self.value:g} ({self.rule.text})"
+        if self.value is None:
+            return f"{self.rule.name}: {subject} завершился"
+        return f"{self.rule.name}: {subject} в норме"
+
+    def log_line(self) -> str:
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.timestamp))
+        return f"{stamp} {self.state.upper()} {self.describe()}\n"
+
+
+class SlidingWindow:
+    """Скользящее окно (время, значение) длительностью duration секунд
+    с агрегатами avg, min и max за амортизированное O(1) на выборку"""
+
+    def __init__(self, duration):
+        self.duration = duration
+        self._samples = deque()
+        self._sum = 0.0
+        self._min = deque()  # Кандидаты в минимум: значения по возрастанию
+        self._max = deque()  # Кандидаты в максимум: значения по убыванию
+
+    def push(self, timestamp, value):
+        samples = self._samples
+        samples.append((timestamp, value))
+        self._sum += value
+        while self._min and self._min[-1][1] > value:
+            self._min.pop()
+        self._min.append((timestamp, value))
+        while self._max and self._max[-1][1] < value:
+            self._max.pop()
+        self._max.append((timestamp, value))
+        # Выборки старше окна выбывают; самая старая внутри окна остается
+        horizon = timestamp - self.duration
+        while len(samples) > 1 and samples[1][0] <= horizon:
+            old_time, old_value = samples.popleft()
+            self._sum -= old_value
+            if self._min[0][0] == old_time:
+                self._min.popleft()
+            if self._max[0][0] == old_time:
+                self._max.popleft()
+
+    def full(self, timestamp) -> bool:
+        """Покрывают ли выборки все окно"""
+        return bool(self._samples) and timestamp - self._samples[0][0] >= self.duration
+
+    def value(self, aggregate) -> float:
+        if aggregate == 'avg':
+            return self._sum / len(self._samples)
+        if aggregate == 'min':
+            return self._min[0][1]
+        return self._max[0][1]
+
+
+def system_value(snapshot, metric):
+    """Поле снимка по пути вида memory.percent; None, если поля нет"""
+    head, _, key = metric.partition('.')
+    value = getattr(snapshot, head, None)
+    if key:
+        value = value.get(key) if value is not None else None
+    return value if isinstance(value, (int, float)) else None
+
+
+class _SystemState:
+    __slots__ = ('window', 'since', 'fired')
+
+    def __init__(self, rule):
+        self.window = SlidingWindow(rule.duration) if rule.aggregate else None
+        self.since = None   # Время начала текущего нарушения
+        self.fired = False
+
+
+class _SumColumn:
+    """Производная колонка, вычисляемая по строке без построения массива"""
+
+    __slots__ = ('first', 'second')
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def __getitem__(self, row):
+        return self.first[row] + self.second[row]
+
+
+def _column(table, metric, whole):
+    """Колонка снимка; производная строится целиком, только если нужна вся (whole)"""
+    if whole or metric not in DERIVED_COLUMNS:
+        return table.column(metric)
+    first, second = DERIVED_COLUMNS[metric]
+    return _SumColumn(getattr(table, first), getattr(table, second))
+
+
+class _ProcessRuleGroup:
+    """Правила процессов одной колонки и одного направления порога.
+
+    Правила упорядочены так, что нарушенные значением - всегда префикс:
+    для < и <= порог сравнивается с обратным знаком, а при равных порогах
+    нестрогие правила идут раньше строгих. Состояние правил хранится в
+    списках, выровненных с rules.
+    """
+
+    __slots__ = ('metric', 'sign', 'rules', 'keys', 'strict', 'state', 'since', 'pending', 'fired')
+
+    def __init__(self, metric, sign, rules):
+        self.metric = metric
+        self.sign = sign    # 1 - правила > и >=, -1 - правила < и <=
+        self.rules = sorted(rules, key=lambda rule: (sign * rule.threshold, rule.op in ('>', '<')))
+        self.keys = [sign * rule.threshold for rule in self.rules]
+        self.strict = [rule.op in ('>', '<') for rule in self.rules]
+        self.state = {}     # PID -> (число нарушенных правил, значение); только нарушающие
+        self.since = [{} for _ in self.rules]      # {pid: время начала нарушения}
+        self.pending = [deque() for _ in self.rules]  # (время начала, pid) до срабатывания
+        self.fired = [{} for _ in self.rules]      # {pid: имя процесса} сработавших
+
+    def level(self, value) -> int:
+        """Число правил группы, нарушенных значением"""
+        value *= self.sign
+        keys = self.keys
+        if value < keys[0]:
+            return 0
+        count = bisect_left(keys, value)
+        # При пороге, равном значению, нарушены только нестрогие правила
+        for strict in islice(self.strict, count, bisect_right(keys, value, count)):
+            if strict:
+                break
+            count += 1
+        return count
+
+    def reached(self, values) -> bool:
+        """Нарушает ли хоть одно значение колонки самое мягкое правило"""
+        if not values:
+            return False
+        if self.sign > 0:
+            return max(values) >= self.keys[0]
+        return min(values) <= -self.keys[0]
+
+    def candidates(self, values, rows=None) -> list:
+        """Строки rows (None - все), значение которых нарушает хотя бы самое мягкое правило"""
+        if self.sign > 0:
+            low = self.keys[0]
+            if rows is None:
+                return [row for row, value in enumerate(values) if value >= low]
+            return [row for row in rows if values[row] >= low]
+        high = -self.keys[0]
+        if rows is None:
+            return [row for row, value in enumerate(values) if value <= high]
+        return [row for row in rows if values[row] <= high]
+
+
+class AlertEngine:
+    """Проверяет правила на каждом снимке и сообщает подписчикам о событиях"""
+
+    def __init__(self, rules=()):
+        self.rules = tuple(rules)
+        # Правила процессов по колонке и направлению порога
+        groups = {}
+        for rule in self.rules:
+            if rule.scope == 'process':
+                sign = 1 if rule.op in ('>', '>=') else -1
+                groups.setdefault((rule.metric, sign), []).append(rule)
+        self._process_rules = [
+            _ProcessRuleGroup(metric, sign, rules) for (metric, sign), rules in groups.items()
+        ]
+        self._system_rules = [rule for rule in self.rules if rule.scope == 'system']
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._system = {}      # правило -> _SystemState
+        self._process_generation = None
+        self.evaluations = 0
+
+    @property
+    def needs_processes(self) -> bool:
+        return bool(self._process_rules)
+
+    def subscribe(self, callback):
+        """callback(events) вызывается в потоке проверки со списком событий такта"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        try:
+            self._subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    def evaluate(self, snapshot) -> list:
+        """Проверяет правила на снимке; возвращает события и передает их подписчикам"""
+        with self._lock, trace('alert_eval'):
+            now = snapshot.timestamp
+            events = []
+            for rule in self._system_rules:
+                self._check_system(rule, snapshot, now, events)
+            # Правила процессов - только на новом снимке процессов
+            if snapshot.process_generation != self._process_generation:
+                self._check_processes(snapshot.processes, snapshot.delta, now, events)
+                self._process_generation = snapshot.process_generation
+            self.evaluations += 1
+        if events:
+            for callback in list(self._subscribers):
+                try:
+                    callback(events)
+                except Exception as e:
+                    debug_print(f"Ошибка в подписчике оповещений: {e}")
+        return events
+
+    def _check_system(self, rule, snapshot, now, events):
+        value = system_value(snapshot, rule.metric)
+        if value is None:
+            return
+        state = self._system.get(rule)
+        if state is None:
+            state = self._system[rule] = _SystemState(rule)
+        if state.window is not None:
+            state.window.push(now, value)
+            value = state.window.value(rule.aggregate)
+            breaking = state.window.full(now) and _breaks(rule.op, value, rule.threshold)
+        elif _breaks(rule.op, value, rule.threshold):
+            if state.since is None:
+                state.since = now
+            breaking = now - state.since >= rule.duration
+        else:
+            state.since = None
+            breaking = False
+        if breaking and not state.fired:
+            state.fired = True
+            events.append(AlertEvent(rule, FIRING, now, value=value))
+        elif not breaking and state.fired:
+            state.fired = False
+            events.append(AlertEvent(rule, RESOLVED, now, value=value))
+
+    def _check_processes(self, table, delta, now, events):
+        if not self._process_rules:
+            return
+        row_of = table.row_of
+        pids = table.pid
+        if delta is not None and delta.base_generation == self._process_generation:
+            removed = delta.removed
+            touched = delta.added | delta.changed
+            # Если изменилась большая часть снимка, проход по колонке дешевле поиска строк
+            rows = None if 4 * len(touched) > len(pids) else list(map(row_of, touched))
+        else:
+            # Дельта не применима: проверяем все строки снимка
+            touched = set(pids)
+            removed = None
+            rows = None
+
+        columns = {}  # Колонки снимка, прочитанные на этом такте
+        for group in self._process_rules:
+            state = group.state
+            gone = state.keys() - touched if removed is None else state.keys() & removed
+            for pid in gone:
+                self._shift(group, pid, state.pop(pid)[0], 0, now, None, events)
+            if rows is not None and not rows:
+                continue
+            values = columns.get(group.metric)
+            if values is None:
+                values = columns[group.metric] = _column(table, group.metric, rows is None)
+            if rows is None and not state and not group.reached(values):
+                continue
+            hits = group.candidates(values, rows)
+            # Процессы, которые нарушали порог и изменились, тоже пересчитываются
+            if state:
+                stale = state.keys() & touched
+                if stale:
+                    stale.difference_update(map(pids.__getitem__, hits))
+                    hits.extend(map(row_of, stale))
+            for row in hits:
+                pid = pids[row]
+                value = values[row]
+                old = state.get(pid)
+                if old is None:
+                    old = 0
+                elif old[1] == value:
+                    continue
+                else:
+                    old = old[0]
+                new = group.level(value)
+                if new:
+                    state[pid] = (new, value)
+                elif old:
+                    del state[pid]
+                if new != old:
+                    self._shift(group, pid, old, new, now, value, events)
+
+        self._fire(table, columns, now, events)
+
+    @staticmethod
+    def _shift(group, pid, old, new, now, value, events):
+        """Правила group[old:new] начали нарушаться процессом pid, group[new:old] - перестали.
+        value None - процесс завершился"""
+        if new > old:
+            entry = (now, pid)
+            for since, pending in zip(group.since[old:new], group.pending[old:new]):
+                since[pid] = now
+                pending.append(entry)
+            return
+        for rule, since, fired in zip(group.rules[new:old], group.since[new:old], group.fired[new:old]):
+            del since[pid]
+            name = fired.pop(pid, None)
+            if name is not None:
+                events.append(AlertEvent(rule, RESOLVED, now, pid, name, value))
+
+    def _fire(self, table, columns, now, events):
+        """Срабатывание нарушений, длящихся не меньше duration правила"""
+        for group in self._process_rules:
+            values = None
+            for rule, since, pending, fired in zip(group.rules, group.since, group.pending, group.fired):
+                due = now - rule.duration
+                while pending and pending[0][0] <= due:
+                    start, pid = pending.popleft()
+                    # Устаревшая запись: нарушение прекратилось или началось заново
+                    if since.get(pid) != start or pid in fired:
+                        continue
+                    if values is None:
+                        values = columns.get(group.metric)
+                        if values is None:
+                            values = columns[group.metric] = _column(table, group.metric, False)
+                    row = table.row_of(pid)
+                    name = fired[pid] = table.name_of(row)
+                    events.append(AlertEvent(rule, FIRING, now, pid, name, values[row]))
+
+
+class AlertLog:
+    """Подписчик AlertEngine, пишущий события строками в файл или в поток"""
+
+    def __init__(self, path=None, stream=None):
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+        self._stream = stream if stream is not None else sys.stderr
+
+    def __call__(self, events):
+        target = self._file if self._file is not None else self._stream
+        target.write(''.join(event.log_line() for event in events))
+        target.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def load_rules(path) -> list:
+    """Правила из файла: по одному на строку, '#' - комментарий"""
+    rules = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                rules.append(AlertRule.parse(line))
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: {e}") from None
+    return rules
+
+
+def add_alert_arguments(parser):
+    """Параметры оповещений для командной строки"""
+    parser.add_argument('--alert', action='append', default=[], metavar='RULE',
+                        help="правило оповещения, например 'process.cpu > 80 for 30s' (можно несколько)")
+    parser.add_argument('--alert-rules', help="файл с правилами оповещений, по одному на строку")
+    parser.add_argument('--alert-log', help="файл журнала оповещений (по умолчанию stderr)")
+
+
+def create_alert_engine(args):
+    """AlertEngine с журналом по параметрам командной строки; None, если правил нет.
+    ValueError или OSError - правила не разобраны или файл недоступен"""
+    rules = [AlertRule.parse(text) for text in args.alert]
+    if args.alert_rules:
+        rules += load_rules(args.alert_rules)
+    if not rules:
+        return None
+    engine = AlertEngine(rules)
+    engine.subscribe(AlertLog(args.alert_log))
+    return engine
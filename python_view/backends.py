@@ -0,0 +1,791 @@
+"""Источники данных о процессах для SystemMetrics.
+
+Каждый источник (backend) заполняет колоночный снимок ProcessTable,
+поэтому SystemMetrics не зависит от того, откуда пришли данные:
+из Dll2.dll под Windows, из /proc под Linux или из синтетического
+генератора для тестов и замеров.
+"""
+import os
+import sys
+import time
+import ctypes
+import random
+import signal
+import threading
+from ctypes import wintypes
+
+from diagnostics import debug_print, trace
+from parallel_scan import create_executor
+from process_metadata import MetadataCache, ProcessMetadata
+from process_table import UNKNOWN_UID
+from users import lookup_user
+
+
+# Имена системных процессов Windows (в нижнем регистре)
+WINDOWS_SYSTEM_NAMES = frozenset([
+    'system', 'registry', 'smss.exe', 'csrss.exe', 'wininit.exe', 'services.exe'
+])
+
+PROCESS_TERMINATE = 0x0001
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+PROCESS_COMMAND_LINE_INFORMATION = 60
+STATUS_INFO_LENGTH_MISMATCH = 0xC0000004
+TH32CS_SNAPPROCESS = 0x00000002
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+WTS_CURRENT_SERVER_HANDLE = 0
+
+
+class PROCESSENTRY32W(ctypes.Structure):
+    """Запись снимка процессов Toolhelp32 (источник PID родителя и числа потоков)"""
+    _fields_ = [
+        ("dwSize", wintypes.DWORD),
+        ("cntUsage", wintypes.DWORD),
+        ("th32ProcessID", wintypes.DWORD),
+        ("th32DefaultHeapID", ctypes.c_size_t),
+        ("th32ModuleID", wintypes.DWORD),
+        ("cntThreads", wintypes.DWORD),
+        ("th32ParentProcessID", wintypes.DWORD),
+        ("pcPriClassBase", ctypes.c_long),
+        ("dwFlags", wintypes.DWORD),
+        ("szExeFile", ctypes.c_wchar * 260)
+    ]
+
+
+class UNICODE_STRING(ctypes.Structure):
+    _fields_ = [
+        ("Length", wintypes.USHORT),
+        ("MaximumLength", wintypes.USHORT),
+        ("Buffer", ctypes.c_void_p)
+    ]
+
+
+class WTS_PROCESS_INFOW(ctypes.Structure):
+    """Запись WTSEnumerateProcessesW (источник SID владельца)"""
+    _fields_ = [
+        ("SessionId", wintypes.DWORD),
+        ("ProcessId", wintypes.DWORD),
+        ("pProcessName", wintypes.LPWSTR),
+        ("pUserSid", ctypes.c_void_p)
+    ]
+
+
+_MB = 1024.0 * 1024.0
+
+# Период пересчета открытых дескрипторов (секунды): подсчет дороже остальных
+# метрик процесса, между пересчетами берется прежнее значение
+HANDLE_REFRESH_INTERVAL = 5.0
+
+
+class ProcessBackend:
+    """Базовый интерфейс источника данных о процессах"""
+
+    name = 'base'
+
+    # Кэш неизменных сведений о процессах (MetadataCache) или None
+    metadata = None
+
+    # Исполнитель сканирования по шардам (ShardExecutor) или None - без шардов
+    executor = None
+
+    # Время последнего пересчета дескрипторов (time.monotonic)
+    _handles_time = float('-inf')
+
+    def is_available(self) -> bool:
+        """Можно ли использовать источник в текущем окружении"""
+        return False
+
+    def scan(self, table):
+        """Добавляет все процессы в снимок table (ProcessTable)"""
+        raise NotImplementedError
+
+    def get_boot_time(self) -> float:
+        """Возвращает время загрузки системы (unix time)"""
+        return 0.0
+
+    def _handles_due(self, now) -> bool:
+        """Пора ли пересчитать дескрипторы всех процессов"""
+        if now - self._handles_time < HANDLE_REFRESH_INTERVAL:
+            return False
+        self._handles_time = now
+        return True
+
+    def user_name(self, uid: int):
+        """Имя владельца по UID из снимка или None (вызывается при промахе кэша имен)"""
+        return lookup_user(uid)
+
+    def changes(self, previous, current):
+        """(added, removed, changed) между снимками, если источник знает их без
+        сравнения снимков (например, получил вместе с данными), иначе None"""
+        return None
+
+    def set_backoff(self, name: str, factor: float):
+        """Множитель периода выборки группы name (для источников со своим расписанием)"""
+        pass
+
+    def terminate_process(self, pid: int) -> bool:
+        """Завершает процесс, возвращает True при успехе"""
+        return False
+
+    def close(self):
+        """Освобождает ресурсы источника"""
+        if self.executor is not None:
+            self.executor.close()
+
+
+class DllBackend(ProcessBackend):
+    """Источник данных на основе Dll2.dll и psapi.EnumProcesses (Windows)"""
+
+    name = 'dll'
+
+    def __init__(self, dll_paths=None):
+        self.process_dll = None
+        self.ProcessInfoStruct = None
+        self._dll_paths = dll_paths
+        # У процессов Windows вместо UID - SID; SID получает номер при первой
+        # встрече, имя по номеру разрешается в user_name()
+        self._owner_ids = {}   # SID (байты) -> номер владельца
+        self._owner_sids = []  # номер владельца -> SID (байты)
+        self.metadata = MetadataCache()
+        self._handle_counts = {}  # pid -> дескрипторы на последнем пересчете
+        # Необязательные функции DLL (в старых сборках их нет)
+        self._get_start_time = None
+        self._release_process = None
+        self._load()
+
+    def _default_paths(self):
+        # Определение путей для скомпилированной версии и обычного запуска
+        dll_paths = []
+
+        if getattr(sys, 'frozen', False):
+            # Если запущено как exe (PyInstaller)
+            base_path = os.path.dirname(sys.executable)
+            dll_paths.append(os.path.join(base_path, "Dll2.dll"))
+            # Добавим поиск в текущем каталоге для EXE
+            dll_paths.append("Dll2.dll")
+        else:
+            # Если запущено как Python скрипт
+            base_path = os.path.dirname(os.path.abspath(__file__))
+            parent_path = os.path.dirname(base_path)
+            dll_paths.append(os.path.join(parent_path, "x64", "Debug", "Dll2.dll"))
+            dll_paths.append(os.path.join(base_path, "Dll2.dll"))
+
+        # Добавим системные пути в поиск
+        dll_paths.append(os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'System32', 'Dll2.dll'))
+        return dll_paths
+
+    def _load(self):
+        if sys.platform != 'win32':
+            return
+
+        dll_paths = self._dll_paths or self._default_paths()
+        debug_print(f"Начинаем поиск DLL-файла в следующих путях: {dll_paths}")
+
+        for path in dll_paths:
+            if not os.path.exists(path):
+                continue
+            try:
+                self.process_dll = ctypes.WinDLL(path)
+                debug_print(f"DLL успешно загружена из {path}")
+                break
+            except Exception as e:
+                debug_print(f"Ошибка загрузки из {path}: {e}")
+
+        if not self.process_dll:
+            debug_print(f"DLL не найдена в путях: {dll_paths}")
+            return
+
+        # Определяем структуру ProcessInfo из DLL
+        class ProcessInfoStruct(ctypes.Structure):
+            _fields_ = [
+                ("processName", ctypes.c_wchar * 260),
+                ("cpuUsage", ctypes.c_double),
+                ("memoryUsage", ctypes.c_size_t),
+                ("diskReadRate", ctypes.c_double),
+                ("diskWriteRate", ctypes.c_double),
+                ("networkSent", ctypes.c_double),
+                ("networkReceived", ctypes.c_double)
+            ]
+
+        # Настраиваем функцию GetProcessInfo
+        self.process_dll.GetProcessInfo.argtypes = [ctypes.c_ulong]
+        self.process_dll.GetProcessInfo.restype = ProcessInfoStruct
+        self.ProcessInfoStruct = ProcessInfoStruct
+
+        # Без GetProcessStartTime сведения процессов кэшируются только по PID
+        try:
+            self._get_start_time = self.process_dll.GetProcessStartTime
+            self._get_start_time.argtypes = [ctypes.c_ulong]
+            self._get_start_time.restype = ctypes.c_ulonglong
+            self._release_process = self.process_dll.ReleaseProcess
+            self._release_process.argtypes = [ctypes.c_ulong]
+            self._release_process.restype = None
+        except AttributeError:
+            debug_print("DLL не экспортирует GetProcessStartTime, сведения кэшируются по PID")
+            self._get_start_time = self._release_process = None
+
+    def is_available(self) -> bool:
+        return self.process_dll is not None
+
+    @staticmethod
+    def _toolhelp_processes() -> dict:
+        """PID -> (PID родителя, число потоков) по снимку Toolhelp32
+        (ProcessInfo не содержит ни того, ни другого)"""
+        kernel32 = ctypes.windll.kernel32
+        kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+        snapshot = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+        if not snapshot or snapshot == INVALID_HANDLE_VALUE:
+            return {}
+        processes = {}
+        try:
+            entry = PROCESSENTRY32W()
+            entry.dwSize = ctypes.sizeof(PROCESSENTRY32W)
+            found = kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+            while found:
+                processes[entry.th32ProcessID] = (entry.th32ParentProcessID, entry.cntThreads)
+                found = kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+        finally:
+            kernel32.CloseHandle(snapshot)
+        return processes
+
+    def _owner_uids(self) -> dict:
+        """PID -> номер владельца по WTSEnumerateProcessesW (один вызов на все процессы)"""
+        wtsapi32 = ctypes.windll.wtsapi32
+        advapi32 = ctypes.windll.advapi32
+        advapi32.GetLengthSid.restype = wintypes.DWORD
+        entries = ctypes.POINTER(WTS_PROCESS_INFOW)()
+        count = wintypes.DWORD()
+        if not wtsapi32.WTSEnumerateProcessesW(
+            WTS_CURRENT_SERVER_HANDLE, 0, 1, ctypes.byref(entries), ctypes.byref(count)
+        ):
+            return {}
+        owners = {}
+        try:
+            owner_ids = self._owner_ids
+            for i in range(count.value):
+                entry = entries[i]
+                if not entry.pUserSid:
+                    continue
+                sid_length = advapi32.GetLengthSid(ctypes.c_void_p(entry.pUserSid))
+                sid = ctypes.string_at(entry.pUserSid, sid_length)
+                uid = owner_ids.get(sid)
+                if uid is None:
+                    uid = owner_ids[sid] = len(self._owner_sids)
+                    self._owner_sids.append(sid)
+                owners[entry.ProcessId] = uid
+        finally:
+            wtsapi32.WTSFreeMemory(entries)
+        return owners
+
+    @staticmethod
+    def _handle_count(pid) -> int:
+        """Число открытых дескрипторов процесса (0 - нет доступа)"""
+        kernel32 = ctypes.windll.kernel32
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return 0
+        try:
+            count = wintypes.DWORD()
+            if not kernel32.GetProcessHandleCount(handle, ctypes.byref(count)):
+                return 0
+            return count.value
+        finally:
+            kernel32.CloseHandle(handle)
+
+    @staticmethod
+    def _image_path(handle) -> str:
+        size = wintypes.DWORD(1024)
+        path = ctypes.create_unicode_buffer(size.value)
+        if not ctypes.windll.kernel32.QueryFullProcessImageNameW(handle, 0, path, ctypes.byref(size)):
+            return ''
+        return path.value
+
+    @staticmethod
+    def _command_line(handle) -> str:
+        """Командная строка через NtQueryInformationProcess (Windows 8.1+)"""
+        ntdll = ctypes.windll.ntdll
+        size = wintypes.ULONG(0)
+        status = ntdll.NtQueryInformationProcess(
+            handle, PROCESS_COMMAND_LINE_INFORMATION, None, 0, ctypes.byref(size)
+        ) & 0xFFFFFFFF
+        if status != STATUS_INFO_LENGTH_MISMATCH or size.value < ctypes.sizeof(UNICODE_STRING):
+            return ''
+        buffer = ctypes.create_string_buffer(size.value)
+        if ntdll.NtQueryInformationProcess(
+            handle, PROCESS_COMMAND_LINE_INFORMATION, buffer, size, ctypes.byref(size)
+        ):
+            return ''
+        text = UNICODE_STRING.from_buffer(buffer)
+        if not text.Buffer:
+            return ''
+        return ctypes.wstring_at(text.Buffer, text.Length // 2)
+
+    def _describe(self, pid, start_time, name, toolhelp, owners) -> ProcessMetadata:
+        """Сведения о новом процессе (вызывается один раз за время его жизни)"""
+        exe = cmdline = ''
+        kernel32 = ctypes.windll.kernel32
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if handle:
+            try:
+                exe = self._image_path(handle)
+                cmdline = self._command_line(handle)
+            except Exception as e:
+                debug_print(f"Не удалось получить командную строку процесса {pid}: {e}")
+            finally:
+                kernel32.CloseHandle(handle)
+        return ProcessMetadata(
+            pid, start_time, name, cmdline, exe,
+            owners.get(pid, UNKNOWN_UID), toolhelp.get(pid, (0, 0))[0],
+            pid < 100 or name.lower() in WINDOWS_SYSTEM_NAMES
+        )
+
+    def user_name(self, uid: int):
+        if uid >= len(self._owner_sids):
+            return None
+        sid = ctypes.create_string_buffer(self._owner_sids[uid])
+        name = ctypes.create_unicode_buffer(256)
+        domain = ctypes.create_unicode_buffer(256)
+        name_size = wintypes.DWORD(len(name))
+        domain_size = wintypes.DWORD(len(domain))
+        sid_type = wintypes.DWORD()
+        if not ctypes.windll.advapi32.LookupAccountSidW(
+            None, sid, name, ctypes.byref(name_size),
+            domain, ctypes.byref(domain_size), ctypes.byref(sid_type)
+        ):
+            return None
+        return name.value
+
+    def _fetch_shard(self, pids, count_handles=False) -> list:
+        """(pid, ProcessInfo, время запуска, дескрипторы) процессов шарда;
+        дескрипторы -1, если не пересчитывались. ctypes отпускает GIL на время
+        вызова DLL, поэтому шарды читаются потоками параллельно"""
+        get_info = self.process_dll.GetProcessInfo
+        get_start_time = self._get_start_time
+        handle_count = self._handle_count
+        records = []
+        for pid in pids:
+            try:
+                proc_info = get_info(pid)
+                start_time = get_start_time(pid) if get_start_time is not None else 0
+            except Exception:
+                continue
+            records.append((pid, proc_info, start_time, handle_count(pid) if count_handles else -1))
+        return records
+
+    def scan(self, table):
+        # Получаем список PID всех процессов через WinAPI
+        capacity = 4096
+        cb_needed = wintypes.DWORD()
+
+        with trace('enumeration'):
+            while True:
+                process_ids = (wintypes.DWORD * capacity)()
+                enumerated = ctypes.windll.psapi.EnumProcesses(
+                    ctypes.byref(process_ids),
+                    ctypes.sizeof(process_ids),
+                    ctypes.byref(cb_needed)
+                )
+                # Заполненный целиком массив мог не вместить все PID
+                if not enumerated or cb_needed.value < ctypes.sizeof(process_ids):
+                    break
+                capacity *= 2
+        if not enumerated:
+            debug_print("Не удалось перечислить процессы")
+            return
+
+        num_processes = cb_needed.value // ctypes.sizeof(wintypes.DWORD)
+        pids = [pid for pid in process_ids[:num_processes] if pid > 0]
+        metadata = self.metadata
+        append = table.append
+        executor = self.executor
+        seen = set()
+        count_handles = self._handles_due(time.monotonic())
+        previous_handles = self._handle_counts
+        handle_counts = {}
+        # Владельцы нужны только для новых процессов: снимок WTS делается не
+        # больше одного раза за такт и только при промахах. Снимок Toolhelp32
+        # (потоки и родители всех процессов) - один вызов на такт
+        owners = None
+
+        with trace('enumeration'):
+            toolhelp = self._toolhelp_processes()
+
+        with trace('per_pid_fetch'):
+            # Функции DLL есть только в этом процессе: шарды читаются потоками
+            if executor is None:
+                shards = [self._fetch_shard(sorted(pids), count_handles)]
+            else:
+                shards = executor.map(self._fetch_shard, executor.split(pids), count_handles, local=True)
+
+        with trace('shard_merge'):
+            for records in shards:
+                for pid, proc_info, start_time, handles in records:
+                    meta = metadata.get(pid, start_time)
+                    if meta is None:
+                        name = proc_info.processName
+                        if not name:
+                            continue
+                        if owners is None:
+                            owners = self._owner_uids()
+                        meta = self._describe(pid, start_time, name, toolhelp, owners)
+                        metadata.put(meta)
+                    seen.add(pid)
+                    if handles < 0:
+                        # Между пересчетами - прежнее число; новый процесс считается сразу
+                        handles = previous_handles.get(pid)
+                        if handles is None:
+                            handles = self._handle_count(pid)
+                    handle_counts[pid] = handles
+
+                    append(
+                        pid, meta.name, proc_info.cpuUsage, proc_info.memoryUsage,
+                        proc_info.diskReadRate, proc_info.diskWriteRate,
+                        proc_info.networkSent, proc_info.networkReceived,
+                        meta.is_system, meta.ppid, meta.uid,
+                        toolhelp.get(pid, (0, 0))[1], handles, meta
+                    )
+        self._handle_counts = handle_counts
+
+        # Завершившиеся процессы удаляются из кэша Python и из кэша DLL
+        for pid in metadata.retain(seen):
+            if self._release_process is not None:
+                self._release_process(pid)
+
+    def get_boot_time(self) -> float:
+        return time.time() - ctypes.windll.kernel32.GetTickCount64() / 1000.0
+
+    def terminate_process(self, pid: int) -> bool:
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_TERMINATE, False, pid)
+        if not handle:
+            return False
+        try:
+            return bool(ctypes.windll.kernel32.TerminateProcess(handle, -1))
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+
+
+def _read_proc_file(path, buffers, view):
+    """Читает небольшой файл /proc в буфер, возвращает bytes или None"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        n = os.readv(fd, buffers)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    return bytes(view[:n])
+
+
+def count_fds(base) -> int:
+    """Число открытых дескрипторов процесса по каталогу fd (0 - нет доступа)"""
+    try:
+        return len(os.listdir(base + '/fd'))
+    except OSError:
+        return 0
+
+
+def read_procfs_shard(pids, root, page_size, fds=False) -> list:
+    """Читает stat и io процессов шарда (функция модуля - выполнима в пуле процессов).
+
+    Возвращает кортежи (pid, comm, ppid, тики CPU, rss, время запуска,
+    прочитано байт, записано байт, потоки, дескрипторы) в порядке pids;
+    comm и время запуска - байты из stat, дескрипторы считаются только при
+    fds=True (иначе -1). Завершившиеся за время чтения процессы пропускаются.
+    """
+    # Свой буфер на шард: шарды читаются параллельно
+    buffer = bytearray(4096)
+    buffers = [buffer]
+    view = memoryview(buffer)
+    records = []
+    append = records.append
+
+    for pid in pids:
+        base = f"{root}{pid}"
+        stat = _read_proc_file(base + '/stat', buffers, view)
+        if not stat:
+            continue
+
+        # Имя процесса в скобках может содержать пробелы и скобки
+        rpar = stat.rfind(b')')
+        comm = stat[stat.find(b'(') + 1:rpar]
+        fields = stat[rpar + 2:].split()
+        if len(fields) < 22:
+            continue
+
+        read_bytes = write_bytes = 0
+        io = _read_proc_file(base + '/io', buffers, view)
+        if io:
+            for line in io.splitlines():
+                if line.startswith(b'read_bytes:'):
+                    read_bytes = int(line[11:])
+                elif line.startswith(b'write_bytes:'):
+                    write_bytes = int(line[12:])
+
+        append((
+            pid, comm, int(fields[1]), int(fields[11]) + int(fields[12]),
+            int(fields[21]) * page_size, fields[19], read_bytes, write_bytes,
+            int(fields[17]), count_fds(base) if fds else -1
+        ))
+    return records
+
+
+class ProcfsBackend(ProcessBackend):
+    """Источник данных на основе /proc (Linux).
+
+    Список PID берется одним проходом os.scandir и делится на шарды по
+    диапазонам PID, которые читает исполнитель (parallel_scan); для каждого
+    PID читаются только /proc/[pid]/stat и /proc/[pid]/io в заранее
+    выделенный буфер шарда. Резидентная память и число потоков берутся из
+    полей rss и num_threads файла stat, поэтому отдельное чтение statm и
+    status не требуется. Открытые дескрипторы (записи /proc/[pid]/fd)
+    пересчитываются раз в HANDLE_REFRESH_INTERVAL. Владелец - эффективный
+    UID, которому принадлежит каталог /proc/[pid].
+
+    Командная строка, путь к исполняемому файлу и владелец читаются один раз
+    при первой встрече процесса (ключ кэша - PID и время запуска из stat) и
+    заново - только если процесс сменил имя (exec).
+    """
+
+    name = 'procfs'
+
+    def __init__(self, root='/proc'):
+        self.root = root
+        self._clk_tck = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self._cpu_count = os.cpu_count() or 1
+        # pid -> (тики CPU, прочитано байт, записано байт, дескрипторы, время запуска)
+        self._prev = {}
+        self._prev_time = 0.0
+        self._boot_time = None
+        self.metadata = MetadataCache()
+        # Предыдущие значения общие, сканирование только из одного потока
+        self._scan_lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return sys.platform.startswith('linux') and os.path.exists(os.path.join(self.root, 'stat'))
+
+    def _describe(self, base, pid, start_time, raw_name, ppid) -> ProcessMetadata:
+        """Сведения о новом процессе (или сменившем имя после exec)"""
+        cmdline = exe = ''
+        # Командная строка может быть длиннее общего буфера, читаем целиком
+        try:
+            with open(base + '/cmdline', 'rb') as f:
+                cmdline = f.read().rstrip(b'\0').replace(b'\0', b' ').decode('utf-8', 'replace')
+        except OSError:
+            pass
+        try:
+            exe = os.readlink(base + '/exe')
+        except OSError:
+            pass
+        try:
+            uid = os.stat(base).st_uid
+        except OSError:
+            uid = UNKNOWN_UID
+        # Системными считаются init, kthreadd и потоки ядра
+        return ProcessMetadata(
+            pid, start_time, raw_name.decode('utf-8', 'replace'), cmdline, exe, uid, ppid,
+            ppid in (0, 2), raw_name
+        )
+
+    def scan(self, table):
+        with self._scan_lock:
+            self._scan(table)
+
+    def _scan(self, table):
+        now = time.monotonic()
+        elapsed = now - self._prev_time if self._prev_time else 0.0
+        # Коэффициенты пересчета дельт в проценты и МБ/с
+        cpu_scale = 100.0 / (elapsed * self._clk_tck * self._cpu_count) if elapsed > 0 else 0.0
+        io_scale = 1.0 / (elapsed * _MB) if elapsed > 0 else 0.0
+        prev = self._prev
+        current = {}
+        metadata = self.metadata
+        append = table.append
+        root = self.root + '/'
+        executor = self.executor
+        fds = self._handles_due(now)
+
+        with trace('enumeration'):
+            try:
+                with os.scandir(self.root) as entries:
+                    pids = sorted(int(entry.name) for entry in entries if entry.name.isdigit())
+            except OSError:
+                return
+
+        with trace('per_pid_fetch'):
+            if executor is None:
+                shards = [read_procfs_shard(pids, root, self._page_size, fds)]
+            else:
+                shards = executor.map(read_procfs_shard, executor.split(pids), root, self._page_size, fds)
+
+        with trace('shard_merge'):
+            for records in shards:
+                for (pid, comm, ppid, ticks, rss, start_time, read_bytes, write_bytes,
+                     threads, handles) in records:
+                    # Имя сравнивается в байтах, строка декодируется только при промахе
+                    meta = metadata.get(pid, start_time)
+                    if meta is None or meta.raw_name != comm:
+                        meta = self._describe(f"{root}{pid}", pid, start_time, comm, ppid)
+                        metadata.put(meta)
+
+                    last = prev.get(pid)
+                    if last is not None and last[4] != start_time:
+                        # PID занят новым процессом: счетчики прежнего не годятся в базу
+                        last = None
+                    if handles < 0:
+                        # Между пересчетами - прежнее число; новый процесс считается сразу
+                        handles = last[3] if last is not None else count_fds(f"{root}{pid}")
+                    current[pid] = (ticks, read_bytes, write_bytes, handles, start_time)
+                    if last is not None:
+                        cpu = (ticks - last[0]) * cpu_scale
+                        disk_read = max(read_bytes - last[1], 0) * io_scale
+                        disk_write = max(write_bytes - last[2], 0) * io_scale
+                    else:
+                        cpu = disk_read = disk_write = 0.0
+
+                    # Сетевой трафик по процессам /proc не предоставляет
+                    append(
+                        pid, meta.name, cpu, rss, disk_read, disk_write, 0.0, 0.0,
+                        meta.is_system, ppid, meta.uid, threads, handles, meta
+                    )
+
+        metadata.retain(current.keys())
+        self._prev = current
+        self._prev_time = now
+
+    def get_boot_time(self) -> float:
+        if self._boot_time is None:
+            self._boot_time = 0.0
+            # /proc/stat на многоядерных машинах больше буфера, читаем целиком
+            try:
+                with open(self.root + '/stat', 'rb') as f:
+                    for line in f:
+                        if line.startswith(b'btime '):
+                            self._boot_time = float(line[6:])
+                            break
+            except OSError:
+                pass
+        return self._boot_time
+
+    def terminate_process(self, pid: int) -> bool:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            return True
+        except OSError:
+            return False
+
+
+class SyntheticBackend(ProcessBackend):
+    """Синтетический источник данных в памяти для тестов и замеров.
+
+    Генерирует count процессов; при каждом вызове доля churn процессов
+    завершается и заменяется новыми, остальные меняют показатели. Родитель
+    нового процесса - случайный из ранее запущенных; если он уже завершился,
+    процесс остается без родителя, как осиротевший. Владелец - один из
+    users пользователей (системные процессы принадлежат root). Сведения
+    процесса создаются при запуске и не меняются, как в кэше настоящих
+    источников; временем запуска служит порядковый номер запуска.
+    """
+
+    name = 'synthetic'
+
+    def __init__(self, count=1000, churn=0.01, seed=0, users=200):
+        self.count = count
+        self.churn = churn
+        self.users = users
+        self._rng = random.Random(seed)
+        self._next_pid = 100
+        self._started = 0
+        self._boot_time = time.time()
+        self._procs = {}
+        for _ in range(count):
+            self._spawn()
+
+    def _spawn(self):
+        pid = self._next_pid
+        self._next_pid += 4
+        parent = self._rng.randrange(100, pid, 4) if pid > 100 else 0
+        name = f"proc{pid % 997}.exe"
+        rss = self._rng.randint(1, 512) * 1024 * 1024
+        threads = self._rng.randint(1, 64)
+        handles = threads * self._rng.randint(4, 32)
+        self._started += 1
+        meta = ProcessMetadata(
+            pid, self._started, name, f"C:\\Programs\\{name} --instance {pid}",
+            f"C:\\Programs\\{name}",
+            0 if pid < 200 else 1000 + self._rng.randrange(max(1, self.users)),
+            parent if parent in self._procs else 0, pid < 200
+        )
+        # pid -> (сведения, резидентная память, потоки, дескрипторы)
+        self._procs[pid] = (meta, rss, threads, handles)
+
+    def is_available(self) -> bool:
+        return True
+
+    def scan(self, table):
+        rng = self._rng
+        random_value = rng.random
+
+        # Завершаем и запускаем часть процессов
+        replaced = int(len(self._procs) * self.churn)
+        if replaced:
+            for pid in rng.sample(list(self._procs), replaced):
+                del self._procs[pid]
+            for _ in range(replaced):
+                self._spawn()
+
+        append = table.append
+        with trace('per_pid_fetch'):
+            for pid, (meta, rss, threads, handles) in self._procs.items():
+                append(
+                    pid, meta.name, random_value() * 2.0, rss,
+                    random_value() * 0.1, random_value() * 0.1, 0.0, 0.0,
+                    meta.is_system, meta.ppid, meta.uid, threads, handles, meta
+                )
+
+    def get_boot_time(self) -> float:
+        return self._boot_time
+
+    def user_name(self, uid: int):
+        return 'root' if uid == 0 else f"user{uid - 1000:03d}"
+
+    def terminate_process(self, pid: int) -> bool:
+        return self._procs.pop(pid, None) is not None
+
+
+BACKENDS = {
+    DllBackend.name: DllBackend,
+    ProcfsBackend.name: ProcfsBackend,
+    SyntheticBackend.name: SyntheticBackend,
+}
+
+
+def create_backend(name=None, executor=None):
+    """Создает источник данных.
+
+    Если имя не задано, берется переменная окружения TASK_MANAGER_BACKEND,
+    иначе выбирается первый доступный из DLL и /proc. Возвращает None,
+    если ни один источник недоступен. Исполнитель сканирования по шардам,
+    если не задан, выбирается по переменным окружения (create_executor).
+    """
+    name = name or os.environ.get('TASK_MANAGER_BACKEND')
+    candidates = [name] if name else [DllBackend.name, ProcfsBackend.name]
+
+    for candidate in candidates:
+        backend_cls = BACKENDS.get(candidate)
+        if backend_cls is None:
+            debug_print(f"Неизвестный источник данных: {candidate}")
+            continue
+        backend = backend_cls()
+        if backend.is_available():
+            debug_print(f"Используется источник данных: {backend.name}")
+            backend.executor = executor if executor is not None else create_executor()
+            return backend
+        backend.close()
+
+    debug_print("Ни один источник данных о процессах не доступен")
+    return None
@@ -0,0 +1,167 @@
+"""Замеры горячих путей на синтетическом источнике процессов.
+
+Для каждого размера (по умолчанию 1k, 10k и 50k процессов) запускается
+отдельный процесс Python, чтобы пиковая память не накапливалась между
+размерами. В нем без показа окна (платформа Qt offscreen) замеряются:
+collect_system_info, UsersTab.update_data, PerformanceTab.update_data и
+update_process_list. Результат - JSON с p50/p99 по каждому этапу и пиковой
+резидентной памятью процесса.
+
+Примеры:
+    python benchmark.py
+    python benchmark.py --sizes 10000 --churn 0.05 --iterations 50 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+STAGES = ('collect_system_info', 'UsersTab.update_data', 'PerformanceTab.update_data',
+          'update_process_list')
+
+
+def percentile(sorted_values, fraction):
+    """Процентиль по ближайшему рангу для отсортированного списка"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples) -> dict:
+    """p50/p99/среднее/максимум в миллисекундах"""
+    values = sorted(samples)
+    return {
+        'p50_ms': round(percentile(values, 0.50) * 1000.0, 4),
+        'p99_ms': round(percentile(values, 0.99) * 1000.0, 4),
+        'mean_ms': round(sum(values) / len(values) * 1000.0, 4) if values else 0.0,
+        'max_ms': round(values[-1] * 1000.0, 4) if values else 0.0,
+    }
+
+
+def peak_rss_kb():
+    """Пиковая резидентная память процесса (КБ) или None, если неизвестна"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В macOS ru_maxrss в байтах, в Linux - в килобайтах
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_size(count, churn, iterations, warmup, seed) -> dict:
+    """Замеры для одного размера в текущем процессе"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    import diagnostics
+    diagnostics.ENABLE_LOGGING = False
+
+    from PyQt5.QtWidgets import QApplication
+    from backends import SyntheticBackend
+    from metrics_hub import MetricsHub
+    from system_metrics import SystemMetrics
+    from task_manager import TaskManagerWindow
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    hub = MetricsHub(SystemMetrics(SyntheticBackend(count, churn, seed)))
+    window = TaskManagerWindow(hub)
+    # Живой сбор не нужен: снимки собираются в цикле замеров
+    collector = window.data_collector
+    collector.snapshot_ready.disconnect(window.on_snapshot_ready)
+    collector.stop()
+    collector.wait()
+    window.show()
+    app.processEvents()
+
+    timings = {stage: [] for stage in STAGES}
+    clock = time.perf_counter
+    for i in range(warmup + iterations):
+        # Вкладки сами ограничивают частоту обновления; для замеров сбрасываем
+        window.users_tab.last_update = 0
+        window.performance_tab._last_update = 0
+
+        start = clock()
+        info = collector.collect_system_info()
+        collected = clock()
+        window.users_tab.update_data(info)
+        users = clock()
+        window.performance_tab.update_data(info)
+        performance = clock()
+        window.update_process_list(info)
+        processes = clock()
+
+        # Отрисовка не входит в замеры, но должна пройти, как в живом приложении
+        app.processEvents()
+
+        if i >= warmup:
+            timings['collect_system_info'].append(collected - start)
+            timings['UsersTab.update_data'].append(users - collected)
+            timings['PerformanceTab.update_data'].append(performance - users)
+            timings['update_process_list'].append(processes - performance)
+
+    window.close()
+    return {
+        'processes': count,
+        'churn': churn,
+        'iterations': iterations,
+        'stages': {stage: summarize(samples) for stage, samples in timings.items()},
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Замеры горячих путей диспетчера задач")
+    parser.add_argument('--sizes', default='1000,10000,50000',
+                        help="число синтетических процессов через запятую")
+    parser.add_argument('--churn', type=float, default=0.01,
+                        help="доля процессов, заменяемых на каждом сканировании")
+    parser.add_argument('--iterations', type=int, default=30, help="число замеряемых тактов")
+    parser.add_argument('--warmup', type=int, default=3, help="число тактов прогрева")
+    parser.add_argument('--seed', type=int, default=0, help="зерно синтетического источника")
+    parser.add_argument('--output', help="файл для JSON (по умолчанию stdout)")
+    parser.add_argument('--in-process', action='store_true',
+                        help="все размеры в текущем процессе (пиковая память накапливается)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    results = []
+    for count in sizes:
+        if args.in_process or len(sizes) == 1:
+            results.append(run_size(count, args.churn, args.iterations, args.warmup, args.seed))
+            continue
+        # Отдельный процесс на размер: пиковая память не смешивается
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--sizes', str(count),
+             '--churn', str(args.churn), '--iterations', str(args.iterations),
+             '--warmup', str(args.warmup), '--seed', str(args.seed)],
+            stdout=subprocess.PIPE, check=True
+        )
+        results.extend(json.loads(child.stdout)['results'])
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
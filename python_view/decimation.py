@@ -0,0 +1,55 @@
+"""Прореживание истории метрик для графика.
+
+Окно истории делится на корзины фиксированной ширины, выровненные по
+абсолютному времени, поэтому уже нарисованные корзины не меняются при
+сдвиге окна и график можно обновлять добавлением точек справа и
+удалением слева. Корзина, в которую попала больше чем одна выборка (несколько
+интервалов истории или интервал, агрегирующий несколько выборок), рисуется
+двумя точками - минимумом и максимумом (в порядке их появления), так что
+пики сохраняются при любом прореживании.
+"""
+import math
+
+
+def bucket_width(resolution, span, max_buckets) -> float:
+    """Ширина корзины (кратная resolution), при которой окно span
+    укладывается не более чем в max_buckets корзин"""
+    intervals = math.ceil(span / resolution)
+    return resolution * max(1, math.ceil(intervals / max(1, max_buckets)))
+
+
+def decimate(times, mins, maxs, avgs, counts, width):
+    """Группирует интервалы истории по корзинам ширины width секунд.
+
+    Корзина из одного интервала с одной выборкой - одна точка (начало,
+    значение), остальные - две точки: минимум и максимум. Возвращает
+    список (номер корзины, [(t, y), ...], наибольшее y).
+    """
+    buckets = []
+    key = None
+    for t, lo, hi, avg, count in zip(times, mins, maxs, avgs, counts):
+        k = int(t // width)
+        if k != key:
+            if key is not None:
+                buckets.append(_bucket(key, lo_t, lo_v, hi_t, hi_v, samples, avg_v))
+            key = k
+            lo_t = hi_t = t
+            lo_v, hi_v = lo, hi
+            samples, avg_v = count, avg
+            continue
+        samples += count
+        if lo < lo_v:
+            lo_t, lo_v = t, lo
+        if hi > hi_v:
+            hi_t, hi_v = t, hi
+    if key is not None:
+        buckets.append(_bucket(key, lo_t, lo_v, hi_t, hi_v, samples, avg_v))
+    return buckets
+
+
+def _bucket(key, lo_t, lo_v, hi_t, hi_v, samples, avg):
+    if samples <= 1:
+        return key, [(lo_t, avg)], avg
+    if hi_t < lo_t:
+        return key, [(hi_t, hi_v), (lo_t, lo_v)], hi_v
+    return key, [(lo_t, lo_v), (hi_t, hi_v)], hi_v
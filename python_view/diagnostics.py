@@ -0,0 +1,174 @@
+"""Диагностический вывод и трассировка этапов конвейера.
+
+Трассировка записывает длительности этапов (сканирование, агрегация,
+отправка сигнала, обновление таблицы и графика) в кольцевой буфер
+фиксированного размера. Запись не берет блокировок: номер слота выдает
+itertools.count, next() которого атомарен в CPython, а сами значения
+пишутся в заранее выделенные массивы. Пока TRACING выключен, trace()
+возвращает пустой контекст и ничего не замеряет и не форматирует.
+"""
+import sys
+import time
+import itertools
+from array import array
+
+
+# Определяем функцию debug_print на уровне модуля
+ENABLE_LOGGING = True  # Включаем логирование для диагностики
+STREAM = None          # Поток для диагностики; None - stdout
+
+def debug_print(*args, **kwargs):
+    if ENABLE_LOGGING:
+        kwargs.setdefault('file', STREAM if STREAM is not None else sys.stdout)
+        print(*args, **kwargs)
+
+
+TRACING = False          # Замерять этапы конвейера
+SPAN_CAPACITY = 8192     # Сколько последних замеров хранит буфер
+
+# Этапы конвейера в порядке прохождения снимка
+STAGES = (
+    'enumeration',      # Перечисление PID
+    'per_pid_fetch',    # Чтение данных процессов
+    'shard_merge',      # Склейка шардов и пересчет скоростей
+    'aggregation',      # Суммы, дельта и снимок
+    'alert_eval',       # Проверка правил оповещений
+    'statistics',       # Квантили и базовые уровни метрик
+    'signal_emit',      # Передача снимка в ящик GUI и сигнал
+    'signal_latency',   # От снимка до начала обработки в GUI
+    'table_update',     # Обновление таблицы процессов
+    'users_update',     # Обновление вкладки пользователей
+    'chart_update',     # Обновление графика
+)
+
+
+class SpanRing:
+    """Кольцевой буфер замеров (этап, начало, длительность) без блокировок"""
+
+    def __init__(self, capacity=SPAN_CAPACITY):
+        self.capacity = capacity
+        self._stage_ids = {name: i for i, name in enumerate(STAGES)}
+        self._stages = list(STAGES)
+        self._stage = array('H', bytes(2 * capacity))
+        self._start = array('d', bytes(8 * capacity))
+        self._duration = array('d', bytes(8 * capacity))
+        self._counter = itertools.count()
+        self._written = 0
+
+    def _stage_id(self, name):
+        stage_id = self._stage_ids.get(name)
+        if stage_id is None:
+            stage_id = self._stage_ids.setdefault(name, len(self._stages))
+            if stage_id == len(self._stages):
+                self._stages.append(name)
+        return stage_id
+
+    def record(self, name, start, duration):
+        sequence = next(self._counter)
+        slot = sequence % self.capacity
+        self._stage[slot] = self._stage_id(name)
+        self._start[slot] = start
+        self._duration[slot] = duration
+        self._written = sequence + 1
+
+    def clear(self):
+        self._counter = itertools.count()
+        self._written = 0
+
+    def spans(self) -> list:
+        """Сохраненные замеры от старых к новым: (этап, начало, длительность)"""
+        written = self._written
+        count = min(written, self.capacity)
+        first = written - count
+        stages = self._stages
+        result = []
+        for sequence in range(first, written):
+            slot = sequence % self.capacity
+            result.append((stages[self._stage[slot]], self._start[slot], self._duration[slot]))
+        return result
+
+    def stats(self) -> dict:
+        """По этапам: число замеров, p50, p99, максимум и последний (мс)"""
+        by_stage = {}
+        for name, _, duration in self.spans():
+            by_stage.setdefault(name, []).append(duration)
+        result = {}
+        for name, durations in by_stage.items():
+            last = durations[-1]
+            durations.sort()
+            count = len(durations)
+            result[name] = {
+                'count': count,
+                'p50_ms': durations[(count - 1) // 2] * 1000.0,
+                'p99_ms': durations[min(count - 1, int(count * 0.99))] * 1000.0,
+                'max_ms': durations[-1] * 1000.0,
+                'last_ms': last * 1000.0,
+            }
+        return result
+
+
+SPANS = SpanRing()
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        SPANS.record(self.name, self.start, end - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def trace(name):
+    """Контекст замера этапа name; при выключенной трассировке ничего не делает"""
+    return _Span(name) if TRACING else _NULL_SPAN
+
+
+def record_span(name, duration):
+    """Записывает уже измеренную длительность этапа (секунды)"""
+    if TRACING:
+        SPANS.record(name, time.perf_counter() - duration, duration)
+
+
+def report(extra=None) -> str:
+    """Текстовый отчет по этапам; extra - дополнительные таблицы {заголовок: {строка: {поле: значение}}}"""
+    lines = [f"Трассировка: {'включена' if TRACING else 'выключена'}"]
+    sections = {'Этапы конвейера (мс)': SPANS.stats()}
+    if extra:
+        sections.update(extra)
+    for title, rows in sections.items():
+        lines.append('')
+        lines.append(title)
+        for name, values in rows.items():
+            fields = ', '.join(
+                f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                for key, value in values.items()
+            )
+            lines.append(f"  {name}: {fields}")
+    return '\n'.join(lines) + '\n'
+
+
+def dump_report(path, extra=None):
+    """Сохраняет отчет report() в файл"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(report(extra))
@@ -0,0 +1,271 @@
+"""Экспорт метрик в текстовом формате OpenMetrics (Prometheus) по HTTP.
+
+Встроенный HTTP-сервер на localhost отдает по адресу /metrics системные
+показатели последнего снимка MetricsHub, а также ряды по процессам и по
+пользователям. Сервер снимков не запрашивает: тело ответа строится один раз
+на поколение снимка и кэшируется, поэтому частые опросы ничего не стоят
+сборщику, а параллельные опросы одного поколения ждут одного построения.
+
+Число рядов ограничивается:
+- по процессам выводятся только top первых групп по колонке sort_key;
+- метки рядов процессов берутся из разрешенного списка process_labels
+  (pid, name, user). Без pid процессы с одинаковыми метками суммируются в
+  один ряд, например, labels=('name',) - ряд на имя программы;
+- ряды по пользователям (их число ограничено числом владельцев) включаются
+  флагом users.
+"""
+import heapq
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from diagnostics import debug_print
+
+
+OPENMETRICS_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_PORT = 9528
+PROCESS_LABELS = ('pid', 'name', 'user')
+DEFAULT_PROCESS_LABELS = ('pid', 'name')
+DEFAULT_TOP = 20
+# Колонки, по которым можно выбирать top-N процессов
+SORT_KEYS = ('cpu', 'rss', 'disk', 'network')
+
+_MB = 1024.0 * 1024.0
+
+# Ряды процессов и пользователей: имя метрики, колонка снимка, множитель, описание
+_GROUP_SERIES = (
+    ('cpu_usage_percent', 'cpu', 1.0, "Использование ЦП (%)"),
+    ('resident_memory_bytes', 'rss', 1.0, "Резидентная память"),
+    ('disk_read_bytes_per_second', 'disk_read', _MB, "Скорость чтения с диска"),
+    ('disk_write_bytes_per_second', 'disk_write', _MB, "Скорость записи на диск"),
+    ('network_sent_bytes_per_second', 'net_sent', _MB, "Скорость отправки по сети"),
+    ('network_received_bytes_per_second', 'net_recv', _MB, "Скорость приема по сети"),
+    ('threads', 'threads', 1.0, "Число потоков"),
+    ('open_handles', 'handles', 1.0, "Открытые дескрипторы"),
+)
+
+
+def escape_label(value) -> str:
+    """Значение метки с экранированием по правилам формата"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value) -> str:
+    return repr(float(value))
+
+
+class OpenMetricsRenderer:
+    """Строит текст OpenMetrics по снимку и кэширует его по поколению снимка"""
+
+    def __init__(self, user_name=str, top=DEFAULT_TOP, sort_key='cpu',
+                 process_labels=DEFAULT_PROCESS_LABELS, users=True, prefix='taskmgr'):
+        unknown = set(process_labels) - set(PROCESS_LABELS)
+        if unknown:
+            raise ValueError(f"Неизвестные метки процессов: {', '.join(sorted(unknown))}")
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f"Неизвестная колонка сортировки: {sort_key}")
+        self.user_name = user_name  # UID -> имя владельца
+        self.top = top
+        self.sort_key = sort_key
+        self.process_labels = tuple(label for label in PROCESS_LABELS if label in process_labels)
+        self.users = users
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._generation = None
+        self._body = b''
+        self.renders = 0  # Сколько раз тело строилось заново
+
+    @property
+    def needs_processes(self) -> bool:
+        return self.top > 0 or self.users
+
+    def render(self, snapshot) -> bytes:
+        """Тело ответа без завершающей строки '# EOF' (одно построение на поколение)"""
+        with self._lock:
+            if snapshot.generation != self._generation:
+                self._body = ''.join(self._lines(snapshot)).encode('utf-8')
+                self._generation = snapshot.generation
+                self.renders += 1
+            return self._body
+
+    def _family(self, name, kind, help_text, samples):
+        """Строки семейства метрик; samples - пары (текст меток, значение)"""
+        name = f"{self.prefix}_{name}"
+        yield f"# TYPE {name} {kind}\n"
+        yield f"# HELP {name} {help_text}\n"
+        for labels, value in samples:
+            yield f"{name}{labels} {_format_value(value)}\n"
+
+    def _lines(self, snapshot):
+        family = self._family
+        table = snapshot.processes
+        yield from family('cpu_usage_percent', 'gauge', "Загрузка процессора (%)",
+                          [('', snapshot.cpu_percent)])
+        yield from family('cpu_frequency_megahertz', 'gauge', "Частота процессора",
+                          [('', snapshot.cpu_freq.get('current', 0.0))])
+        yield from family('memory_total_bytes', 'gauge', "Объем памяти",
+                          [('', snapshot.memory.get('total', 0))])
+        yield from family('memory_available_bytes', 'gauge', "Доступная память",
+                          [('', snapshot.memory.get('available', 0))])
+        yield from family('memory_usage_percent', 'gauge', "Занятая память (%)",
+                          [('', snapshot.memory.get('percent', 0))])
+        yield from family('disk_read_bytes_per_second', 'gauge', "Скорость чтения с дисков",
+                          [('', snapshot.disk.get('read_bytes', 0.0) * _MB)])
+        yield from family('disk_write_bytes_per_second', 'gauge', "Скорость записи на диски",
+                          [('', snapshot.disk.get('write_bytes', 0.0) * _MB)])
+        yield from family('network_sent_bytes_per_second', 'gauge', "Скорость отправки по сети",
+                          [('', snapshot.network.get('bytes_sent', 0.0) * _MB)])
+        yield from family('network_received_bytes_per_second', 'gauge', "Скорость приема по сети",
+                          [('', snapshot.network.get('bytes_recv', 0.0) * _MB)])
+        yield from family('boot_time_seconds', 'gauge', "Время загрузки системы (unix time)",
+                          [('', snapshot.boot_time)])
+        yield from family('snapshot_timestamp_seconds', 'gauge', "Время снимка (unix time)",
+                          [('', snapshot.timestamp)])
+        yield from family('processes', 'gauge', "Число процессов", [('', len(table))])
+        yield from family('threads', 'gauge', "Число потоков", [('', table.total('threads'))])
+        yield from family('open_handles', 'gauge', "Открытые дескрипторы",
+                          [('', table.total('handles'))])
+
+        if self.top > 0 and table:
+            groups = self._top_groups(table)
+            for name, column, scale, help_text in _GROUP_SERIES:
+                values = getattr(table, column)
+                yield from family(f"process_{name}", 'gauge', help_text, [
+                    (labels, sum(map(values.__getitem__, rows)) * scale) for labels, rows in groups
+                ])
+
+        if self.users and table:
+            # Группы по имени, а не по UID: у разных UID может быть одно имя ('?')
+            owners = {}
+            for uid, rows in self._group_rows(table.uid).items():
+                owners.setdefault(self.user_name(uid), []).extend(rows)
+            owners = [(f'{{user="{escape_label(user)}"}}', rows) for user, rows in sorted(owners.items())]
+            yield from family('user_processes', 'gauge', "Число процессов пользователя",
+                              [(labels, len(rows)) for labels, rows in owners])
+            for name, column, scale, help_text in _GROUP_SERIES:
+                values = getattr(table, column)
+                yield from family(f"user_{name}", 'gauge', help_text, [
+                    (labels, sum(map(values.__getitem__, rows)) * scale) for labels, rows in owners
+                ])
+
+    @staticmethod
+    def _group_rows(keys) -> dict:
+        groups = {}
+        for row, key in enumerate(keys):
+            groups.setdefault(key, []).append(row)
+        return groups
+
+    def _top_groups(self, table) -> list:
+        """top групп процессов по sort_key: [(текст меток, номера строк)]"""
+        labels = self.process_labels
+        sort_values = table.column(self.sort_key)
+        if not labels:
+            # Без меток все процессы - один ряд
+            groups = [list(range(len(table)))]
+        elif 'pid' in labels:
+            # PID уникален: группа - одна строка, суммировать нечего
+            rows = heapq.nlargest(self.top, range(len(table)), key=sort_values.__getitem__)
+            groups = [[row] for row in rows]
+        else:
+            keys = zip(*(table.name if label == 'name' else table.uid for label in labels))
+            groups = heapq.nlargest(
+                self.top, self._group_rows(keys).values(),
+                key=lambda rows: sum(map(sort_values.__getitem__, rows))
+            )
+        result = []
+        for rows in groups:
+            text = ','.join(
+                f'{label}="{escape_label(self._label_value(table, label, rows[0]))}"' for label in labels
+            )
+            result.append((f"{{{text}}}" if text else '', rows))
+        return result
+
+    def _label_value(self, table, label, row):
+        if label == 'pid':
+            return table.pid[row]
+        if label == 'name':
+            return table.name_of(row)
+        return self.user_name(table.uid[row])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server_version = 'TaskManagerExporter'
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        exporter = self.server.exporter
+        body = exporter.renderer.render(exporter.hub.latest())
+        # Prometheus без поддержки OpenMetrics получает тот же текст без '# EOF'
+        if 'application/openmetrics-text' in self.headers.get('Accept', ''):
+            body += b'# EOF\n'
+            content_type = OPENMETRICS_TYPE
+        else:
+            content_type = PROMETHEUS_TYPE
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        debug_print(f"Экспорт метрик: {self.address_string()} {format % args}")
+
+
+class MetricsExporter:
+    """HTTP-сервер /metrics в фоновом потоке"""
+
+    def __init__(self, hub, port=DEFAULT_PORT, host='127.0.0.1', renderer=None):
+        self.hub = hub
+        self.renderer = renderer if renderer is not None else OpenMetricsRenderer(
+            hub.metrics.get_user_name
+        )
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.exporter = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='metrics-exporter', daemon=True
+        )
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        self._thread.start()
+        debug_print(f"Экспорт метрик: http://{self.address[0]}:{self.address[1]}/metrics")
+        return self
+
+    def close(self):
+        if self._thread.is_alive():
+            self._server.shutdown()
+        self._server.server_close()
+
+
+def add_exporter_arguments(parser):
+    """Параметры экспорта метрик для командной строки"""
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help=f"отдавать метрики OpenMetrics на http://127.0.0.1:PORT/metrics "
+                             f"(0 - выключено, обычно {DEFAULT_PORT})")
+    parser.add_argument('--metrics-top', type=int, default=DEFAULT_TOP,
+                        help="сколько групп процессов экспортировать (0 - без рядов процессов)")
+    parser.add_argument('--metrics-sort', choices=SORT_KEYS, default='cpu',
+                        help="колонка для выбора экспортируемых процессов")
+    parser.add_argument('--metrics-labels', default=','.join(DEFAULT_PROCESS_LABELS),
+                        help=f"метки рядов процессов через запятую из {', '.join(PROCESS_LABELS)}")
+    parser.add_argument('--metrics-no-users', action='store_true',
+                        help="не экспортировать ряды по пользователям")
+
+
+def start_exporter(hub, args):
+    """Запускает экспорт по параметрам командной строки; None, если он выключен"""
+    if not args.metrics_port:
+        return None
+    labels = [label.strip() for label in args.metrics_labels.split(',') if label.strip()]
+    renderer = OpenMetricsRenderer(
+        hub.metrics.get_user_name, args.metrics_top, args.metrics_sort, labels,
+        not args.metrics_no_users
+    )
+    return MetricsExporter(hub, args.metrics_port, renderer=renderer).start()
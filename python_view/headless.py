@@ -0,0 +1,321 @@
+"""Сбор метрик без графического интерфейса.
+
+Использует те же MetricsHub и SamplingScheduler, что и DataCollector, но не
+импортирует Qt. Снимки пишутся в формате JSON Lines или CSV в stdout или в
+файл с ротацией по размеру.
+
+Примеры:
+    python headless.py --interval 5 --fields cpu_percent,memory.percent
+    python headless.py --format csv --top 10 --sort rss --output metrics.csv
+    python headless.py --output /dev/null --metrics-port 9528 --metrics-labels name
+"""
+import os
+import sys
+import csv
+import json
+import heapq
+import argparse
+import threading
+
+import diagnostics
+from alerts import add_alert_arguments, create_alert_engine
+from exporter import SORT_KEYS, add_exporter_arguments, start_exporter
+from metrics_hub import MetricsHub
+from scheduler import SamplingScheduler
+from snapshot_log import SnapshotLogWriter
+
+
+# Поля снимка: имя -> функция извлечения значения из MetricsSnapshot
+SYSTEM_FIELDS = {
+    'timestamp': lambda s: s.timestamp,
+    'generation': lambda s: s.generation,
+    'cpu_percent': lambda s: s.cpu_percent,
+    'cpu_freq.current': lambda s: s.cpu_freq.get('current'),
+    'memory.total': lambda s: s.memory.get('total'),
+    'memory.available': lambda s: s.memory.get('available'),
+    'memory.percent': lambda s: s.memory.get('percent'),
+    'disk.read_bytes': lambda s: s.disk.get('read_bytes'),
+    'disk.write_bytes': lambda s: s.disk.get('write_bytes'),
+    'network.bytes_sent': lambda s: s.network.get('bytes_sent'),
+    'network.bytes_recv': lambda s: s.network.get('bytes_recv'),
+    'boot_time': lambda s: s.boot_time,
+    'process_count': lambda s: len(s.processes),
+    'thread_count': lambda s: s.processes.total('threads'),
+    'handle_count': lambda s: s.processes.total('handles'),
+}
+
+# Системные поля, которые считаются по снимку процессов
+PROCESS_TOTALS = frozenset(('process_count', 'thread_count', 'handle_count'))
+
+# Поля процесса: имя -> функция извлечения значения из строки ProcessTable
+PROCESS_FIELDS = {
+    'pid': lambda t, row: t.pid[row],
+    'ppid': lambda t, row: t.ppid[row],
+    'uid': lambda t, row: t.uid[row],
+    'name': lambda t, row: t.name_of(row),
+    'cpu': lambda t, row: t.cpu[row],
+    'rss': lambda t, row: t.rss[row],
+    'disk_read': lambda t, row: t.disk_read[row],
+    'disk_write': lambda t, row: t.disk_write[row],
+    'net_sent': lambda t, row: t.net_sent[row],
+    'net_recv': lambda t, row: t.net_recv[row],
+    'threads': lambda t, row: t.threads[row],
+    'handles': lambda t, row: t.handles[row],
+    'is_system': lambda t, row: bool(t.is_system[row]),
+    'cmdline': lambda t, row: t.cmdline_of(row),
+    'exe': lambda t, row: t.exe_of(row),
+}
+
+
+class RotatingWriter:
+    """Текстовый файл с ротацией по размеру: file, file.1, ... file.N"""
+
+    def __init__(self, path, max_bytes=0, backup_count=5, header=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.header = header  # Строка, с которой начинается каждый файл
+        self._file = None
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8', newline='')
+        if self.header and self._file.tell() == 0:
+            self._file.write(self.header)
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def write(self, text):
+        if self.max_bytes and self._file.tell() + len(text) > self.max_bytes:
+            self._rotate()
+        self._file.write(text)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class StreamWriter:
+    """Запись в уже открытый поток (stdout)"""
+
+    def __init__(self, stream, header=None):
+        self._stream = stream
+        if header:
+            stream.write(header)
+
+    def write(self, text):
+        self._stream.write(text)
+        self._stream.flush()
+
+    def close(self):
+        pass
+
+
+class SnapshotFormatter:
+    """Превращает снимки в строки JSON Lines или CSV"""
+
+    def __init__(self, fmt, fields, process_fields, top, sort_key):
+        self.format = fmt
+        self.fields = fields
+        self.process_fields = process_fields
+        self.top = top
+        self.sort_key = sort_key
+
+    @property
+    def needs_processes(self) -> bool:
+        return self.top > 0 or not PROCESS_TOTALS.isdisjoint(self.fields)
+
+    def header(self):
+        if self.format != 'csv':
+            return None
+        columns = list(self.fields)
+        if self.top:
+            columns += ['rank'] + [f"process.{name}" for name in self.process_fields]
+        return self._csv_line(columns)
+
+    @staticmethod
+    def _csv_line(values) -> str:
+        buffer = _LineBuffer()
+        csv.writer(buffer, lineterminator='\n').writerow(values)
+        return buffer.value
+
+    def top_rows(self, table) -> list:
+        """Номера строк top-N процессов по sort_key, по убыванию"""
+        if not self.top or not table:
+            return []
+        values = table.column(self.sort_key)
+        return heapq.nlargest(self.top, range(len(table)), key=values.__getitem__)
+
+    def format_snapshot(self, snapshot) -> str:
+        system = [SYSTEM_FIELDS[name](snapshot) for name in self.fields]
+        table = snapshot.processes
+        rows = self.top_rows(table)
+
+        if self.format == 'csv':
+            if not self.top:
+                return self._csv_line(system)
+            # По строке на процесс из top-N, системные поля повторяются
+            return ''.join(
+                self._csv_line(system + [rank] + [
+                    PROCESS_FIELDS[name](table, row) for name in self.process_fields
+                ])
+                for rank, row in enumerate(rows, 1)
+            )
+
+        record = dict(zip(self.fields, system))
+        if self.top:
+            record['processes'] = [
+                {name: PROCESS_FIELDS[name](table, row) for name in self.process_fields}
+                for row in rows
+            ]
+        return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class _LineBuffer:
+    """Минимальный файловый объект для csv.writer"""
+
+    def __init__(self):
+        self.value = ''
+
+    def write(self, text):
+        self.value += text
+
+
+def _parse_fields(text, known, option):
+    fields = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in known]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"{option}: неизвестные поля {', '.join(unknown)}; доступны: {', '.join(known)}"
+        )
+    return fields
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Сбор системных метрик без графического интерфейса")
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl',
+                        help="формат вывода (по умолчанию jsonl)")
+    parser.add_argument('--output', help="файл вывода (по умолчанию stdout)")
+    parser.add_argument('--max-bytes', type=int, default=0,
+                        help="размер файла, после которого он ротируется (0 - без ротации)")
+    parser.add_argument('--backup-count', type=int, default=5,
+                        help="сколько ротированных файлов хранить")
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help="период записи снимков в секундах")
+    parser.add_argument('--count', type=int, default=0,
+                        help="остановиться после N снимков (0 - без ограничения)")
+    parser.add_argument('--fields', default=','.join(SYSTEM_FIELDS),
+                        help="системные поля через запятую")
+    parser.add_argument('--process-fields', default='pid,name,cpu,rss',
+                        help="поля процессов для --top через запятую")
+    parser.add_argument('--top', type=int, default=0,
+                        help="выводить N процессов с наибольшим значением --sort")
+    parser.add_argument('--sort', choices=SORT_KEYS, default='cpu',
+                        help="колонка для выбора top-N процессов")
+    parser.add_argument('--record', help="дополнительно записывать снимки в журнал для воспроизведения")
+    parser.add_argument('--trace-report', help="замерять этапы конвейера и сохранить отчет при выходе")
+    parser.add_argument('--debug', action='store_true', help="диагностический вывод в stderr")
+    add_exporter_arguments(parser)
+    add_alert_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        fields = _parse_fields(args.fields, SYSTEM_FIELDS, '--fields')
+        process_fields = _parse_fields(args.process_fields, PROCESS_FIELDS, '--process-fields')
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if args.interval <= 0:
+        parser.error("--interval должен быть больше нуля")
+    try:
+        alerts = create_alert_engine(args)
+    except (OSError, ValueError) as e:
+        parser.error(f"оповещения: {e}")
+
+    # stdout занят данными, диагностика только по запросу и в stderr
+    diagnostics.ENABLE_LOGGING = args.debug
+    diagnostics.STREAM = sys.stderr
+    diagnostics.TRACING = bool(args.trace_report)
+
+    formatter = SnapshotFormatter(args.format, fields, process_fields, args.top, args.sort)
+    if args.output:
+        try:
+            writer = RotatingWriter(args.output, args.max_bytes, args.backup_count, formatter.header())
+        except OSError as e:
+            parser.error(f"не удалось открыть {args.output}: {e}")
+    else:
+        writer = StreamWriter(sys.stdout, formatter.header())
+
+    hub = MetricsHub.instance()
+    recorder = None
+    if args.record:
+        recorder = SnapshotLogWriter(args.record)
+        hub.subscribe(recorder.append)
+    try:
+        exporter = start_exporter(hub, args)
+    except (OSError, ValueError) as e:
+        parser.error(f"экспорт метрик: {e}")
+    if alerts is not None:
+        # Правила проверяются на каждом снимке, в том числе на базовом
+        hub.subscribe(alerts.evaluate)
+    scan_processes = (
+        formatter.needs_processes
+        or (exporter is not None and exporter.renderer.needs_processes)
+        or (alerts is not None and alerts.needs_processes)
+    )
+    stop = threading.Event()
+    written = 0
+
+    def emit():
+        nonlocal written
+        snapshot = hub.refresh(scan_processes=scan_processes)
+        try:
+            writer.write(formatter.format_snapshot(snapshot))
+        except BrokenPipeError:
+            # Читатель stdout закрыл канал (например, head)
+            stop.set()
+            return
+        written += 1
+        if args.count and written >= args.count:
+            stop.set()
+
+    # Первая выборка только задает базу для скоростей (ЦП, диск, сеть)
+    hub.refresh(scan_processes=scan_processes)
+    scheduler = SamplingScheduler()
+    scheduler.add('output', args.interval, emit, delay=args.interval)
+    try:
+        scheduler.run(stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.trace_report:
+            diagnostics.dump_report(args.trace_report, {'Планировщик выборок': scheduler.stats()})
+        if recorder is not None:
+            hub.unsubscribe(recorder.append)
+            recorder.close()
+        if exporter is not None:
+            exporter.close()
+        if alerts is not None:
+            hub.unsubscribe(alerts.evaluate)
+        try:
+            writer.close()
+        except BrokenPipeError:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Общий для всего процесса источник снимков метрик.
+
+Все потребители (сборщик данных, вкладки, экспорт) получают данные через
+один MetricsHub: он владеет единственным SystemMetrics, выпускает
+неизменяемые снимки с номером поколения и гарантирует, что в каждый момент
+выполняется не больше одного обновления (single-flight): вызывающие во время
+идущего обновления ждут его результата, а не запускают свое.
+
+Медленному потребителю снимки передаются через SnapshotMailbox: ящик хранит
+только новейший непрочитанный снимок, поэтому при задержках потребителя
+очередь снимков не растет, а пропущенные изменения процессов сливаются в
+одну дельту.
+"""
+import time
+import threading
+from types import MappingProxyType
+
+from diagnostics import debug_print, trace
+from process_table import ProcessDelta, ProcessTable, merge_deltas
+from system_metrics import SystemMetrics
+
+
+class MetricsSnapshot:
+    """Неизменяемый снимок системных метрик и процессов"""
+
+    __slots__ = (
+        'generation', 'process_generation', 'timestamp', 'cpu_percent', 'memory',
+        'disk', 'network', 'cpu_freq', 'boot_time', 'processes', 'delta'
+    )
+
+    def __init__(self, generation, process_generation, timestamp, cpu_percent, memory,
+                 disk, network, cpu_freq, boot_time, processes, delta):
+        setter = object.__setattr__
+        setter(self, 'generation', generation)                  # Номер снимка
+        setter(self, 'process_generation', process_generation)  # Номер снимка процессов
+        setter(self, 'timestamp', timestamp)
+        setter(self, 'cpu_percent', cpu_percent)
+        setter(self, 'memory', MappingProxyType(dict(memory)))
+        setter(self, 'disk', MappingProxyType(dict(disk)))
+        setter(self, 'network', MappingProxyType(dict(network)))
+        setter(self, 'cpu_freq', MappingProxyType(dict(cpu_freq)))
+        setter(self, 'boot_time', boot_time)
+        setter(self, 'processes', processes)
+        setter(self, 'delta', delta)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MetricsSnapshot неизменяем")
+
+    def with_delta(self, delta):
+        """Тот же снимок с другой дельтой процессов"""
+        return MetricsSnapshot(
+            self.generation, self.process_generation, self.timestamp, self.cpu_percent,
+            self.memory, self.disk, self.network, self.cpu_freq, self.boot_time,
+            self.processes, delta
+        )
+
+    def as_dict(self) -> dict:
+        """Снимок в формате словаря system_info, который принимают вкладки"""
+        return {
+            'cpu_percent': self.cpu_percent,
+            'memory': self.memory,
+            'disk': self.disk,
+            'network': self.network,
+            'cpu_freq': self.cpu_freq,
+            'boot_time': self.boot_time,
+            'last_update': self.timestamp,
+            'processes': self.processes,  # Полный снимок для потребителей без дельт
+            'generation': self.generation,
+            'process_generation': self.process_generation,
+            'delta': self.delta
+        }
+
+
+EMPTY_SNAPSHOT = MetricsSnapshot(
+    0, 0, 0.0, 0.0, {}, {}, {}, {}, 0.0, ProcessTable(),
+    ProcessDelta(0, 0, frozenset(), frozenset(), frozenset())
+)
+
+
+class SnapshotMailbox:
+    """Ящик на один снимок между потоком сборщика и потребителем.
+
+    post() кладет снимок, вытесняя непрочитанный; take() забирает новейший.
+    Дельта вытесненного снимка сливается с дельтой нового, так что
+    потребитель, пропустивший снимки, по-прежнему применяет изменения, а не
+    перестраивается по полному снимку.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._taken_generation = None  # Поколение процессов последнего забранного снимка
+        self.delivered = 0  # Снимков забрано потребителем
+        self.skipped = 0    # Снимков вытеснено непрочитанными
+
+    def post(self, snapshot) -> bool:
+        """Кладет снимок; возвращает True, если ящик был пуст и потребителя
+        нужно разбудить (иначе он уже разбужен и заберет новый снимок)"""
+        with self._lock:
+            pending = self._snapshot
+            if pending is not None:
+                self.skipped += 1
+                delta = snapshot.delta
+                if snapshot.process_generation == pending.process_generation:
+                    # Снимок только системных метрик: процессы те же, дельта -
+                    # вытесненного (она могла быть уже слита с пропущенными)
+                    if delta is not pending.delta:
+                        snapshot = snapshot.with_delta(pending.delta)
+                elif (pending.process_generation != self._taken_generation
+                        and delta.base_generation == pending.process_generation):
+                    # Дельта, уже полученная потребителем, в слияние не входит
+                    snapshot = snapshot.with_delta(merge_deltas(pending.delta, delta))
+            self._snapshot = snapshot
+            return pending is None
+
+    def take(self):
+        """Новейший непрочитанный снимок или None"""
+        with self._lock:
+            snapshot, self._snapshot = self._snapshot, None
+            if snapshot is not None:
+                self.delivered += 1
+                self._taken_generation = snapshot.process_generation
+            return snapshot
+
+
+class MetricsHub:
+    """Единая точка получения снимков метрик с single-flight обновлением"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """Возвращает общий для процесса экземпляр, создавая его при первом вызове"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics if metrics is not None else SystemMetrics()
+        self._snapshot = EMPTY_SNAPSHOT
+        self._lock = threading.Lock()
+        self._inflight = None      # Событие завершения идущего обновления
+        self._subscribers = []
+        # Предыдущий снимок процессов для построения дельты
+        self._prev_processes = None
+
+    def latest(self) -> MetricsSnapshot:
+        """Последний выпущенный снимок без обновления"""
+        return self._snapshot
+
+    def snapshot(self, max_age: float = 1.0) -> MetricsSnapshot:
+        """Снимок не старше max_age секунд; при необходимости обновляет его"""
+        current = self._snapshot
+        if current.generation and time.time() - current.timestamp <= max_age:
+            return current
+        return self.refresh()
+
+    def refresh(self, scan_processes=None) -> MetricsSnapshot:
+        """Собирает новый снимок; параллельные вызовы ждут одно обновление.
+
+        scan_processes: True - сканировать процессы сейчас, False - обновить
+        только системные метрики, None - сканировать, если кеш устарел.
+        Ждущий вызов получает результат идущего обновления, каким бы оно ни было.
+        """
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None:
+                self._inflight = threading.Event()
+
+        if inflight is not None:
+            inflight.wait()
+            return self._snapshot
+
+        try:
+            snapshot = self._collect(scan_processes)
+            self._snapshot = snapshot
+        finally:
+            with self._lock:
+                done, self._inflight = self._inflight, None
+            done.set()
+
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                debug_print(f"Ошибка в подписчике MetricsHub: {e}")
+        return snapshot
+
+    def _collect(self, scan_processes) -> MetricsSnapshot:
+        metrics = self.metrics
+        previous = self._snapshot
+        if scan_processes is None:
+            processes = metrics.get_processes()
+        elif scan_processes:
+            processes = metrics.scan_processes()
+        else:
+            metrics.refresh_system()
+            processes = metrics.latest_processes()
+
+        with trace('aggregation'):
+            # Новый снимок процессов - новое поколение и дельта относительно предыдущего
+            process_generation = previous.process_generation
+            delta = previous.delta
+            if processes is not self._prev_processes:
+                added, removed, changed = metrics.process_changes(self._prev_processes, processes)
+                delta = ProcessDelta(process_generation + 1, process_generation, added, removed, changed)
+                process_generation += 1
+                self._prev_processes = processes
+
+            return MetricsSnapshot(
+                previous.generation + 1,
+                process_generation,
+                time.time(),
+                metrics.get_cpu_usage(),
+                metrics.get_memory_info(),
+                metrics.get_disk_io(),
+                metrics.get_network_io(),
+                metrics.get_cpu_freq(),
+                metrics.get_boot_time(),
+                processes,
+                delta
+            )
+
+    def subscribe(self, callback):
+        """Подписывает callback(snapshot) на каждый новый снимок.
+
+        Вызывается в потоке, выполнившем обновление.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
@@ -0,0 +1,130 @@
+"""Параллельное сканирование процессов по шардам.
+
+Список PID делится на шарды - непрерывные диапазоны PID по возрастанию.
+Каждый шард читается отдельной задачей исполнителя, результаты склеиваются
+в порядке шардов, поэтому порядок строк снимка не зависит ни от
+исполнителя, ни от того, какая задача закончилась первой.
+
+Исполнитель подключаемый:
+- 'serial'  - шарды читаются по очереди в вызывающем потоке;
+- 'thread'  - пул потоков: для источников, которые в основном ждут
+  системных вызовов (чтение /proc и вызовы DLL отпускают GIL);
+- 'process' - пул процессов (spawn): для источников с тяжелым разбором на
+  многоядерных машинах. Функция шарда должна быть функцией модуля, а ее
+  аргументы и результат - сериализуемыми. Задачи, привязанные к состоянию
+  текущего процесса (функции DLL, кэши), передаются с local=True и
+  выполняются пулом потоков.
+
+Выбор задается переменными окружения TASK_MANAGER_SCAN_EXECUTOR
+(serial, thread, process) и TASK_MANAGER_SCAN_WORKERS.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from diagnostics import debug_print
+
+
+EXECUTOR_KINDS = ('serial', 'thread', 'process')
+DEFAULT_EXECUTOR = 'thread'
+# Не больше рабочих по умолчанию: дальше выигрыш съедают переключения
+MAX_DEFAULT_WORKERS = 8
+# Шарды меньше этого числа процессов не окупают передачу задачи исполнителю
+MIN_SHARD_SIZE = 512
+
+
+def split_shards(pids, count) -> list:
+    """Делит PID на count непрерывных диапазонов почти равного размера
+    (шарды и PID внутри них - по возрастанию)"""
+    pids = sorted(pids)
+    count = max(1, min(count, len(pids)))
+    size, extra = divmod(len(pids), count)
+    shards = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        shards.append(pids[start:end])
+        start = end
+    return shards
+
+
+class ShardExecutor:
+    """Исполнитель задач сканирования по шардам с детерминированной склейкой"""
+
+    def __init__(self, kind=DEFAULT_EXECUTOR, workers=None):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Неизвестный исполнитель сканирования: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers or min(MAX_DEFAULT_WORKERS, os.cpu_count() or 1))
+        self._threads = None
+        self._processes = None
+        self._lock = threading.Lock()
+
+    def shard_count(self, total) -> int:
+        """Сколько шардов делать из total процессов"""
+        if self.kind == 'serial':
+            return 1
+        return max(1, min(self.workers, total // MIN_SHARD_SIZE))
+
+    def split(self, pids) -> list:
+        return split_shards(pids, self.shard_count(len(pids)))
+
+    def _thread_pool(self):
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(self.workers, thread_name_prefix='scan-shard')
+            return self._threads
+
+    def _process_pool(self):
+        with self._lock:
+            if self._processes is None:
+                if multiprocessing.current_process().daemon:
+                    # Демоническому процессу (например, сборщику) нельзя иметь потомков
+                    debug_print("Пул процессов недоступен в демоническом процессе, используются потоки")
+                    self.kind = 'thread'
+                    return None
+                self._processes = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._processes
+
+    def map(self, fn, shards, *args, local=False) -> list:
+        """Результаты fn(шард, *args) в порядке шардов"""
+        if self.kind == 'serial' or len(shards) <= 1:
+            return [fn(shard, *args) for shard in shards]
+        pool = self._process_pool() if self.kind == 'process' and not local else None
+        if pool is not None:
+            try:
+                futures = [pool.submit(fn, shard, *args) for shard in shards]
+                return [future.result() for future in futures]
+            except BrokenProcessPool as e:
+                debug_print(f"Пул процессов сканирования остановлен ({e}), используются потоки")
+                self.kind = 'thread'
+        pool = self._thread_pool()
+        futures = [pool.submit(fn, shard, *args) for shard in shards]
+        return [future.result() for future in futures]
+
+    def close(self):
+        with self._lock:
+            threads, processes = self._threads, self._processes
+            self._threads = self._processes = None
+        if threads is not None:
+            threads.shutdown(wait=True)
+        if processes is not None:
+            processes.shutdown(wait=True)
+
+
+def create_executor(kind=None, workers=None) -> ShardExecutor:
+    """Исполнитель по параметрам или переменным окружения"""
+    kind = kind or os.environ.get('TASK_MANAGER_SCAN_EXECUTOR') or DEFAULT_EXECUTOR
+    if workers is None:
+        try:
+            workers = int(os.environ.get('TASK_MANAGER_SCAN_WORKERS', 0)) or None
+        except ValueError:
+            workers = None
+    if kind not in EXECUTOR_KINDS:
+        debug_print(f"Неизвестный исполнитель сканирования: {kind}, используется {DEFAULT_EXECUTOR}")
+        kind = DEFAULT_EXECUTOR
+    return ShardExecutor(kind, workers)
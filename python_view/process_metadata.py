@@ -0,0 +1,65 @@
+"""Кэш неизменных сведений о процессах.
+
+Имя, командная строка, путь к исполняемому файлу, владелец, родитель и
+признак системного процесса не меняются за время жизни процесса, поэтому
+источник данных получает их один раз - при первой встрече процесса - и
+дальше берет из кэша. Ключ кэша - пара (PID, время запуска): PID может
+достаться новому процессу, а время запуска у него будет другим, и запись
+прежнего владельца PID не будет принята за его собственную.
+
+Записи завершившихся процессов удаляются после каждого сканирования
+(retain), так что кэш не растет вместе с числом запущенных за все время
+процессов.
+"""
+
+
+class ProcessMetadata:
+    """Неизменные сведения об одном процессе"""
+
+    __slots__ = ('pid', 'start_time', 'name', 'raw_name', 'cmdline', 'exe', 'uid', 'ppid', 'is_system')
+
+    def __init__(self, pid, start_time, name, cmdline='', exe='', uid=0, ppid=0, is_system=False,
+                 raw_name=None):
+        self.pid = pid
+        self.start_time = start_time  # Время запуска в единицах источника
+        self.name = name
+        self.raw_name = raw_name      # Имя в виде источника (например, байты comm), если отличается
+        self.cmdline = cmdline        # Командная строка, аргументы через пробел
+        self.exe = exe                # Путь к исполняемому файлу ('' - недоступен)
+        self.uid = uid
+        self.ppid = ppid
+        self.is_system = is_system
+
+    def __repr__(self):
+        return f"ProcessMetadata(pid={self.pid}, start_time={self.start_time}, name={self.name!r})"
+
+
+class MetadataCache:
+    """Кэш (PID, время запуска) -> ProcessMetadata"""
+
+    def __init__(self):
+        self._entries = {}  # pid -> ProcessMetadata текущего владельца PID
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, pid, start_time):
+        """Сведения о процессе или None, если процесс еще не встречался
+        (в том числе если PID теперь принадлежит другому процессу)"""
+        meta = self._entries.get(pid)
+        if meta is None or meta.start_time != start_time:
+            return None
+        return meta
+
+    def put(self, meta):
+        self._entries[meta.pid] = meta
+
+    def retain(self, pids) -> set:
+        """Удаляет записи процессов, которых нет в pids; возвращает их PID"""
+        gone = self._entries.keys() - pids
+        for pid in gone:
+            del self._entries[pid]
+        return gone
+
+    def clear(self):
+        self._entries.clear()
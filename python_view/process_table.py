@@ -0,0 +1,285 @@
+"""Колоночный снимок списка процессов.
+
+Вместо списка словарей (по словарю на процесс) снимок хранит каждую
+метрику в отдельном массиве array. Суммы, группировки и сортировки
+выполняются встроенными функциями над массивами целиком, без обращений
+к словарям в цикле на Python.
+"""
+import operator
+from array import array
+from itertools import count
+
+
+# UID владельца, который не удалось определить
+UNKNOWN_UID = 0xFFFFFFFF
+
+# Числовые колонки снимка
+NUMERIC_COLUMNS = ('cpu', 'rss', 'disk_read', 'disk_write', 'net_sent', 'net_recv', 'threads', 'handles')
+
+# Производные колонки: сумма двух базовых
+DERIVED_COLUMNS = {
+    'disk': ('disk_read', 'disk_write'),
+    'network': ('net_sent', 'net_recv'),
+}
+
+
+class NamePool:
+    """Пул имен процессов: каждое имя хранится один раз, в снимке - только индекс.
+
+    Пул только растет, поэтому индексы из старых снимков остаются верными.
+    Имя в нижнем регистре (для сортировки и поиска) вычисляется один раз,
+    при добавлении имени в пул.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.lowered = []  # Имена в нижнем регистре, по тем же индексам
+        self._index = {}
+
+    def intern(self, name: str) -> int:
+        idx = self._index.get(name)
+        if idx is None:
+            idx = len(self.names)
+            self.names.append(name)
+            self.lowered.append(name.lower())
+            self._index[name] = idx
+        return idx
+
+    def __getitem__(self, idx: int) -> str:
+        return self.names[idx]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class ProcessTable:
+    """Снимок процессов в колоночном виде (struct-of-arrays)"""
+
+    __slots__ = (
+        'pool', 'pid', 'name', 'cpu', 'rss', 'disk_read', 'disk_write',
+        'net_sent', 'net_recv', 'threads', 'handles', 'is_system', 'ppid', 'uid', 'meta', '_row_by_pid'
+    )
+
+    def __init__(self, pool=None):
+        self.pool = pool if pool is not None else NamePool()
+        self.pid = array('I')         # PID процесса
+        self.name = array('I')        # Индекс имени в пуле
+        self.cpu = array('d')         # Использование ЦП (%)
+        self.rss = array('Q')         # Резидентная память (байты)
+        self.disk_read = array('d')   # Чтение с диска (МБ/с)
+        self.disk_write = array('d')  # Запись на диск (МБ/с)
+        self.net_sent = array('d')    # Отправлено по сети (МБ/с)
+        self.net_recv = array('d')    # Получено по сети (МБ/с)
+        self.threads = array('I')     # Число потоков
+        self.handles = array('I')     # Открытые дескрипторы (handle в Windows, fd в Linux)
+        self.is_system = array('b')   # Флаг системного процесса
+        self.ppid = array('I')        # PID родительского процесса (0 - нет)
+        self.uid = array('I')         # UID владельца (UNKNOWN_UID - неизвестен)
+        self.meta = []                # ProcessMetadata из кэша источника или None
+        self._row_by_pid = None
+
+    def append(self, pid, name, cpu, rss, disk_read, disk_write, net_sent, net_recv, is_system,
+               ppid=0, uid=UNKNOWN_UID, threads=0, handles=0, meta=None):
+        """Добавляет строку в снимок (используется источниками данных)"""
+        self.pid.append(pid)
+        self.name.append(self.pool.intern(name))
+        self.cpu.append(cpu)
+        self.rss.append(rss)
+        self.disk_read.append(disk_read)
+        self.disk_write.append(disk_write)
+        self.net_sent.append(net_sent)
+        self.net_recv.append(net_recv)
+        self.threads.append(threads)
+        self.handles.append(handles)
+        self.is_system.append(1 if is_system else 0)
+        self.ppid.append(ppid)
+        self.uid.append(uid)
+        self.meta.append(meta)
+        self._row_by_pid = None
+
+    def __len__(self):
+        return len(self.pid)
+
+    def __bool__(self):
+        return len(self.pid) > 0
+
+    def name_of(self, row: int) -> str:
+        return self.pool.names[self.name[row]]
+
+    def lower_name_of(self, row: int) -> str:
+        return self.pool.lowered[self.name[row]]
+
+    def names(self) -> list:
+        """Имена процессов в порядке строк"""
+        return list(map(self.pool.names.__getitem__, self.name))
+
+    def lower_names(self) -> list:
+        """Имена процессов в нижнем регистре в порядке строк"""
+        return list(map(self.pool.lowered.__getitem__, self.name))
+
+    def cmdline_of(self, row: int) -> str:
+        """Командная строка процесса ('' - неизвестна)"""
+        meta = self.meta[row]
+        return meta.cmdline if meta is not None else ''
+
+    def exe_of(self, row: int) -> str:
+        """Путь к исполняемому файлу ('' - неизвестен)"""
+        meta = self.meta[row]
+        return meta.exe if meta is not None else ''
+
+    def row_of(self, pid: int):
+        """Возвращает номер строки процесса или None"""
+        if self._row_by_pid is None:
+            self._row_by_pid = dict(zip(self.pid, range(len(self.pid))))
+        return self._row_by_pid.get(pid)
+
+    def column(self, key: str):
+        """Возвращает колонку по имени, включая производные 'disk', 'network' и 'name'"""
+        if key == 'name':
+            return self.names()
+        if key in DERIVED_COLUMNS:
+            first, second = DERIVED_COLUMNS[key]
+            return array('d', map(operator.add, getattr(self, first), getattr(self, second)))
+        return getattr(self, key)
+
+    def total(self, key: str) -> float:
+        """Сумма колонки"""
+        if key in DERIVED_COLUMNS:
+            first, second = DERIVED_COLUMNS[key]
+            return sum(getattr(self, first)) + sum(getattr(self, second))
+        return sum(getattr(self, key))
+
+    def totals(self) -> dict:
+        """Суммы всех числовых колонок"""
+        return {key: sum(getattr(self, key)) for key in NUMERIC_COLUMNS}
+
+    def argsort(self, key: str, reverse: bool = False) -> list:
+        """Возвращает номера строк, упорядоченные по колонке"""
+        values = self.lower_names() if key == 'name' else self.column(key)
+        return sorted(range(len(self.pid)), key=values.__getitem__, reverse=reverse)
+
+    def group_sum(self, keys, key: str) -> dict:
+        """Сумма колонки по группам; keys - ключ группы для каждой строки"""
+        result = {}
+        get = result.get
+        for group, value in zip(keys, self.column(key)):
+            result[group] = get(group, 0) + value
+        return result
+
+    def group_totals(self, key: str, columns) -> dict:
+        """Суммы колонок columns по значениям колонки key:
+        {значение key: {колонка: сумма}}.
+
+        За один проход строки раскладываются по группам, затем каждая сумма
+        считается встроенной sum() по номерам строк группы. Производные
+        колонки суммируются по базовым, без построения промежуточных массивов.
+        """
+        groups = {}
+        for group, row in zip(getattr(self, key), count()):
+            groups.setdefault(group, []).append(row)
+        sources = [
+            [getattr(self, name) for name in DERIVED_COLUMNS.get(name, (name,))]
+            for name in columns
+        ]
+        return {
+            group: {
+                name: sum(sum(map(column.__getitem__, rows)) for column in source)
+                for name, source in zip(columns, sources)
+            }
+            for group, rows in groups.items()
+        }
+
+    def record(self, row: int) -> dict:
+        """Строка снимка в прежнем формате словаря процесса"""
+        return {
+            'pid': self.pid[row],
+            'name': self.name_of(row),
+            'cpu_percent': self.cpu[row],
+            'memory_info': {
+                'rss': self.rss[row]
+            },
+            'disk_read': self.disk_read[row],
+            'disk_write': self.disk_write[row],
+            'network_sent': self.net_sent[row],
+            'network_recv': self.net_recv[row],
+            'num_threads': self.threads[row],
+            'num_handles': self.handles[row],
+            'is_system': bool(self.is_system[row]),
+            'ppid': self.ppid[row],
+            'uid': self.uid[row],
+            'cmdline': self.cmdline_of(row),
+            'exe': self.exe_of(row)
+        }
+
+    def records(self) -> list:
+        """Весь снимок в виде списка словарей (для совместимости)"""
+        return [self.record(row) for row in range(len(self.pid))]
+
+
+# Колонки, изменение которых делает процесс "измененным" в дельте
+# (ppid меняется, когда процесс переходит к новому родителю, uid - после setuid)
+DIFF_COLUMNS = ('name',) + NUMERIC_COLUMNS + ('ppid', 'uid')
+
+
+class ProcessDelta:
+    """Изменения снимка процессов относительно предыдущего поколения.
+
+    Применима только к состоянию, построенному из снимка base_generation;
+    иначе потребитель должен перестроиться по полному снимку.
+    """
+
+    __slots__ = ('generation', 'base_generation', 'added', 'removed', 'changed')
+
+    def __init__(self, generation, base_generation, added, removed, changed):
+        self.generation = generation
+        self.base_generation = base_generation
+        self.added = added        # PID новых процессов
+        self.removed = removed    # PID завершившихся процессов
+        self.changed = changed    # PID процессов с изменившимися значениями
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+def merge_deltas(older: ProcessDelta, newer: ProcessDelta) -> ProcessDelta:
+    """Дельта, равносильная применению older, а затем newer.
+
+    newer должна быть построена от поколения older. Процесс, завершившийся
+    в older и снова появившийся в newer (PID использован повторно), попадает
+    в changed, как и в журнале снимков.
+    """
+    added = (older.added - newer.removed) | (newer.added - older.removed)
+    removed = (older.removed - newer.added) | (newer.removed - older.added)
+    changed = (older.changed | newer.changed | (older.removed & newer.added)) - added - removed
+    return ProcessDelta(newer.generation, older.base_generation, added, removed, changed)
+
+
+def diff_tables(previous: ProcessTable, current: ProcessTable) -> tuple:
+    """Сравнивает два снимка по PID, возвращает (added, removed, changed)"""
+    if previous is None or not previous:
+        return set(current.pid), set(), set()
+
+    prev_rows = dict(zip(previous.pid, range(len(previous.pid))))
+    columns = [(getattr(current, key), getattr(previous, key)) for key in DIFF_COLUMNS]
+    cur_meta, prev_meta = current.meta, previous.meta
+    added = set()
+    changed = set()
+
+    for row, pid in enumerate(current.pid):
+        old = prev_rows.pop(pid, None)
+        if old is None:
+            added.add(pid)
+            continue
+        # Сведения процесса берутся из кэша источника: другой объект -
+        # другой процесс с тем же PID или обновленная командная строка
+        if cur_meta[row] is not prev_meta[old]:
+            changed.add(pid)
+            continue
+        for cur_column, prev_column in columns:
+            if cur_column[row] != prev_column[old]:
+                changed.add(pid)
+                break
+
+    # Оставшиеся в словаре PID отсутствуют в новом снимке
+    removed = set(prev_rows)
+    return added, removed, changed
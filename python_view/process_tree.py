@@ -0,0 +1,300 @@
+"""Дерево процессов с суммами по поддеревьям.
+
+Индекс родитель -> дети обновляется по дельте снимка (ProcessDelta):
+новые процессы подвешиваются к родителю, завершившиеся отцепляются, а для
+изменившихся разница значений прибавляется к суммам всех предков. Суммы
+ЦП, памяти, диска и сети по поддеревьям поддерживаются за
+O(изменений · глубина дерева), без обхода всего снимка на каждом такте.
+
+Процесс, родителя которого нет в снимке (родитель завершился или PID
+родителя равен 0), становится корнем. Связь, которая замкнула бы цикл
+(при повторном использовании PID), тоже не создается.
+
+Структурные изменения при применении дельты выполняются по шагам
+(удаление узла, вставка новых узлов под одного родителя, перенос узла к
+другому родителю), и наблюдатель TreeObserver получает уведомления до и
+после каждого шага - так модель Qt сообщает представлению о строках.
+"""
+
+
+# Колонки сумм по поддереву в порядке хранения
+TREE_COLUMNS = ('cpu', 'rss', 'disk', 'network')
+
+
+def _row_values(table, row) -> list:
+    return [
+        table.cpu[row],
+        table.rss[row],
+        table.disk_read[row] + table.disk_write[row],
+        table.net_sent[row] + table.net_recv[row],
+    ]
+
+
+def _accumulate(pending, node, cpu, rss, disk, network):
+    values = pending.get(node)
+    if values is None:
+        pending[node] = [cpu, rss, disk, network]
+    else:
+        values[0] += cpu
+        values[1] += rss
+        values[2] += disk
+        values[3] += network
+
+
+class TreeObserver:
+    """Наблюдатель структурных шагов ProcessTree.apply; по умолчанию ничего не делает.
+
+    begin_* вызывается, пока дерево еще в прежнем состоянии, end_* - после шага.
+    parent - PID родителя или None для корней.
+    """
+
+    def begin_remove(self, pid):
+        """Узел pid (уже без детей) удаляется из детей своего родителя"""
+
+    def end_remove(self, pid):
+        pass
+
+    def begin_insert(self, parent, pids):
+        """Новые узлы pids (с их поддеревьями) добавляются в конец детей parent"""
+
+    def end_insert(self, parent, pids):
+        pass
+
+    def begin_move(self, pid, parent):
+        """Узел pid с поддеревом переносится в конец детей parent"""
+
+    def end_move(self, pid, parent):
+        pass
+
+
+_SILENT = TreeObserver()
+
+
+class ProcessTree:
+    """Индекс родитель -> дети с суммами значений по поддеревьям"""
+
+    def __init__(self):
+        self.roots = set()   # PID процессов без родителя в снимке
+        self._parent = {}    # pid -> pid родителя или None для корня
+        self._children = {}  # pid -> множество pid детей
+        self._ppid = {}      # pid -> PID родителя из снимка
+        self._own = {}       # pid -> значения самого процесса
+        self._totals = {}    # pid -> суммы по поддереву, включая сам процесс
+
+    def __len__(self):
+        return len(self._own)
+
+    def __contains__(self, pid):
+        return pid in self._own
+
+    def parent(self, pid):
+        """PID родителя в дереве или None для корня"""
+        return self._parent.get(pid)
+
+    def children(self, pid) -> set:
+        return self._children.get(pid, ())
+
+    def own(self, pid) -> tuple:
+        """Значения самого процесса в порядке TREE_COLUMNS"""
+        return tuple(self._own[pid])
+
+    def total(self, pid) -> tuple:
+        """Суммы по поддереву процесса в порядке TREE_COLUMNS"""
+        return tuple(self._totals[pid])
+
+    def value(self, pid, column: int):
+        return self._totals[pid][column]
+
+    def rebuild(self, table):
+        """Полностью перестраивает дерево по снимку"""
+        self.roots = set()
+        self._parent = {}
+        self._children = {}
+        self._ppid = {}
+        self._own = {}
+        self._totals = {}
+        pids = list(table.pid)
+        for row, pid in enumerate(pids):
+            self._create(pid, table.ppid[row], _row_values(table, row))
+        for pid in pids:
+            self._attach(pid)
+
+    def apply(self, table, delta, observer=_SILENT) -> bool:
+        """Применяет дельту снимка; возвращает True, если изменилась структура"""
+        for pid in delta.removed:
+            if pid in self._own:
+                self._remove(pid, observer)
+
+        # Сначала создаем все новые узлы, потом связываем: так не важно,
+        # в каком порядке в дельте идут родитель и ребенок
+        added = [pid for pid in delta.added if pid not in self._own]
+        for pid in added:
+            row = table.row_of(pid)
+            self._create(pid, table.ppid[row], _row_values(table, row))
+        # Дети новых узлов подвешиваются молча: в дерево они попадут
+        # вместе с поддеревом своего нового предка
+        created = set(added)
+        inserted = {}
+        for pid in added:
+            ppid = self._ppid[pid]
+            if ppid in created and not self._is_ancestor(pid, ppid):
+                self._attach(pid)
+            else:
+                inserted.setdefault(self._destination(pid), []).append(pid)
+        for parent, pids in inserted.items():
+            observer.begin_insert(parent, pids)
+            for pid in pids:
+                self._attach(pid)
+            observer.end_insert(parent, pids)
+
+        # Разницы значений копятся по родителям и поднимаются к корням одним
+        # проходом: общий предок многих изменившихся процессов обновляется
+        # один раз за такт, а не по разу на каждого потомка
+        own_values = self._own
+        totals = self._totals
+        parents = self._parent
+        ppids = self._ppid
+        cpu_column, rss_column = table.cpu, table.rss
+        read_column, write_column = table.disk_read, table.disk_write
+        sent_column, recv_column = table.net_sent, table.net_recv
+        ppid_column = table.ppid
+        pending = {}
+        moved = []
+        for pid in delta.changed:
+            own = own_values.get(pid)
+            if own is None:
+                continue
+            row = table.row_of(pid)
+            cpu = cpu_column[row] - own[0]
+            rss = rss_column[row] - own[1]
+            disk = read_column[row] + write_column[row] - own[2]
+            network = sent_column[row] + recv_column[row] - own[3]
+            if cpu or rss or disk or network:
+                own[0] += cpu
+                own[1] += rss
+                own[2] += disk
+                own[3] += network
+                values = totals[pid]
+                values[0] += cpu
+                values[1] += rss
+                values[2] += disk
+                values[3] += network
+                parent = parents[pid]
+                if parent is not None:
+                    _accumulate(pending, parent, cpu, rss, disk, network)
+            if ppid_column[row] != ppids[pid]:
+                moved.append(pid)
+        if pending:
+            self._propagate_pending(pending)
+
+        for pid in moved:
+            # Процесс перешел к другому родителю
+            self._ppid[pid] = table.ppid[table.row_of(pid)]
+            parent = self._destination(pid)
+            if parent != self._parent[pid]:
+                observer.begin_move(pid, parent)
+                self._detach(pid)
+                self._attach(pid)
+                observer.end_move(pid, parent)
+
+        return bool(delta.removed or added or moved)
+
+    def _create(self, pid, ppid, values):
+        self._ppid[pid] = ppid
+        self._own[pid] = values
+        self._totals[pid] = list(values)
+        self._children[pid] = set()
+        self._parent[pid] = None
+
+    def _propagate(self, pid, diff):
+        """Прибавляет diff к суммам всех предков pid"""
+        parents = self._parent
+        totals = self._totals
+        cpu, rss, disk, network = diff
+        ancestor = parents[pid]
+        while ancestor is not None:
+            values = totals[ancestor]
+            values[0] += cpu
+            values[1] += rss
+            values[2] += disk
+            values[3] += network
+            ancestor = parents[ancestor]
+
+    def _propagate_pending(self, pending):
+        """Прибавляет накопленные разницы pending {узел: разница} к узлам и
+        всем их предкам; каждый узел обновляется один раз, от глубоких к корню"""
+        parents = self._parent
+        totals = self._totals
+        depth = {}
+        for node in list(pending):
+            path = []
+            while node is not None and node not in depth:
+                path.append(node)
+                node = parents[node]
+            level = depth[node] if node is not None else -1
+            for node in reversed(path):
+                level += 1
+                depth[node] = level
+        for node in sorted(depth, key=depth.__getitem__, reverse=True):
+            cpu, rss, disk, network = pending[node]
+            values = totals[node]
+            values[0] += cpu
+            values[1] += rss
+            values[2] += disk
+            values[3] += network
+            parent = parents[node]
+            if parent is not None:
+                _accumulate(pending, parent, cpu, rss, disk, network)
+
+    def _is_ancestor(self, pid, node) -> bool:
+        """Является ли pid предком node (или самим node)"""
+        parents = self._parent
+        while node is not None:
+            if node == pid:
+                return True
+            node = parents[node]
+        return False
+
+    def _destination(self, pid):
+        """Родитель, к которому будет подвешен узел (None - корень)"""
+        ppid = self._ppid[pid]
+        if ppid in self._own and not self._is_ancestor(pid, ppid):
+            return ppid
+        return None
+
+    def _attach(self, pid):
+        """Подвешивает узел к родителю из снимка или делает корнем"""
+        ppid = self._destination(pid)
+        if ppid is not None:
+            self._parent[pid] = ppid
+            self._children[ppid].add(pid)
+            self._propagate(pid, self._totals[pid])
+        else:
+            self._parent[pid] = None
+            self.roots.add(pid)
+
+    def _detach(self, pid):
+        """Отцепляет узел вместе с поддеревом от родителя"""
+        parent = self._parent[pid]
+        if parent is None:
+            self.roots.discard(pid)
+            return
+        self._propagate(pid, [-value for value in self._totals[pid]])
+        self._children[parent].discard(pid)
+        self._parent[pid] = None
+
+    def _remove(self, pid, observer=_SILENT):
+        # Дети завершившегося процесса становятся корнями
+        for child in list(self._children[pid]):
+            observer.begin_move(child, None)
+            self._detach(child)
+            self.roots.add(child)
+            observer.end_move(child, None)
+        observer.begin_remove(pid)
+        self._detach(pid)
+        del self._children[pid]
+        del self._parent[pid]
+        del self._ppid[pid]
+        del self._own[pid]
+        del self._totals[pid]
+        observer.end_remove(pid)
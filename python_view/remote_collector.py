@@ -0,0 +1,388 @@
+"""Сбор метрик в отдельном процессе.
+
+Дочерний процесс владеет настоящим источником данных и своим MetricsHub:
+сканирует процессы по расписанию и пишет каждый снимок кадром в кольцевой
+буфер в разделяемой памяти (SharedRing). Процесс GUI не сканирует сам: его
+SystemMetrics получает RingBackend и RingSampler, которые разбирают
+последний кадр прямо из разделяемой памяти - колонки снимка копируются
+в array целиком, без цикла по процессам на Python. Сканирование идет на
+другом ядре и не конкурирует с отрисовкой за GIL.
+
+Кадр: заголовок FRAME_HEADER, имена процессов кадра (UTF-8 через '\\0'),
+индексы имен по строкам, колонки FRAME_COLUMNS и PID дельты процессов
+(новые, завершившиеся, изменившиеся). По дельтам кадров, еще лежащих в
+буфере, RingBackend строит дельту относительно своего предыдущего снимка,
+так что GUI не сравнивает снимки целиком, даже если пропустил кадры.
+
+Завершение процесса, имена владельцев и множители периодов выборки
+передаются дочернему процессу командами через multiprocessing.Pipe.
+"""
+import time
+import struct
+import threading
+import multiprocessing
+from array import array
+from itertools import repeat
+
+from backends import ProcessBackend, create_backend
+from diagnostics import debug_print
+from metrics_hub import MetricsHub
+from process_table import ProcessDelta, merge_deltas
+from scheduler import SamplingScheduler
+from shared_ring import DEFAULT_SLOTS, DEFAULT_SLOT_SIZE, SharedRing
+from system_metrics import SYSTEM_REFRESH_INTERVAL, SystemMetrics
+from system_sampler import SYSTEM_METRICS, SystemSampler
+
+
+# Заголовок кадра: generation, process_generation, поколение-основа дельты,
+# cpu_percent, memory (total, available, percent), disk (read, write),
+# network (sent, recv), cpu_freq, boot_time, число строк, размер имен,
+# размеры дельты (новые, завершившиеся, изменившиеся)
+FRAME_HEADER = struct.Struct('=QQQ10dIIIII')
+
+# Колонки ProcessTable в кадре (порядок байтов - родной, кадр не покидает машину)
+FRAME_COLUMNS = (
+    ('pid', 'I'), ('cpu', 'd'), ('rss', 'Q'), ('disk_read', 'd'), ('disk_write', 'd'),
+    ('net_sent', 'd'), ('net_recv', 'd'), ('is_system', 'b'), ('ppid', 'I'), ('uid', 'I'),
+    ('threads', 'I'), ('handles', 'I'),
+)
+
+# Сколько ждать ответа дочернего процесса на команду (секунды)
+COMMAND_TIMEOUT = 2.0
+
+# Попытки прочитать последний кадр, если писатель перезаписал его во время чтения
+READ_ATTEMPTS = 3
+
+
+def encode_frame(snapshot) -> list:
+    """Части кадра снимка для SharedRing.write"""
+    table = snapshot.processes
+    delta = snapshot.delta
+    # Имена кадра: только встречающиеся в снимке, по локальным номерам
+    local = {}
+    for index in table.name:
+        if index not in local:
+            local[index] = len(local)
+    pool_names = table.pool.names
+    names = '\0'.join(map(pool_names.__getitem__, local)).encode('utf-8')
+    header = FRAME_HEADER.pack(
+        snapshot.generation,
+        snapshot.process_generation,
+        delta.base_generation,
+        snapshot.cpu_percent,
+        snapshot.memory.get('total', 0),
+        snapshot.memory.get('available', 0),
+        snapshot.memory.get('percent', 0),
+        snapshot.disk.get('read_bytes', 0.0),
+        snapshot.disk.get('write_bytes', 0.0),
+        snapshot.network.get('bytes_sent', 0.0),
+        snapshot.network.get('bytes_recv', 0.0),
+        snapshot.cpu_freq.get('current', 0.0),
+        snapshot.boot_time,
+        len(table), len(names), len(delta.added), len(delta.removed), len(delta.changed)
+    )
+    parts = [header, names, array('I', map(local.__getitem__, table.name))]
+    parts.extend(getattr(table, column) for column, _ in FRAME_COLUMNS)
+    parts.extend(array('I', pids) for pids in (delta.added, delta.removed, delta.changed))
+    return parts
+
+
+def _frame_delta(frame, header) -> ProcessDelta:
+    """Дельта процессов из хвоста кадра"""
+    (_, process_generation, base_generation, *_, rows, names_size,
+     n_added, n_removed, n_changed) = header
+    offset = FRAME_HEADER.size + names_size + 4 * rows
+    offset += sum(array(typecode).itemsize for _, typecode in FRAME_COLUMNS) * rows
+    sets = []
+    for count in (n_added, n_removed, n_changed):
+        pids = array('I')
+        pids.frombytes(frame[offset:offset + 4 * count])
+        sets.append(set(pids))
+        offset += 4 * count
+    return ProcessDelta(process_generation, base_generation, *sets)
+
+
+def _system_values(header) -> dict:
+    (_, _, _, cpu_percent, mem_total, mem_available, mem_percent, disk_read, disk_write,
+     net_sent, net_recv, cpu_freq, boot_time) = header[:13]
+    return {
+        'cpu_percent': cpu_percent,
+        'memory': {"total": mem_total, "available": mem_available, "percent": mem_percent},
+        'disk': {"read_bytes": disk_read, "write_bytes": disk_write},
+        'network': {"bytes_sent": net_sent, "bytes_recv": net_recv},
+        'cpu_freq': {"current": cpu_freq},
+        'boot_time': boot_time,
+    }
+
+
+def collector_main(conn, ring_name, backend_name, intervals):
+    """Точка входа дочернего процесса: сканирование по расписанию и запись кадров"""
+    ring = SharedRing.attach(ring_name)
+    metrics = SystemMetrics(create_backend(backend_name))
+    hub = MetricsHub(metrics)
+
+    def publish(snapshot):
+        try:
+            ring.write(encode_frame(snapshot))
+        except ValueError as e:
+            debug_print(f"Снимок не записан в буфер: {e}")
+
+    hub.subscribe(publish)
+    scheduler = SamplingScheduler()
+    if metrics.sampler is not None:
+        scheduler.add('system', intervals['system'], lambda: hub.refresh(scan_processes=False))
+    scheduler.add('processes', intervals['processes'], lambda: hub.refresh(scan_processes=True))
+
+    try:
+        while True:
+            if not conn.poll(scheduler.run_pending()):
+                continue
+            # Номер запроса возвращается с ответом: так GUI отличает
+            # опоздавший ответ на прежний запрос от ответа на текущий
+            sequence, command, *args = conn.recv()
+            if command == 'stop':
+                break
+            if command == 'terminate':
+                conn.send((sequence, metrics.terminate_process(*args)))
+            elif command == 'user_name':
+                conn.send((sequence, metrics.backend.user_name(*args) if metrics.backend else None))
+            elif command == 'backoff':
+                name, factor = args
+                if name == 'processes' or metrics.sampler is not None:
+                    scheduler.set_factor(name, factor)
+    except (EOFError, OSError, KeyboardInterrupt):
+        # Процесс GUI завершился, не остановив сборщик
+        pass
+    finally:
+        hub.unsubscribe(publish)
+        if metrics.backend is not None:
+            metrics.backend.close()
+        ring.close()
+
+
+class RemoteCollector:
+    """Дочерний процесс сбора и кольцевой буфер его кадров (сторона GUI)"""
+
+    def __init__(self, backend_name=None, intervals=None, slots=DEFAULT_SLOTS,
+                 slot_size=DEFAULT_SLOT_SIZE):
+        if intervals is None:
+            intervals = {'system': SYSTEM_REFRESH_INTERVAL, 'processes': 1.0}
+        self.ring = SharedRing(slots=slots, slot_size=slot_size)
+        # spawn - единственный способ запуска под Windows; так же и под Linux,
+        # чтобы дочерний процесс не наследовал Qt и потоки GUI
+        context = multiprocessing.get_context('spawn')
+        self._conn, child_conn = context.Pipe()
+        self._lock = threading.Lock()
+        self._sequence = 0  # Номер последнего запроса с ответом
+        self.process = context.Process(
+            target=collector_main, args=(child_conn, self.ring.name, backend_name, intervals),
+            name='task-manager-collector', daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def request(self, *command):
+        """Команда с ответом; None, если дочерний процесс не ответил.
+
+        Ответы на прежние запросы, пришедшие после их тайм-аута, отбрасываются
+        по номеру запроса.
+        """
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            try:
+                self._conn.send((sequence,) + command)
+                deadline = time.monotonic() + COMMAND_TIMEOUT
+                while self._conn.poll(max(0.0, deadline - time.monotonic())):
+                    answer, result = self._conn.recv()
+                    if answer == sequence:
+                        return result
+            except (EOFError, OSError) as e:
+                debug_print(f"Сборщик не ответил на {command[0]}: {e}")
+                return None
+        debug_print(f"Сборщик не ответил на {command[0]} за {COMMAND_TIMEOUT} с")
+        return None
+
+    def send(self, *command):
+        """Команда без ответа"""
+        with self._lock:
+            try:
+                self._conn.send((0,) + command)
+            except OSError as e:
+                debug_print(f"Сборщик недоступен: {e}")
+
+    def read_latest(self):
+        """(номер, кадр, заголовок) последнего кадра или None; кадр - memoryview
+        разделяемой памяти, после разбора нужно проверить ring.valid(номер)"""
+        ring = self.ring
+        for _ in range(READ_ATTEMPTS):
+            number = ring.latest()
+            frame = ring.read(number)
+            if frame is None:
+                if number == 0:
+                    return None
+                continue
+            header = FRAME_HEADER.unpack_from(frame, 0)
+            if ring.valid(number):
+                return number, frame, header
+        return None
+
+    def close(self):
+        self.send('stop')
+        self.process.join(COMMAND_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self._conn.close()
+        self.ring.close()
+
+
+class RingBackend(ProcessBackend):
+    """Источник данных о процессах из кадров дочернего процесса сбора"""
+
+    name = 'ring'
+
+    def __init__(self, collector):
+        self.collector = collector
+        self._boot_time = 0.0
+        self._table = None               # Последний заполненный снимок
+        self._generation = None          # Его поколение процессов в дочернем процессе
+        self._changes_base = None        # Снимок, относительно которого посчитана дельта
+        self._changes = None             # (added, removed, changed) или None
+        self._factors = {}               # Множители периодов, переданные сборщику
+
+    def is_available(self) -> bool:
+        return self.collector.process.is_alive()
+
+    def scan(self, table):
+        ring = self.collector.ring
+        for _ in range(READ_ATTEMPTS):
+            latest = self.collector.read_latest()
+            if latest is None:
+                return
+            number, frame, header = latest
+            self._fill(table, frame, header)
+            delta = self._delta_since(number, frame, header)
+            frame.release()
+            if ring.valid(number):
+                break
+            # Кадр перезаписан во время чтения: начинаем заново
+            for column, _ in FRAME_COLUMNS:
+                del getattr(table, column)[:]
+            del table.name[:]
+            del table.meta[:]
+        else:
+            return
+
+        process_generation = header[1]
+        self._boot_time = header[12]
+        self._changes_base = self._table
+        if delta is not None:
+            self._changes = (delta.added, delta.removed, delta.changed)
+        elif process_generation == self._generation:
+            self._changes = (set(), set(), set())
+        else:
+            self._changes = None
+        self._table = table
+        self._generation = process_generation
+
+    @staticmethod
+    def _fill(table, frame, header):
+        rows, names_size = header[13], header[14]
+        offset = FRAME_HEADER.size
+        names = bytes(frame[offset:offset + names_size]).decode('utf-8').split('\0')
+        offset += names_size
+        # Локальные номера имен кадра -> индексы в пуле снимка
+        pool_index = list(map(table.pool.intern, names))
+        local = array('I')
+        local.frombytes(frame[offset:offset + 4 * rows])
+        offset += 4 * rows
+        table.name.extend(map(pool_index.__getitem__, local))
+        for column, typecode in FRAME_COLUMNS:
+            values = getattr(table, column)
+            size = values.itemsize * rows
+            values.frombytes(frame[offset:offset + size])
+            offset += size
+        table.meta.extend(repeat(None, rows))
+
+    def _delta_since(self, number, frame, header):
+        """Дельта от поколения предыдущего снимка к кадру number по дельтам
+        кадров в буфере; None, если нужные кадры уже перезаписаны"""
+        target = self._generation
+        if target is None or header[1] == target:
+            return None
+        ring = self.collector.ring
+        deltas = []
+        generation = header[1]  # Поколение, дельту к которому ищем
+        delta = _frame_delta(frame, header)
+        while True:
+            # Кадры только системных метрик повторяют дельту предыдущего
+            # кадра с тем же поколением процессов и пропускаются
+            if delta.generation == generation:
+                deltas.append(delta)
+                if delta.base_generation == target:
+                    break
+                generation = delta.base_generation
+            number -= 1
+            older = ring.read(number)
+            if older is None:
+                return None
+            older_header = FRAME_HEADER.unpack_from(older, 0)
+            delta = _frame_delta(older, older_header)
+            older.release()
+            if not ring.valid(number) or delta.generation < generation:
+                return None
+        merged = deltas.pop()
+        while deltas:
+            merged = merge_deltas(merged, deltas.pop())
+        return merged
+
+    def changes(self, previous, current):
+        if current is self._table and previous is self._changes_base:
+            return self._changes
+        return None
+
+    def get_boot_time(self) -> float:
+        return self._boot_time
+
+    def user_name(self, uid: int):
+        return self.collector.request('user_name', uid)
+
+    def terminate_process(self, pid: int) -> bool:
+        return bool(self.collector.request('terminate', pid))
+
+    def set_backoff(self, name, factor):
+        if self._factors.get(name) != factor:
+            self._factors[name] = factor
+            self.collector.send('backoff', name, factor)
+
+    def close(self):
+        self.collector.close()
+
+
+class RingSampler(SystemSampler):
+    """Системные метрики из заголовка последнего кадра дочернего процесса"""
+
+    provides = SYSTEM_METRICS
+
+    def __init__(self, collector):
+        self.collector = collector
+
+    def is_available(self) -> bool:
+        return True
+
+    def sample(self) -> dict:
+        latest = self.collector.read_latest()
+        if latest is None:
+            return {}
+        _, frame, header = latest
+        frame.release()
+        values = _system_values(header)
+        del values['boot_time']
+        return values
+
+
+def create_remote_metrics(backend_name=None, intervals=None):
+    """SystemMetrics, получающий данные от дочернего процесса сбора"""
+    collector = RemoteCollector(backend_name, intervals)
+    return SystemMetrics(RingBackend(collector), RingSampler(collector))
@@ -0,0 +1,125 @@
+"""Планировщик выборок с отдельной периодичностью для каждой группы метрик.
+
+Сроки считаются по монотонным часам от запланированного, а не фактического
+времени запуска, поэтому период не "уплывает". Для каждой задачи
+накапливается статистика: отклонение запуска от срока (jitter) и число
+пропущенных сроков. Период задачи можно временно увеличить множителем
+(backoff), например когда окно свернуто или система нагружена.
+"""
+import time
+import threading
+
+from diagnostics import debug_print
+
+
+class ScheduledTask:
+    """Периодическая задача планировщика"""
+
+    __slots__ = (
+        'name', 'interval', 'func', 'factor', 'next_due', 'runs', 'missed',
+        'jitter_total', 'jitter_max', 'last_duration'
+    )
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval      # Базовый период (секунды)
+        self.func = func
+        self.factor = 1.0             # Множитель периода (backoff)
+        self.next_due = None          # Следующий срок по монотонным часам
+        self.runs = 0
+        self.missed = 0               # Пропущенные сроки
+        self.jitter_total = 0.0       # Сумма опозданий относительно срока
+        self.jitter_max = 0.0
+        self.last_duration = 0.0      # Длительность последнего запуска
+
+    @property
+    def effective_interval(self) -> float:
+        return self.interval * self.factor
+
+
+class SamplingScheduler:
+    """Запускает задачи по их срокам в одном потоке"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._tasks = {}
+        self._wakeup = threading.Event()
+
+    def add(self, name, interval, func, delay=None):
+        """Добавляет задачу; первый запуск - сразу или через delay секунд"""
+        task = ScheduledTask(name, interval, func)
+        if delay is not None:
+            task.next_due = self._clock() + delay
+        self._tasks[name] = task
+
+    def set_factor(self, name, factor):
+        """Задает множитель периода задачи (вызывать из потока планировщика)"""
+        task = self._tasks[name]
+        if factor == task.factor:
+            return
+        if task.next_due is not None:
+            # Переносим срок так, будто задача всегда шла с новым периодом;
+            # срок в прошлом не считаем пропущенным
+            last_run = task.next_due - task.effective_interval
+            task.next_due = max(last_run + task.interval * factor, self._clock())
+        task.factor = factor
+
+    def run_pending(self) -> float:
+        """Выполняет задачи, срок которых наступил; возвращает время до следующего срока"""
+        now = self._clock()
+        for task in self._tasks.values():
+            if task.next_due is None:
+                task.next_due = now
+            if now < task.next_due:
+                continue
+
+            lateness = now - task.next_due
+            period = task.effective_interval
+            # Сроки, полностью пропущенные из-за опоздания, не навёрстываем
+            skipped = int(lateness // period)
+            task.missed += skipped
+            task.jitter_total += lateness - skipped * period
+            task.jitter_max = max(task.jitter_max, lateness - skipped * period)
+            task.next_due += (skipped + 1) * period
+
+            started = self._clock()
+            try:
+                task.func()
+            except Exception as e:
+                debug_print(f"Ошибка в задаче планировщика {task.name}: {e}")
+            task.runs += 1
+            task.last_duration = self._clock() - started
+            now = self._clock()
+
+        if not self._tasks:
+            return 1.0
+        return max(0.0, min(task.next_due for task in self._tasks.values()) - self._clock())
+
+    def wait(self, timeout):
+        """Ждет до следующего срока или до вызова wake()"""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def wake(self):
+        """Прерывает ожидание, например при остановке или смене периода"""
+        self._wakeup.set()
+
+    def run(self, stop_event):
+        """Цикл планировщика до установки stop_event"""
+        while not stop_event.is_set():
+            self.wait(self.run_pending())
+
+    def stats(self) -> dict:
+        """Статистика планирования по задачам (время в миллисекундах)"""
+        result = {}
+        for task in self._tasks.values():
+            runs = task.runs or 1
+            result[task.name] = {
+                'interval_ms': task.effective_interval * 1000.0,
+                'runs': task.runs,
+                'missed': task.missed,
+                'jitter_avg_ms': task.jitter_total / runs * 1000.0,
+                'jitter_max_ms': task.jitter_max * 1000.0,
+                'last_duration_ms': task.last_duration * 1000.0,
+            }
+        return result
@@ -0,0 +1,204 @@
+"""Индекс поиска процессов по имени, PID и командной строке.
+
+Каждый процесс описывается набором строк поиска (имя в нижнем регистре и
+PID). Одинаковые имена хранятся один раз: строка -> множество PID. Для
+запросов не короче NGRAM символов строки-кандидаты находятся пересечением
+множеств по n-граммам запроса и проверяются на вхождение подстроки, для
+более коротких - бинарным поиском префикса в отсортированном списке строк.
+Командные строки (если источник их предоставляет) индексируются по
+n-граммам отдельно от имен и ищутся только запросами не короче NGRAM
+символов: префикс командной строки - обычно путь, общий для многих
+процессов.
+
+Индекс обновляется по дельте снимка только для добавленных, завершившихся
+и сменивших имя процессов, поэтому поиск на каждом такте не перестраивается.
+"""
+from bisect import bisect_left, insort
+
+
+# Длина n-грамм; более короткие запросы ищутся по префиксу
+NGRAM = 3
+
+
+def normalize_query(text) -> str:
+    """Запрос в том виде, в котором он сравнивается со строками поиска"""
+    return text.strip().lower()
+
+
+def _ngrams(term):
+    return {term[i:i + NGRAM] for i in range(len(term) - NGRAM + 1)}
+
+
+def _containing(grams, query):
+    """Строки из индекса n-грамм grams, содержащие query (не короче NGRAM)"""
+    postings = []
+    for gram in _ngrams(query):
+        holders = grams.get(gram)
+        if not holders:
+            return []
+        postings.append(holders)
+    postings.sort(key=len)
+    candidates = postings[0].intersection(*postings[1:])
+    return [text for text in candidates if query in text]
+
+
+class ProcessSearchIndex:
+    """Поддерживаемый индекс строк поиска процессов"""
+
+    def __init__(self):
+        self._terms_of = {}   # pid -> строки поиска процесса
+        self._source_of = {}  # pid -> (индекс имени в пуле, сведения источника) для поиска переименований
+        self._pids = {}       # строка поиска -> множество PID
+        self._grams = {}      # n-грамма -> множество строк поиска
+        self._sorted = []     # все строки поиска по возрастанию (для префиксов)
+        self._commands = {}   # командная строка в нижнем регистре -> множество PID
+        self._command_grams = {}  # n-грамма -> множество командных строк
+
+    def __len__(self):
+        return len(self._terms_of)
+
+    @staticmethod
+    def _terms(table, row):
+        return (table.lower_name_of(row), str(table.pid[row]))
+
+    def rebuild(self, table):
+        """Полностью перестраивает индекс по снимку"""
+        self._terms_of = {}
+        self._source_of = {}
+        self._pids = {}
+        self._grams = {}
+        self._commands = {}
+        self._command_grams = {}
+        pids = self._pids
+        for row, pid in enumerate(table.pid):
+            terms = self._terms(table, row)
+            self._terms_of[pid] = terms
+            self._add_source(pid, table, row)
+            for term in terms:
+                owners = pids.get(term)
+                if owners is None:
+                    pids[term] = {pid}
+                else:
+                    owners.add(pid)
+        grams = self._grams
+        for term in pids:
+            for gram in _ngrams(term):
+                grams.setdefault(gram, set()).add(term)
+        self._sorted = sorted(pids)
+
+    def apply(self, table, delta) -> set:
+        """Применяет дельту снимка; возвращает PID из delta.changed,
+        у которых изменились строки поиска (процесс сменил имя или командную строку)"""
+        for pid in delta.removed:
+            self._remove(pid)
+        for pid in delta.added:
+            self._add(pid, table, table.row_of(pid))
+        # Смена имени или сведений источника (новый объект - новые строки)
+        # делает процесс измененным в дельте, поэтому сверяются только они
+        sources = self._source_of
+        renamed = set()
+        for pid in delta.changed:
+            row = table.row_of(pid)
+            if row is None or sources.get(pid) == (table.name[row], table.meta[row]):
+                continue
+            renamed.add(pid)
+            self._remove(pid)
+            self._add(pid, table, row)
+        return renamed
+
+    def _add(self, pid, table, row):
+        if pid in self._terms_of:
+            self._remove(pid)
+        terms = self._terms(table, row)
+        self._terms_of[pid] = terms
+        self._add_source(pid, table, row)
+        for term in terms:
+            owners = self._pids.get(term)
+            if owners is None:
+                self._pids[term] = {pid}
+                insort(self._sorted, term)
+                for gram in _ngrams(term):
+                    self._grams.setdefault(gram, set()).add(term)
+            else:
+                owners.add(pid)
+
+    def _remove(self, pid):
+        terms = self._terms_of.pop(pid, None)
+        if terms is None:
+            return
+        _, meta = self._source_of.pop(pid)
+        if meta is not None and meta.cmdline:
+            command = meta.cmdline.lower()
+            owners = self._commands[command]
+            owners.discard(pid)
+            if not owners:
+                del self._commands[command]
+                self._discard_grams(self._command_grams, command)
+        for term in terms:
+            owners = self._pids[term]
+            owners.discard(pid)
+            if owners:
+                continue
+            # Строку больше не использует ни один процесс
+            del self._pids[term]
+            del self._sorted[bisect_left(self._sorted, term)]
+            self._discard_grams(self._grams, term)
+
+    @staticmethod
+    def _discard_grams(grams, text):
+        for gram in _ngrams(text):
+            holders = grams[gram]
+            holders.discard(text)
+            if not holders:
+                del grams[gram]
+
+    def _add_source(self, pid, table, row):
+        meta = table.meta[row]
+        self._source_of[pid] = (table.name[row], meta)
+        if meta is not None and meta.cmdline:
+            command = meta.cmdline.lower()
+            owners = self._commands.get(command)
+            if owners is not None:
+                owners.add(pid)
+                return
+            self._commands[command] = {pid}
+            for gram in _ngrams(command):
+                self._command_grams.setdefault(gram, set()).add(command)
+
+    def _matching_terms(self, query):
+        if len(query) < NGRAM:
+            terms = self._sorted
+            i = bisect_left(terms, query)
+            result = []
+            while i < len(terms) and terms[i].startswith(query):
+                result.append(terms[i])
+                i += 1
+            return result
+        return _containing(self._grams, query)
+
+    def search(self, query) -> set:
+        """PID процессов, у которых строка поиска содержит query
+        (короче NGRAM символов - начинается с query)"""
+        pids = self._pids
+        result = set()
+        query = normalize_query(query)
+        for term in self._matching_terms(query):
+            result |= pids[term]
+        if len(query) >= NGRAM:
+            commands = self._commands
+            for command in _containing(self._command_grams, query):
+                result |= commands[command]
+        return result
+
+    def matches(self, pid, query) -> bool:
+        """Подходит ли процесс под запрос (тот же критерий, что у search)"""
+        terms = self._terms_of.get(pid)
+        if terms is None:
+            return False
+        query = normalize_query(query)
+        if len(query) < NGRAM:
+            return any(term.startswith(query) for term in terms)
+        if any(query in term for term in terms):
+            return True
+        meta = self._source_of[pid][1]
+        return meta is not None and query in meta.cmdline.lower()
@@ -0,0 +1,119 @@
+"""Кольцевой буфер кадров в разделяемой памяти (один писатель, много читателей).
+
+Буфер - сегмент multiprocessing.shared_memory из SLOTS ячеек фиксированного
+размера. Кадр номер n пишется в ячейку n % SLOTS. Каждая ячейка защищена
+счетчиком-версией (seqlock): перед записью писатель делает его нечетным
+(2n - 1), после записи - четным (2n). Читатель проверяет счетчик до и после
+чтения: если он изменился или нечетный, кадр был перезаписан во время
+чтения, и прочитанное отбрасывается. Писатель никогда не ждет читателей.
+
+Читатель получает memoryview ячейки без копирования и разбирает кадр прямо
+из разделяемой памяти; валидность прочитанного подтверждает вызов valid().
+"""
+import struct
+from multiprocessing import shared_memory
+
+
+MAGIC = b'TMRING\x00\x01'
+
+# Заголовок буфера: сигнатура, число ячеек, размер ячейки, номер последнего кадра
+_HEADER = struct.Struct('<8sIIQ')
+# Заголовок ячейки: версия (seqlock), длина кадра
+_SLOT_HEADER = struct.Struct('<QQ')
+_LATEST_OFFSET = 16
+
+# Параметры по умолчанию: 4 ячейки по 8 МБ (~100 тысяч процессов на кадр)
+DEFAULT_SLOTS = 4
+DEFAULT_SLOT_SIZE = 8 * 1024 * 1024
+
+
+class FrameTooLarge(ValueError):
+    """Кадр не помещается в ячейку буфера"""
+
+
+class SharedRing:
+    """Кольцевой буфер кадров переменной длины в разделяемой памяти"""
+
+    def __init__(self, name=None, slots=DEFAULT_SLOTS, slot_size=DEFAULT_SLOT_SIZE, create=True):
+        if create:
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=True, size=_HEADER.size + slots * (_SLOT_HEADER.size + slot_size)
+            )
+            _HEADER.pack_into(self._shm.buf, 0, MAGIC, slots, slot_size, 0)
+        else:
+            # Подключившийся процесс (spawn) делит resource_tracker с создателем,
+            # поэтому сегмент удаляется только создателем в close()
+            self._shm = shared_memory.SharedMemory(name=name)
+            magic, slots, slot_size, _ = _HEADER.unpack_from(self._shm.buf, 0)
+            if magic != MAGIC:
+                self._shm.close()
+                raise ValueError(f"{name}: не буфер кадров")
+        self.owner = create
+        self.slots = slots
+        self.slot_size = slot_size
+        self._buf = self._shm.buf
+        self._written = 0
+
+    @classmethod
+    def attach(cls, name):
+        """Подключается к буферу, созданному другим процессом"""
+        return cls(name, create=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def _slot_offset(self, number) -> int:
+        return _HEADER.size + (number % self.slots) * (_SLOT_HEADER.size + self.slot_size)
+
+    def latest(self) -> int:
+        """Номер последнего записанного кадра (0 - кадров еще нет)"""
+        return struct.unpack_from('<Q', self._buf, _LATEST_OFFSET)[0]
+
+    def write(self, parts) -> int:
+        """Пишет кадр из частей (bytes-like) подряд; возвращает номер кадра"""
+        views = [memoryview(part).cast('B') for part in parts]
+        length = sum(map(len, views))
+        if length > self.slot_size:
+            raise FrameTooLarge(f"кадр {length} байт больше ячейки {self.slot_size} байт")
+        number = self._written + 1
+        buf = self._buf
+        offset = self._slot_offset(number)
+        _SLOT_HEADER.pack_into(buf, offset, 2 * number - 1, length)
+        position = offset + _SLOT_HEADER.size
+        for view in views:
+            buf[position:position + len(view)] = view
+            position += len(view)
+        struct.pack_into('<Q', buf, offset, 2 * number)
+        struct.pack_into('<Q', buf, _LATEST_OFFSET, number)
+        self._written = number
+        return number
+
+    def read(self, number):
+        """memoryview кадра без копирования или None, если кадр уже
+        перезаписан или еще пишется. После разбора нужно проверить valid()"""
+        if number <= 0:
+            return None
+        offset = self._slot_offset(number)
+        version, length = _SLOT_HEADER.unpack_from(self._buf, offset)
+        if version != 2 * number or length > self.slot_size:
+            return None
+        start = offset + _SLOT_HEADER.size
+        return self._buf[start:start + length]
+
+    def valid(self, number) -> bool:
+        """Не был ли кадр перезаписан с момента read()"""
+        return struct.unpack_from('<Q', self._buf, self._slot_offset(number))[0] == 2 * number
+
+    def close(self):
+        self._buf = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Остались memoryview кадров; сегмент освободится вместе с ними
+            pass
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
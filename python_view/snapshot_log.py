@@ -0,0 +1,322 @@
+"""Запись и воспроизведение снимков метрик.
+
+Журнал - файл только для дописывания: заголовок и записи вида
+[длина полезной нагрузки, тип, время снимка][нагрузка, сжатая zlib].
+Запись хранит системные метрики и процессы в колоночном виде: опорный
+кадр (keyframe) - весь снимок, дельта - только исчезнувшие, новые и
+изменившиеся процессы относительно предыдущей записи. Опорный кадр пишется
+каждые KEYFRAME_INTERVAL записей, поэтому для перехода к моменту времени
+достаточно разреженного индекса опорных кадров.
+
+Читатель отображает файл в память (mmap), строит индекс по заголовкам
+записей без распаковки и восстанавливает MetricsSnapshot для каждой записи.
+Оборванная последняя запись (например, после аварийного завершения)
+игнорируется.
+"""
+import os
+import sys
+import mmap
+import zlib
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+
+from metrics_hub import MetricsSnapshot
+from process_table import NamePool, ProcessDelta, ProcessTable, diff_tables
+
+
+MAGIC = b'TMSNAP\x00\x04'
+
+# Заголовок записи: длина нагрузки, тип записи, время снимка
+RECORD_HEADER = struct.Struct('<IBd')
+KEYFRAME = 1
+DELTA = 2
+
+# Системная часть: generation, process_generation, cpu_percent,
+# memory (total, available, percent), disk (read, write),
+# network (sent, recv), cpu_freq, boot_time
+SYSTEM_STRUCT = struct.Struct('<QQ10d')
+
+# Опорный кадр пишется каждые KEYFRAME_INTERVAL записей
+KEYFRAME_INTERVAL = 64
+
+_COUNT = struct.Struct('<I')
+_DELTA_COUNTS = struct.Struct('<III')
+
+# Колонки строк процессов в журнале (как в ProcessTable) и их типы array
+_ROW_COLUMNS = (
+    ('pid', 'I'), ('cpu', 'd'), ('rss', 'Q'), ('disk_read', 'd'), ('disk_write', 'd'),
+    ('net_sent', 'd'), ('net_recv', 'd'), ('is_system', 'b'), ('ppid', 'I'),
+    ('uid', 'I'), ('threads', 'I'), ('handles', 'I'),
+)
+
+_SWAP = sys.byteorder != 'little'
+
+
+def _pack_array(typecode, values) -> bytes:
+    data = array(typecode, values)
+    if _SWAP:
+        data.byteswap()
+    return data.tobytes()
+
+
+def _unpack_array(typecode, buffer, offset, count):
+    data = array(typecode)
+    size = data.itemsize * count
+    data.frombytes(buffer[offset:offset + size])
+    if _SWAP:
+        data.byteswap()
+    return data, offset + size
+
+
+def _encode_rows(table, rows) -> bytes:
+    """Строки снимка в колоночном виде с локальным словарем имен"""
+    local = {}
+    name_index = [local.setdefault(table.name_of(row), len(local)) for row in rows]
+    names = '\0'.join(local).encode('utf-8')
+    parts = [_COUNT.pack(len(rows)), _COUNT.pack(len(names)), names, _pack_array('I', name_index)]
+    for column, typecode in _ROW_COLUMNS:
+        values = getattr(table, column)
+        parts.append(_pack_array(typecode, [values[row] for row in rows]))
+    return b''.join(parts)
+
+
+def _decode_rows(buffer, offset):
+    """Обратное к _encode_rows: (список строк (pid, name, ...), новое смещение)"""
+    (count,) = _COUNT.unpack_from(buffer, offset)
+    (names_size,) = _COUNT.unpack_from(buffer, offset + 4)
+    offset += 8
+    names = bytes(buffer[offset:offset + names_size]).decode('utf-8').split('\0')
+    offset += names_size
+    name_index, offset = _unpack_array('I', buffer, offset, count)
+    columns = []
+    for _, typecode in _ROW_COLUMNS:
+        values, offset = _unpack_array(typecode, buffer, offset, count)
+        columns.append(values)
+    pids = columns[0]
+    rows = [
+        (pids[i], names[name_index[i]]) + tuple(column[i] for column in columns[1:])
+        for i in range(count)
+    ]
+    return rows, offset
+
+
+def _pack_system(snapshot) -> bytes:
+    return SYSTEM_STRUCT.pack(
+        snapshot.generation,
+        snapshot.process_generation,
+        snapshot.cpu_percent,
+        snapshot.memory.get('total', 0),
+        snapshot.memory.get('available', 0),
+        snapshot.memory.get('percent', 0),
+        snapshot.disk.get('read_bytes', 0.0),
+        snapshot.disk.get('write_bytes', 0.0),
+        snapshot.network.get('bytes_sent', 0.0),
+        snapshot.network.get('bytes_recv', 0.0),
+        snapshot.cpu_freq.get('current', 0.0),
+        snapshot.boot_time
+    )
+
+
+class SnapshotLogWriter:
+    """Дописывает снимки в журнал; подходит как подписчик MetricsHub"""
+
+    def __init__(self, path, keyframe_interval=KEYFRAME_INTERVAL):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._lock = threading.Lock()
+        self._prev_table = None
+        self._since_keyframe = 0
+
+    def append(self, snapshot):
+        """Записывает снимок: опорный кадр или дельту к предыдущей записи"""
+        with self._lock:
+            table = snapshot.processes
+            if self._prev_table is None or self._since_keyframe >= self.keyframe_interval:
+                kind = KEYFRAME
+                processes = _encode_rows(table, range(len(table)))
+                self._since_keyframe = 0
+            else:
+                kind = DELTA
+                processes = self._encode_delta(self._prev_table, table)
+            self._since_keyframe += 1
+            self._prev_table = table
+
+            payload = zlib.compress(_pack_system(snapshot) + processes, 1)
+            self._file.write(RECORD_HEADER.pack(len(payload), kind, snapshot.timestamp))
+            self._file.write(payload)
+            self._file.flush()
+
+    @staticmethod
+    def _encode_delta(previous, current) -> bytes:
+        if current is previous:
+            added = removed = changed = set()  # Процессы не пересканировались
+        else:
+            added, removed, changed = diff_tables(previous, current)
+        # Процесс, сменивший имя, записывается как удаленный и добавленный
+        renamed = {
+            pid for pid in changed
+            if current.name_of(current.row_of(pid)) != previous.name_of(previous.row_of(pid))
+        }
+        removed = sorted(removed | renamed)
+        added_rows = sorted(current.row_of(pid) for pid in added | renamed)
+        changed_rows = sorted(current.row_of(pid) for pid in changed - renamed)
+        return b''.join([
+            _DELTA_COUNTS.pack(len(removed), len(added_rows), len(changed_rows)),
+            _pack_array('I', removed),
+            _encode_rows(current, added_rows),
+            _encode_rows(current, changed_rows),
+        ])
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class SnapshotLogReader:
+    """Чтение журнала снимков через mmap с переходом к моменту времени"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < len(MAGIC):
+            raise ValueError(f"{path}: пустой или не журнал снимков")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = self._map[:len(MAGIC)]
+        if header != MAGIC:
+            self.close()
+            if header[:-1] == MAGIC[:-1]:
+                raise ValueError(f"{path}: неподдерживаемая версия журнала снимков")
+            raise ValueError(f"{path}: не журнал снимков")
+        self._records = 0
+        self._keyframe_times = []    # Разреженный индекс: время опорных кадров
+        self._keyframe_offsets = []  # и их смещения в файле
+        self._end = len(MAGIC)
+        self.start_time = self.end_time = None
+        self._build_index()
+
+    def _build_index(self):
+        data = self._map
+        offset = len(MAGIC)
+        size = len(data)
+        while offset + RECORD_HEADER.size <= size:
+            length, kind, timestamp = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + length
+            if end > size:
+                break  # Оборванная запись в конце файла
+            if kind == KEYFRAME:
+                self._keyframe_times.append(timestamp)
+                self._keyframe_offsets.append(offset)
+            elif not self._keyframe_offsets:
+                raise ValueError(f"{self.path}: дельта без опорного кадра")
+            if self.start_time is None:
+                self.start_time = timestamp
+            self.end_time = timestamp
+            self._records += 1
+            offset = end
+        self._end = offset
+
+    def __len__(self):
+        return self._records
+
+    def frames(self, start=None):
+        """Снимки с момента start (или с начала журнала) в порядке записи"""
+        first = 0
+        if start is not None and self._keyframe_times:
+            first = max(0, bisect_right(self._keyframe_times, start) - 1)
+        if not self._keyframe_offsets:
+            return
+        state = _ReplayState()
+        data = self._map
+        offset = self._keyframe_offsets[first]
+        while offset < self._end:
+            length, kind, timestamp = RECORD_HEADER.unpack_from(data, offset)
+            body = offset + RECORD_HEADER.size
+            payload = zlib.decompress(data[body:body + length])
+            offset = body + length
+            snapshot = state.apply(kind, timestamp, payload)
+            if start is None or timestamp >= start:
+                yield snapshot
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class _ReplayState:
+    """Текущее состояние процессов при последовательном чтении журнала"""
+
+    def __init__(self):
+        self.pool = NamePool()
+        # pid -> (pid, name, cpu, rss, disk_read, disk_write, net_sent, net_recv, is_system, ppid, uid,
+        #         threads, handles)
+        self.rows = {}
+        self.table = None
+        self.process_generation = None
+        self.delta = ProcessDelta(0, 0, frozenset(), frozenset(), frozenset())
+
+    def apply(self, kind, timestamp, payload) -> MetricsSnapshot:
+        system = SYSTEM_STRUCT.unpack_from(payload, 0)
+        offset = SYSTEM_STRUCT.size
+        (generation, process_generation, cpu_percent, mem_total, mem_available, mem_percent,
+         disk_read, disk_write, net_sent, net_recv, cpu_freq, boot_time) = system
+
+        if kind == KEYFRAME:
+            rows, _ = _decode_rows(payload, offset)
+            previous, self.rows = self.rows, {row[0]: row for row in rows}
+            if self.table is None:
+                # Начало чтения: потребитель перестраивается по полному снимку
+                added, removed, changed = set(self.rows), set(), set()
+                base = 0
+            else:
+                added = self.rows.keys() - previous.keys()
+                removed = previous.keys() - self.rows.keys()
+                changed = {
+                    pid for pid in self.rows.keys() & previous.keys()
+                    if self.rows[pid] != previous[pid]
+                }
+                base = self.process_generation
+        else:
+            n_removed, n_added, n_changed = _DELTA_COUNTS.unpack_from(payload, offset)
+            offset += _DELTA_COUNTS.size
+            removed_pids, offset = _unpack_array('I', payload, offset, n_removed)
+            added_rows, offset = _decode_rows(payload, offset)
+            changed_rows, offset = _decode_rows(payload, offset)
+            for pid in removed_pids:
+                self.rows.pop(pid, None)
+            for row in added_rows:
+                self.rows[row[0]] = row
+            for row in changed_rows:
+                self.rows[row[0]] = row
+            added = {row[0] for row in added_rows}
+            removed = set(removed_pids) - added
+            changed = {row[0] for row in changed_rows} | (set(removed_pids) & added)
+            added -= changed
+            base = self.process_generation
+
+        if self.table is None or process_generation != self.process_generation:
+            table = ProcessTable(self.pool)
+            for row in self.rows.values():
+                table.append(*row)
+            self.table = table
+            self.delta = ProcessDelta(process_generation, base, added, removed, changed)
+            self.process_generation = process_generation
+
+        return MetricsSnapshot(
+            generation,
+            process_generation,
+            timestamp,
+            cpu_percent,
+            {"total": mem_total, "available": mem_available, "percent": mem_percent},
+            {"read_bytes": disk_read, "write_bytes": disk_write},
+            {"bytes_sent": net_sent, "bytes_recv": net_recv},
+            {"current": cpu_freq},
+            boot_time,
+            self.table,
+            self.delta
+        )
@@ -0,0 +1,200 @@
+"""Поддерживаемый порядок сортировки таблицы процессов.
+
+Вместо полной сортировки снимка на каждом такте индекс хранит пары
+(ключ, pid) в отсортированном списке и чинит порядок на месте: для
+процесса с изменившимся значением старая пара удаляется, а новая
+вставляется бинарным поиском. Стоимость такта - O(изменений · log n)
+сравнений встроенных типов без компаратора на Python.
+"""
+import heapq
+from bisect import bisect_left, insort
+from itertools import compress
+
+from process_table import DERIVED_COLUMNS
+
+
+# Если изменилась большая доля строк, полная пересортировка почти
+# упорядоченного списка (Timsort) дешевле вставок по одной
+RESORT_FRACTION = 4
+
+# Подмножество меньше 1/SUBSET_FRACTION снимка перестраивается по строкам,
+# большее - отбором колонок целиком
+SUBSET_FRACTION = 8
+
+
+class SortIndex:
+    """Порядок PID по одной колонке снимка.
+
+    Голова (_head) - отсортированный по возрастанию список пар (ключ, pid).
+    Хвост (_tail) - PID без гарантированного порядка, которые идут после
+    головы: в полном режиме это только что добавленные процессы до вызова
+    repair(), в режиме top_k - все процессы за пределами первых top_k.
+    """
+
+    def __init__(self, column='name', descending=False, top_k=None):
+        self.column = column
+        self.descending = descending
+        self.top_k = top_k
+        self._keys = {}          # pid -> текущий ключ сортировки
+        self._head = []
+        self._tail = []
+        self._tail_pos = {}      # pid -> позиция в хвосте
+        self._tail_dirty = False
+
+    def __len__(self):
+        return len(self._head) + len(self._tail)
+
+    def __contains__(self, pid):
+        return pid in self._keys
+
+    def key(self, pid):
+        return self._keys.get(pid)
+
+    def key_of(self, table, row):
+        """Ключ сортировки строки снимка по активной колонке"""
+        column = self.column
+        if column == 'name':
+            return table.lower_name_of(row)
+        if column in DERIVED_COLUMNS:
+            first, second = DERIVED_COLUMNS[column]
+            return getattr(table, first)[row] + getattr(table, second)[row]
+        return getattr(table, column)[row]
+
+    def configure(self, column, descending):
+        """Меняет активную колонку; после этого нужен rebuild()"""
+        self.column = column
+        self.descending = descending
+
+    def rebuild(self, table, pids=None):
+        """Полностью перестраивает индекс по снимку; pids - только эти процессы"""
+        if pids is not None and len(pids) * SUBSET_FRACTION < len(table):
+            # Малое подмножество дешевле собрать по одной строке
+            self._keys = {pid: self.key_of(table, table.row_of(pid)) for pid in pids}
+            self._set_entries(sorted(zip(self._keys.values(), self._keys)))
+            return
+        values = table.lower_names() if self.column == 'name' else table.column(self.column)
+        order = table.pid
+        if pids is not None:
+            # Отбор строк без цикла на Python: маска принадлежности и compress
+            rows = list(compress(range(len(order)), map(pids.__contains__, order)))
+            values = list(map(values.__getitem__, rows))
+            order = list(map(order.__getitem__, rows))
+        self._keys = dict(zip(order, values))
+        self._set_entries(sorted(zip(values, order)))
+
+    def restrict(self, pids) -> bool:
+        """Оставляет в индексе только pids без пересортировки, если все они
+        уже в индексе (запрос поиска сузился); иначе возвращает False"""
+        if self.top_k is not None or self._tail or not self._keys.keys() >= pids:
+            return False
+        self._head = [entry for entry in self._head if entry[1] in pids]
+        self._keys = {pid: self._keys[pid] for pid in pids}
+        return True
+
+    def _set_entries(self, entries):
+        """Раскладывает полностью отсортированные пары на голову и хвост"""
+        top_k = self.top_k
+        if top_k is None or top_k >= len(entries):
+            self._head = entries
+            self._tail = []
+        elif self.descending:
+            self._head = entries[-top_k:]
+            self._tail = [pid for _, pid in reversed(entries[:-top_k])]
+        else:
+            self._head = entries[:top_k]
+            self._tail = [pid for _, pid in entries[top_k:]]
+        self._tail_dirty = True
+
+    def _tail_index(self):
+        if self._tail_dirty:
+            self._tail_pos = dict(zip(self._tail, range(len(self._tail))))
+            self._tail_dirty = False
+        return self._tail_pos
+
+    def pid_at(self, position):
+        """PID процесса на позиции отображения"""
+        head = self._head
+        size = len(head)
+        if position < size:
+            return head[size - 1 - position][1] if self.descending else head[position][1]
+        return self._tail[position - size]
+
+    def position_of(self, pid):
+        """Позиция отображения процесса"""
+        size = len(self._head)
+        tail_position = self._tail_index().get(pid)
+        if tail_position is not None:
+            return size + tail_position
+        i = bisect_left(self._head, (self._keys[pid], pid))
+        return size - 1 - i if self.descending else i
+
+    def remove_at(self, position):
+        """Удаляет процесс на позиции отображения, возвращает его PID.
+
+        При удалении нескольких процессов позиции нужно обходить по убыванию.
+        """
+        head = self._head
+        size = len(head)
+        if position < size:
+            pid = head.pop(size - 1 - position if self.descending else position)[1]
+        else:
+            pid = self._tail.pop(position - size)
+            self._tail_dirty = True
+        del self._keys[pid]
+        return pid
+
+    def append(self, pid, key):
+        """Добавляет процесс в конец; место в порядке он получит в repair()"""
+        self._keys[pid] = key
+        self._tail.append(pid)
+        self._tail_dirty = True
+
+    def repair(self, changed):
+        """Чинит порядок после изменения ключей changed (pid -> новый ключ)"""
+        keys = self._keys
+        head = self._head
+        tail_index = self._tail_index()
+        loose = []  # PID, вынутые из головы из-за нового ключа
+
+        for pid, key in changed.items():
+            old = keys.get(pid)
+            if old is None or old == key:
+                continue
+            if pid not in tail_index:
+                del head[bisect_left(head, (old, pid))]
+                loose.append(pid)
+            keys[pid] = key
+
+        if self.top_k is None:
+            loose.extend(self._tail)
+            self._tail = []
+            self._tail_dirty = True
+            if len(loose) * RESORT_FRACTION > len(head):
+                head.extend([(keys[pid], pid) for pid in loose])
+                head.sort()
+            else:
+                for pid in loose:
+                    insort(head, (keys[pid], pid))
+            return
+
+        # Режим top_k: в голову попадают лучшие из головы, вынутых и хвоста
+        others = loose + self._tail
+        select = heapq.nlargest if self.descending else heapq.nsmallest
+        for pid in select(self.top_k, others, key=keys.__getitem__):
+            insort(head, (keys[pid], pid))
+
+        extra = len(head) - self.top_k
+        evicted = []
+        if extra > 0:
+            if self.descending:
+                evicted = [pid for _, pid in reversed(head[:extra])]
+                del head[:extra]
+            else:
+                evicted = [pid for _, pid in head[-extra:]]
+                del head[-extra:]
+
+        # Вытесненные из головы идут первыми в хвосте, без повторов
+        placed = {pid for _, pid in head}
+        placed.update(evicted)
+        self._tail = evicted + [pid for pid in others if pid not in placed]
+        self._tail_dirty = True
@@ -0,0 +1,388 @@
+"""Потоковая статистика метрик и процессов.
+
+Для каждой системной метрики и для каждого процесса статистика обновляется
+по снимку без хранения исходных выборок:
+- EWMA среднего и дисперсии - "обычное" значение ряда и его разброс;
+- квантили (p50, p95, p99) по скетчу DDSketch: выборка попадает в корзину
+  логарифмической сетки, поэтому относительная ошибка квантиля не больше
+  relative_accuracy. Скетчи с одной сеткой складываются покорзинно - так
+  квантили за 5 минут получаются слиянием минутных скетчей.
+
+Память на ряд ограничена числом корзин скетча (при переполнении сливаются
+корзины самых малых значений, верхние квантили остаются точными) и числом
+хранимых интервалов. Процесс, значение которого далеко от его собственного
+базового уровня (больше Z_THRESHOLD стандартных отклонений EWMA и больше
+абсолютного порога колонки), помечается как аномальный. Состояние
+завершившегося процесса удаляется на том же снимке.
+
+Статистика процессов не обходит весь снимок: на каждом снимке обновляются
+новые и изменившиеся по дельте процессы (если их не больше
+PROCESS_UPDATE_BUDGET) и по очереди каждая PROCESS_SAMPLE_STRIDE-я строка
+снимка (не больше PROCESS_SAMPLE_LIMIT строк). Значение процесса, не
+обновлявшегося k снимков, входит в EWMA и скетч с весом k - так прореженная
+выборка сохраняет постоянную времени EWMA и веса квантилей. Скетчи процессов,
+как и системных метрик, ведутся по минутным интервалам и сливаются за окно.
+"""
+import math
+import threading
+from collections import deque
+
+from diagnostics import trace
+
+
+DEFAULT_ACCURACY = 0.01        # Относительная ошибка квантилей системных метрик
+PROCESS_ACCURACY = 0.05        # Относительная ошибка квантилей процессов
+DEFAULT_MAX_BINS = 512         # Корзин на скетч системной метрики
+PROCESS_MAX_BINS = 128         # Корзин на скетч процесса (при 5% - диапазон ~10^5 раз)
+PROCESS_WINDOW_COUNT = 5       # Интервалов скетча процесса (5 минут)
+MIN_VALUE = 1e-9               # Значения меньше считаются нулем
+
+EWMA_ALPHA = 0.05              # Вес новой выборки (~20 последних выборок)
+WINDOW_INTERVAL = 60.0         # Длительность интервала скетча системной метрики (с)
+WINDOW_COUNT = 60              # Сколько интервалов хранить (час)
+QUANTILES = (0.5, 0.95, 0.99)
+
+PROCESS_SAMPLE_STRIDE = 16     # Остальные процессы обновляются раз в столько снимков
+PROCESS_SAMPLE_LIMIT = 1000    # и не больше стольких строк за снимок (реже на больших машинах)
+PROCESS_UPDATE_BUDGET = 2000   # Больше изменившихся за снимок - и они обновляются по очереди
+
+Z_THRESHOLD = 4.0              # Отклонение от базового уровня в сигмах
+MIN_SAMPLES = 30               # Выборок до того, как базовый уровень считается известным
+# Колонки процессов со статистикой и минимальное отклонение, считающееся заметным
+PROCESS_COLUMNS = {
+    'cpu': 5.0,                # % ЦП
+    'rss': 64 * 1024 * 1024,   # Байты
+}
+
+
+class Ewma:
+    """Экспоненциально взвешенные среднее и дисперсия"""
+
+    __slots__ = ('alpha', 'count', 'mean', 'var')
+
+    def __init__(self, alpha=EWMA_ALPHA):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def update(self, value):
+        if self.count == 0:
+            self.mean = float(value)
+        else:
+            diff = value - self.mean
+            increment = self.alpha * diff
+            self.mean += increment
+            self.var = (1.0 - self.alpha) * (self.var + diff * increment)
+        self.count += 1
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.var)
+
+
+class DDSketch:
+    """Скетч квантилей с относительной ошибкой relative_accuracy.
+
+    Значение x попадает в корзину ceil(log_gamma(x)), gamma = (1 + a) / (1 - a);
+    корзина хранит только счетчик. Не больше max_bins корзин: лишние корзины
+    самых малых значений сливаются в одну.
+    """
+
+    __slots__ = ('gamma', '_log_gamma', 'max_bins', 'bins', 'zeros', 'count', 'min', 'max')
+
+    def __init__(self, relative_accuracy=DEFAULT_ACCURACY, max_bins=DEFAULT_MAX_BINS):
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins = {}     # индекс корзины -> число выборок
+        self.zeros = 0     # Выборок меньше MIN_VALUE
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, count=1):
+        if value < MIN_VALUE:
+            self.zeros += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            bins = self.bins
+            bins[index] = bins.get(index, 0) + count
+            if len(bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _collapse(self):
+        bins = self.bins
+        indexes = sorted(bins)
+        excess = len(indexes) - self.max_bins
+        target = indexes[excess]
+        bins[target] += sum(bins.pop(index) for index in indexes[:excess])
+
+    def merge(self, other):
+        """Добавляет выборки другого скетча с той же сеткой"""
+        if other.gamma != self.gamma:
+            raise ValueError("Скетчи с разной точностью не сливаются")
+        bins = self.bins
+        for index, count in other.bins.items():
+            bins[index] = bins.get(index, 0) + count
+        if len(bins) > self.max_bins:
+            self._collapse()
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Квантиль q (0..1) или None, если выборок нет"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Середина корзины (gamma^(i-1), gamma^i] в смысле относительной ошибки
+                value = 2.0 * self.gamma ** index / (self.gamma + 1.0)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class WindowedSketch:
+    """Скетчи по интервалам времени: квантили за последние span секунд
+    получаются слиянием скетчей интервалов, исходные выборки не хранятся"""
+
+    __slots__ = ('interval', 'relative_accuracy', 'max_bins', '_windows')
+
+    def __init__(self, interval=WINDOW_INTERVAL, count=WINDOW_COUNT,
+                 relative_accuracy=DEFAULT_ACCURACY, max_bins=DEFAULT_MAX_BINS):
+        self.interval = interval
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._windows = deque(maxlen=count)  # (номер интервала, скетч)
+
+    def add(self, timestamp, value, count=1):
+        number = int(timestamp // self.interval)
+        windows = self._windows
+        if not windows or windows[-1][0] != number:
+            windows.append((number, DDSketch(self.relative_accuracy, self.max_bins)))
+        windows[-1][1].add(value, count)
+
+    def merged(self, timestamp, span) -> DDSketch:
+        """Слияние скетчей интервалов, пересекающихся с последними span секундами"""
+        first = int((timestamp - span) // self.interval)
+        result = DDSketch(self.relative_accuracy, self.max_bins)
+        for number, sketch in self._windows:
+            if number >= first:
+                result.merge(sketch)
+        return result
+
+
+class SeriesStats:
+    """EWMA и квантили по интервалам одной системной метрики"""
+
+    def __init__(self):
+        self.ewma = Ewma()
+        self.sketch = WindowedSketch()
+        self.last = None
+
+    def update(self, timestamp, value):
+        self.ewma.update(value)
+        self.sketch.add(timestamp, value)
+        self.last = value
+
+
+class ProcessBaseline:
+    """Базовый уровень одной колонки одного процесса.
+
+    Поля EWMA хранятся прямо здесь и обновляются в цикле
+    MetricStatistics._update_processes без вызова методов: процессов тысячи.
+    """
+
+    __slots__ = ('count', 'mean', 'var', 'tick', 'sketch')
+
+    def __init__(self, tick):
+        self.count = 0     # Учтено снимков (с весами прореживания)
+        self.mean = 0.0
+        self.var = 0.0
+        self.tick = tick   # Номер снимка процессов последнего обновления
+        self.sketch = WindowedSketch(
+            WINDOW_INTERVAL, PROCESS_WINDOW_COUNT, PROCESS_ACCURACY, PROCESS_MAX_BINS
+        )
+
+
+class Anomaly:
+    """Значение колонки процесса далеко от его базового уровня"""
+
+    __slots__ = ('column', 'value', 'mean', 'std')
+
+    def __init__(self, column, value, mean, std):
+        self.column = column
+        self.value = value
+        self.mean = mean
+        self.std = std
+
+
+def system_series(snapshot) -> dict:
+    """Значения системных метрик снимка: ЦП и память в %, диск и сеть в МБ/с"""
+    return {
+        'cpu': snapshot.cpu_percent,
+        'memory': snapshot.memory.get('percent', 0.0),
+        'disk': snapshot.disk.get('read_bytes', 0.0) + snapshot.disk.get('write_bytes', 0.0),
+        'network': snapshot.network.get('bytes_sent', 0.0) + snapshot.network.get('bytes_recv', 0.0),
+    }
+
+
+class MetricStatistics:
+    """Потоковая статистика по снимкам MetricsHub.
+
+    update() вызывается в потоке сборщика на каждом снимке, чтение
+    (summary, process_summary, anomalies) возможно из любого потока.
+    """
+
+    def __init__(self, columns=PROCESS_COLUMNS):
+        self.columns = dict(columns)
+        self._lock = threading.Lock()
+        self.series = {}         # имя метрики -> SeriesStats
+        # колонка -> {pid: ProcessBaseline}
+        self._processes = {column: {} for column in self.columns}
+        self._process_generation = None
+        self._tick = 0  # Номер снимка процессов
+        self._timestamp = 0.0
+        # pid -> [Anomaly] последнего снимка процессов; заменяется целиком
+        self.anomalies = {}
+
+    def __len__(self):
+        """Число процессов со статистикой"""
+        return max(map(len, self._processes.values()), default=0)
+
+    def update(self, snapshot):
+        with self._lock, trace('statistics'):
+            timestamp = snapshot.timestamp
+            self._timestamp = timestamp
+            series = self.series
+            for name, value in system_series(snapshot).items():
+                stats = series.get(name)
+                if stats is None:
+                    stats = series[name] = SeriesStats()
+                stats.update(timestamp, value)
+            if snapshot.process_generation != self._process_generation:
+                self._update_processes(snapshot)
+
+    def _update_processes(self, snapshot):
+        table = snapshot.processes
+        delta = snapshot.delta
+        processes = self._processes
+        if delta.base_generation == self._process_generation:
+            # Завершившиеся процессы и новые владельцы повторно занятых PID
+            removed = delta.removed | delta.added
+            for baselines in processes.values():
+                for pid in removed:
+                    baselines.pop(pid, None)
+            added = delta.added
+            changed = delta.changed
+        else:
+            # Пропущены снимки: дельта не от нашего состояния
+            alive = set(table.pid)
+            removed = set()
+            for baselines in processes.values():
+                stale = baselines.keys() - alive
+                removed |= stale
+                for pid in stale:
+                    del baselines[pid]
+            added = alive - next(iter(processes.values()), {}).keys()
+            changed = set()
+        self._process_generation = snapshot.process_generation
+        self._tick = tick = self._tick + 1
+
+        # Строки для обновления: новые и изменившиеся плюс очередная доля остальных
+        pids = table.pid
+        stride = max(PROCESS_SAMPLE_STRIDE, -(-len(pids) // PROCESS_SAMPLE_LIMIT))
+        rows = set(range(tick % stride, len(pids), stride))
+        row_of = table.row_of
+        # Новые процессы получают базовый уровень сразу, изменившиеся - в
+        # пределах бюджета, иначе по очереди вместе с остальными
+        fresh = added | changed if len(changed) <= PROCESS_UPDATE_BUDGET else added
+        rows.update(row for row in map(row_of, fresh) if row is not None)
+        rows = sorted(rows)
+        updated = set(map(pids.__getitem__, rows))
+
+        found = {}
+        timestamp = snapshot.timestamp
+        z_squared = Z_THRESHOLD * Z_THRESHOLD
+        for column, floor in self.columns.items():
+            baselines = processes[column]
+            values = table.column(column)
+            for row in rows:
+                pid = pids[row]
+                value = values[row]
+                baseline = baselines.get(pid)
+                if baseline is None:
+                    baseline = baselines[pid] = ProcessBaseline(tick - 1)
+                count = baseline.count
+                # Значение представляет все снимки с прошлого обновления процесса
+                weight = tick - baseline.tick
+                baseline.tick = tick
+                if count:
+                    # Отклонение считается от уровня до этой выборки
+                    diff = value - baseline.mean
+                    if (count >= MIN_SAMPLES and abs(diff) > floor
+                            and diff * diff > z_squared * baseline.var):
+                        found.setdefault(pid, []).append(
+                            Anomaly(column, value, baseline.mean, math.sqrt(baseline.var))
+                        )
+                    # weight шагов EWMA с одним значением: alpha_k = 1 - (1 - alpha)^k
+                    alpha = 1.0 - (1.0 - EWMA_ALPHA) ** weight
+                    increment = alpha * diff
+                    baseline.mean += increment
+                    baseline.var = (1.0 - alpha) * (baseline.var + diff * increment)
+                else:
+                    baseline.mean = float(value)
+                baseline.count = count + weight
+                baseline.sketch.add(timestamp, value, weight)
+
+        # Пометки процессов, которые не обновлялись, остаются до их обновления
+        anomalies = {
+            pid: marks for pid, marks in self.anomalies.items()
+            if pid not in updated and pid not in removed
+        }
+        anomalies.update(found)
+        self.anomalies = anomalies
+
+    def summary(self, name, span=300.0):
+        """{'mean', 'std', 'p50', 'p95', 'p99', 'last'} системной метрики
+        за последние span секунд или None"""
+        with self._lock:
+            stats = self.series.get(name)
+            if stats is None:
+                return None
+            sketch = stats.sketch.merged(self._timestamp, span)
+            result = {'mean': stats.ewma.mean, 'std': stats.ewma.std, 'last': stats.last}
+            for q in QUANTILES:
+                result[f"p{round(q * 100)}"] = sketch.quantile(q)
+            return result
+
+    def process_summary(self, pid, span=300.0):
+        """{колонка: {'mean', 'std', 'p50', 'p95', 'p99', 'samples'}} процесса
+        за последние span секунд или None"""
+        with self._lock:
+            result = {}
+            for column, baselines in self._processes.items():
+                baseline = baselines.get(pid)
+                if baseline is None:
+                    continue
+                sketch = baseline.sketch.merged(self._timestamp, span)
+                summary = {
+                    'mean': baseline.mean, 'std': math.sqrt(baseline.var),
+                    'samples': baseline.count,
+                }
+                for q in QUANTILES:
+                    summary[f"p{round(q * 100)}"] = sketch.quantile(q)
+                result[column] = summary
+            return result or None
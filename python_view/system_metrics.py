@@ -0,0 +1,187 @@
+"""Системные метрики и снимки процессов без зависимости от GUI."""
+import time
+
+from backends import create_backend
+from diagnostics import debug_print
+from process_table import NamePool, ProcessTable, diff_tables
+from system_sampler import create_sampler
+from users import UserNames, lookup_user
+
+
+# Как часто перечитывать системные метрики ядра (секунды)
+SYSTEM_REFRESH_INTERVAL = 0.25
+
+class SystemMetrics:
+    def __init__(self, backend=None, sampler=None):
+        # Источник данных о процессах (DLL, /proc или синтетический)
+        self.backend = backend if backend is not None else create_backend()
+        # Сэмплер системных метрик из агрегатов ядра
+        self.sampler = sampler if sampler is not None else create_sampler()
+        # Кеш имен владельцев процессов по UID из снимка
+        self.user_names = UserNames(self.backend.user_name if self.backend is not None else lookup_user)
+        
+        # Кеширование данных
+        self._name_pool = NamePool()   # Общий пул имен процессов для всех снимков
+        self._process_data_cache = ProcessTable(self._name_pool)  # Кеш данных процессов
+        self._last_update_time = 0     # Время последнего обновления
+        self._system_cpu_usage = 0.0   # Общая загрузка CPU
+        self._system_memory = {"total": 0, "available": 0, "percent": 0}  # Память
+        self._system_disk_io = {"read_bytes": 0.0, "write_bytes": 0.0}    # Диск
+        self._system_network_io = {"bytes_sent": 0.0, "bytes_recv": 0.0}  # Сеть
+        self._cpu_freq = None          # Частота процессора от сэмплера
+        self._last_system_update = 0   # Время последнего обновления системных метрик
+        
+        if self.backend is None:
+            debug_print("Система не сможет работать без источника данных")
+            
+    def _sampler_provides(self, metric) -> bool:
+        return self.sampler is not None and metric in self.sampler.provides
+        
+    def get_processes_from_backend(self):
+        """Получает снимок всех процессов через источник данных"""
+        table = ProcessTable(self._name_pool)
+        if self.backend is None:
+            return table
+        
+        try:
+            self.backend.scan(table)
+            debug_print(f"Найдено {len(table)} процессов")
+            
+            # Метрики, которых нет у сэмплера, оцениваем по сумме колонок снимка
+            totals = table.totals()
+            
+            if not self._sampler_provides('cpu'):
+                self._system_cpu_usage = min(totals['cpu'], 100.0)  # Ограничиваем 100%
+            
+            if not self._sampler_provides('memory'):
+                # Оцениваем общий объем памяти по сумме использования
+                total_memory_usage = totals['rss']
+                total_memory = total_memory_usage * 1.2  # Предполагаем, что занято ~80%
+                available_memory = total_memory - total_memory_usage
+                memory_percent = (total_memory_usage / total_memory) * 100 if total_memory > 0 else 0
+                self._system_memory = {
+                    "total": total_memory,
+                    "available": available_memory,
+                    "percent": memory_percent
+                }
+            
+            if not self._sampler_provides('disk'):
+                self._system_disk_io = {
+                    "read_bytes": totals['disk_read'],
+                    "write_bytes": totals['disk_write']
+                }
+            
+            if not self._sampler_provides('network'):
+                self._system_network_io = {
+                    "bytes_sent": totals['net_sent'],
+                    "bytes_recv": totals['net_recv']
+                }
+            
+            if self.sampler is None:
+                self._last_system_update = time.time()
+            
+            return table
+            
+        except Exception as e:
+            debug_print(f"Ошибка при получении процессов: {e}")
+            return ProcessTable(self._name_pool)
+            
+    def refresh_system(self):
+        """Обновляет системные метрики: из сэмплера, иначе полным сканированием процессов"""
+        if self.sampler is None:
+            self.get_processes()
+            return
+            
+        try:
+            sample = self.sampler.sample()
+        except Exception as e:
+            debug_print(f"Ошибка при чтении системных метрик: {e}")
+            return
+            
+        if 'cpu_percent' in sample:
+            self._system_cpu_usage = sample['cpu_percent']
+        if 'memory' in sample:
+            self._system_memory = sample['memory']
+        if 'disk' in sample:
+            self._system_disk_io = sample['disk']
+        if 'network' in sample:
+            self._system_network_io = sample['network']
+        if 'cpu_freq' in sample:
+            self._cpu_freq = sample['cpu_freq']
+        self._last_system_update = time.time()
+        
+    def _refresh_system_if_stale(self):
+        interval = SYSTEM_REFRESH_INTERVAL if self.sampler is not None else 1.0
+        if time.time() - self._last_system_update > interval:
+            self.refresh_system()
+
+    def get_cpu_usage(self) -> float:
+        """Возвращает общую загрузку процессора в процентах"""
+        self._refresh_system_if_stale()
+        return self._system_cpu_usage
+
+    def get_memory_info(self) -> dict:
+        """Возвращает информацию об использовании памяти"""
+        self._refresh_system_if_stale()
+        return self._system_memory
+
+    def get_disk_io(self) -> dict:
+        """Возвращает информацию о дисковой активности"""
+        self._refresh_system_if_stale()
+        return self._system_disk_io
+
+    def get_network_io(self) -> dict:
+        """Возвращает информацию о сетевой активности"""
+        self._refresh_system_if_stale()
+        return self._system_network_io
+
+    def get_cpu_freq(self) -> dict:
+        """Возвращает частоту процессора (если неизвестна - фиксированное значение)"""
+        if self._cpu_freq is not None:
+            return self._cpu_freq
+        return {'current': 2400.0}  # Приблизительное значение в MHz
+
+    def get_boot_time(self) -> float:
+        """Возвращает примерное время загрузки системы"""
+        if self.backend is None:
+            return 0.0
+        return self.backend.get_boot_time()
+
+    def get_user_name(self, uid: int) -> str:
+        """Имя владельца процесса по UID из снимка"""
+        return self.user_names.name(uid)
+
+    def process_changes(self, previous: ProcessTable, current: ProcessTable) -> tuple:
+        """(added, removed, changed) между снимками: от источника данных, если
+        он их знает, иначе сравнением снимков"""
+        changes = self.backend.changes(previous, current) if self.backend is not None else None
+        return changes if changes is not None else diff_tables(previous, current)
+
+    def set_backoff(self, name: str, factor: float):
+        """Передает множитель периода выборки источнику со своим расписанием"""
+        if self.backend is not None:
+            self.backend.set_backoff(name, factor)
+
+    def terminate_process(self, pid: int) -> bool:
+        """Завершает процесс через источник данных"""
+        if self.backend is None:
+            return False
+        return self.backend.terminate_process(pid)
+
+    def get_processes(self) -> ProcessTable:
+        """Возвращает колоночный снимок процессов"""
+        # Обновляем данные только если прошло достаточно времени
+        if time.time() - self._last_update_time > 1.0:
+            return self.scan_processes()
+        
+        return self._process_data_cache
+        
+    def scan_processes(self) -> ProcessTable:
+        """Сканирует процессы сейчас, независимо от возраста кеша"""
+        self._process_data_cache = self.get_processes_from_backend()
+        self._last_update_time = time.time()
+        return self._process_data_cache
+        
+    def latest_processes(self) -> ProcessTable:
+        """Последний снимок процессов без сканирования"""
+        return self._process_data_cache
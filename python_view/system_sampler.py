@@ -0,0 +1,311 @@
+"""Системные метрики из агрегатов ядра.
+
+Общая загрузка ЦП, память, диск, сеть и частота процессора читаются
+одним чтением соответствующих файлов ядра, а не суммируются по списку
+процессов. Стоимость выборки не зависит от числа процессов.
+"""
+import os
+import sys
+import time
+import glob
+import ctypes
+from ctypes import wintypes
+
+from diagnostics import debug_print
+
+
+_MB = 1024.0 * 1024.0
+
+# Размер сектора в /proc/diskstats всегда 512 байт
+_SECTOR_SIZE = 512
+
+# Метрики, которые может предоставить сэмплер
+SYSTEM_METRICS = frozenset(['cpu', 'memory', 'disk', 'network', 'cpu_freq'])
+
+
+def _listdir(path) -> list:
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+class CounterRates:
+    """Переводит монотонно растущие счетчики в скорости (единиц в секунду).
+
+    Первая выборка и сброс счетчика (значение уменьшилось) дают скорость 0.
+    """
+
+    def __init__(self):
+        self._prev = {}
+        self._prev_time = None
+
+    def update(self, now: float, counters: dict) -> dict:
+        elapsed = now - self._prev_time if self._prev_time is not None else 0.0
+        prev = self._prev
+        rates = {}
+        for name, value in counters.items():
+            last = prev.get(name)
+            if last is None or elapsed <= 0 or value < last:
+                rates[name] = 0.0
+            else:
+                rates[name] = (value - last) / elapsed
+        self._prev = counters
+        self._prev_time = now
+        return rates
+
+
+class SystemSampler:
+    """Базовый интерфейс сэмплера системных метрик"""
+
+    # Метрики, которые сэмплер заполняет в sample()
+    provides = frozenset()
+
+    def is_available(self) -> bool:
+        return False
+
+    def sample(self) -> dict:
+        """Возвращает словарь с ключами из provides:
+        cpu_percent, memory, disk, network, cpu_freq"""
+        return {}
+
+    def close(self):
+        pass
+
+
+class ProcfsSystemSampler(SystemSampler):
+    """Сэмплер системных метрик Linux.
+
+    Файлы /proc/stat, /proc/meminfo, /proc/diskstats, /proc/net/dev и
+    scaling_cur_freq открываются один раз и перечитываются через pread,
+    так что выборка стоит по одному системному вызову на файл (таблица
+    больше буфера дочитывается следующими вызовами).
+    """
+
+    provides = SYSTEM_METRICS
+
+    def __init__(self, root='/proc', sys_root='/sys'):
+        self.root = root
+        self.sys_root = sys_root
+        self._fds = {}
+        self._rates = CounterRates()
+        self._prev_cpu = None
+        self._disks = None
+        self._freq_paths = sorted(glob.glob(
+            os.path.join(sys_root, 'devices', 'system', 'cpu', 'cpu[0-9]*', 'cpufreq', 'scaling_cur_freq')
+        ))
+
+    def is_available(self) -> bool:
+        return sys.platform.startswith('linux') and os.path.exists(os.path.join(self.root, 'stat'))
+
+    def _read(self, path, size=65536, offset=0):
+        """Перечитывает файл с позиции offset через постоянно открытый дескриптор"""
+        fd = self._fds.get(path)
+        try:
+            if fd is None:
+                fd = os.open(path, os.O_RDONLY)
+                self._fds[path] = fd
+            return os.pread(fd, size, offset)
+        except OSError:
+            if fd is not None:
+                os.close(fd)
+                self._fds.pop(path, None)
+            return b''
+
+    def _read_all(self, path, size=65536):
+        """Перечитывает файл целиком: таблица может не поместиться в один буфер
+        (много сетевых интерфейсов или дисков)"""
+        data = self._read(path, size)
+        if len(data) < size:
+            return data
+        chunks = [data]
+        offset = len(data)
+        while True:
+            chunk = self._read(path, size, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b''.join(chunks)
+
+    def _cpu_percent(self) -> float:
+        data = self._read(self.root + '/stat', 4096)
+        line = data[:data.find(b'\n')]
+        # cpu  user nice system idle iowait irq softirq steal ...
+        values = [int(v) for v in line.split()[1:9]]
+        total = sum(values)
+        idle = values[3] + values[4]
+        prev = self._prev_cpu
+        self._prev_cpu = (total, idle)
+        if prev is None or total <= prev[0]:
+            return 0.0
+        busy = (total - prev[0]) - (idle - prev[1])
+        return max(0.0, min(100.0, busy * 100.0 / (total - prev[0])))
+
+    def _memory(self) -> dict:
+        total = available = 0
+        for line in self._read(self.root + '/meminfo', 8192).splitlines():
+            if line.startswith(b'MemTotal:'):
+                total = int(line.split()[1]) * 1024
+            elif line.startswith(b'MemAvailable:'):
+                available = int(line.split()[1]) * 1024
+                break
+        percent = (total - available) / total * 100 if total > 0 else 0
+        return {"total": total, "available": available, "percent": percent}
+
+    def _is_disk(self, name: bytes) -> bool:
+        """Физический диск: есть в /sys/block, связан с устройством (ссылка device)
+        и не собран из других блочных устройств (slaves пуст)"""
+        if self._disks is None:
+            block = os.path.join(self.sys_root, 'block')
+            try:
+                entries = os.listdir(block)
+            except OSError:
+                entries = []
+            # loop, ram, zram, dm-* и md* не имеют ссылки device; dm и md к тому же
+            # собраны из дисков, которые уже учтены, и их счет был бы двойным
+            self._disks = {
+                entry.encode() for entry in entries
+                if os.path.exists(os.path.join(block, entry, 'device'))
+                and not _listdir(os.path.join(block, entry, 'slaves'))
+            }
+        return name in self._disks
+
+    def _disk_counters(self) -> tuple:
+        read = write = 0
+        for line in self._read_all(self.root + '/diskstats').splitlines():
+            fields = line.split()
+            if len(fields) >= 10 and self._is_disk(fields[2]):
+                read += int(fields[5])
+                write += int(fields[9])
+        return read * _SECTOR_SIZE, write * _SECTOR_SIZE
+
+    def _net_counters(self) -> tuple:
+        recv = sent = 0
+        # Первые две строки - заголовки таблицы
+        for line in self._read_all(self.root + '/net/dev').splitlines()[2:]:
+            name, _, values = line.partition(b':')
+            if name.strip() == b'lo':
+                continue
+            fields = values.split()
+            if len(fields) >= 9:
+                recv += int(fields[0])
+                sent += int(fields[8])
+        return sent, recv
+
+    def _cpu_freq(self):
+        freqs = []
+        for path in self._freq_paths:
+            value = self._read(path, 64).strip()
+            if value:
+                freqs.append(int(value) / 1000.0)  # кГц -> МГц
+        if not freqs:
+            return None
+        return {'current': sum(freqs) / len(freqs)}
+
+    def sample(self) -> dict:
+        now = time.monotonic()
+        disk_read, disk_write = self._disk_counters()
+        net_sent, net_recv = self._net_counters()
+        rates = self._rates.update(now, {
+            'disk_read': disk_read,
+            'disk_write': disk_write,
+            'net_sent': net_sent,
+            'net_recv': net_recv,
+        })
+
+        result = {
+            'cpu_percent': self._cpu_percent(),
+            'memory': self._memory(),
+            # Скорости в МБ/с, как и по процессам
+            'disk': {
+                "read_bytes": rates['disk_read'] / _MB,
+                "write_bytes": rates['disk_write'] / _MB
+            },
+            'network': {
+                "bytes_sent": rates['net_sent'] / _MB,
+                "bytes_recv": rates['net_recv'] / _MB
+            },
+        }
+        cpu_freq = self._cpu_freq()
+        if cpu_freq is not None:
+            result['cpu_freq'] = cpu_freq
+        return result
+
+    def close(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+
+
+class WindowsSystemSampler(SystemSampler):
+    """Сэмплер системных метрик Windows: GetSystemTimes и GlobalMemoryStatusEx"""
+
+    provides = frozenset(['cpu', 'memory'])
+
+    class _MemoryStatusEx(ctypes.Structure):
+        _fields_ = [
+            ("dwLength", wintypes.DWORD),
+            ("dwMemoryLoad", wintypes.DWORD),
+            ("ullTotalPhys", ctypes.c_ulonglong),
+            ("ullAvailPhys", ctypes.c_ulonglong),
+            ("ullTotalPageFile", ctypes.c_ulonglong),
+            ("ullAvailPageFile", ctypes.c_ulonglong),
+            ("ullTotalVirtual", ctypes.c_ulonglong),
+            ("ullAvailVirtual", ctypes.c_ulonglong),
+            ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+        ]
+
+    def __init__(self):
+        self._prev_cpu = None
+
+    def is_available(self) -> bool:
+        return sys.platform == 'win32'
+
+    @staticmethod
+    def _filetime(ft) -> int:
+        return (ft.dwHighDateTime << 32) | ft.dwLowDateTime
+
+    def _cpu_percent(self) -> float:
+        idle, kernel, user = wintypes.FILETIME(), wintypes.FILETIME(), wintypes.FILETIME()
+        if not ctypes.windll.kernel32.GetSystemTimes(
+            ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)
+        ):
+            return 0.0
+        # Время ядра включает время простоя
+        total = self._filetime(kernel) + self._filetime(user)
+        idle_time = self._filetime(idle)
+        prev = self._prev_cpu
+        self._prev_cpu = (total, idle_time)
+        if prev is None or total <= prev[0]:
+            return 0.0
+        busy = (total - prev[0]) - (idle_time - prev[1])
+        return max(0.0, min(100.0, busy * 100.0 / (total - prev[0])))
+
+    def _memory(self) -> dict:
+        status = self._MemoryStatusEx()
+        status.dwLength = ctypes.sizeof(self._MemoryStatusEx)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return {"total": 0, "available": 0, "percent": 0}
+        return {
+            "total": status.ullTotalPhys,
+            "available": status.ullAvailPhys,
+            "percent": float(status.dwMemoryLoad)
+        }
+
+    def sample(self) -> dict:
+        return {
+            'cpu_percent': self._cpu_percent(),
+            'memory': self._memory(),
+        }
+
+
+def create_sampler():
+    """Создает сэмплер для текущей платформы или возвращает None"""
+    for sampler_cls in (ProcfsSystemSampler, WindowsSystemSampler):
+        sampler = sampler_cls()
+        if sampler.is_available():
+            return sampler
+        sampler.close()
+    debug_print("Системные метрики будут оцениваться по списку процессов")
+    return None
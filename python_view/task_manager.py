@@ -5,331 +5,762 @@ import ctypes
 import threading
 from datetime import datetime
 from collections import deque
-import getpass
+from bisect import bisect_left
+import argparse
 import warnings
+import multiprocessing
 
 
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QPointF, QTimer
+from PyQt5.QtCore import (
+    Qt, QThread, pyqtSignal, QPointF, QTimer, QAbstractTableModel, QAbstractItemModel,
+    QModelIndex, QEvent, QDateTime
+)
 from PyQt5.QtGui import QColor, QFont, QPainter
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QTabWidget, QWidget, QVBoxLayout, QHBoxLayout,
-    QTableWidget, QTableWidgetItem, QHeaderView, QPushButton, QLabel, QGridLayout
+    QTableWidget, QTableWidgetItem, QTableView, QTreeView, QAbstractItemView, QHeaderView,
+    QPushButton, QLabel, QGridLayout, QCheckBox, QFileDialog, QLineEdit, QSystemTrayIcon, QStyle
 )
-from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis
-from concurrent.futures import ThreadPoolExecutor
-
-# Импортируем константы для Windows API
-from ctypes import wintypes
-
-# Константы для доступа к процессам
-PROCESS_TERMINATE = 0x0001
-
+from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis, QDateTimeAxis
 
-# Определяем функцию debug_print на уровне модуля (в начале файла)
-ENABLE_LOGGING = True  # Включаем логирование для диагностики
-
-def debug_print(*args, **kwargs):
-    if ENABLE_LOGGING:
-        print(*args, **kwargs)
+from alerts import FIRING, add_alert_arguments, create_alert_engine
+from decimation import bucket_width, decimate
+import diagnostics
+from diagnostics import debug_print, record_span, trace
+from exporter import add_exporter_arguments, start_exporter
+from metrics_hub import MetricsHub, SnapshotMailbox
+from process_table import ProcessTable
+from process_tree import ProcessTree, TreeObserver
+from remote_collector import create_remote_metrics
+from scheduler import SamplingScheduler
+from snapshot_log import SnapshotLogReader, SnapshotLogWriter
+from search_index import ProcessSearchIndex, normalize_query
+from sort_index import SortIndex
+from streaming_stats import MIN_SAMPLES, MetricStatistics
+from system_metrics import SYSTEM_REFRESH_INTERVAL
+from timeseries import TimeSeriesStore
+from users import UserNames
 
 
 # Игнорируем предупреждения от PyQt
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-class SystemMetrics:
-    def __init__(self):
-        # Инициализируем переменные для работы с DLL
-        self.process_dll = None
-        self.use_dll = False
-        self.ProcessInfoStruct = None
-        
-        # Кеширование данных
-        self._process_data_cache = {}  # Кеш данных процессов
-        self._last_update_time = 0     # Время последнего обновления
-        self._system_cpu_usage = 0.0   # Общая загрузка CPU
-        self._system_memory = {"total": 0, "available": 0, "percent": 0}  # Память
-        self._system_disk_io = {"read_bytes": 0.0, "write_bytes": 0.0}    # Диск
-        self._system_network_io = {"bytes_sent": 0.0, "bytes_recv": 0.0}  # Сеть
-        self._last_system_update = 0   # Время последнего обновления системных метрик
-        
-        # Загружаем DLL для мониторинга процессов
-        try:
-            # Определение путей для скомпилированной версии и обычного запуска
-            dll_paths = []
-            
-            if getattr(sys, 'frozen', False):
-                # Если запущено как exe (PyInstaller)
-                base_path = os.path.dirname(sys.executable)
-                dll_paths.append(os.path.join(base_path, "Dll2.dll"))
-                # Добавим поиск в текущем каталоге для EXE
-                dll_paths.append("Dll2.dll")
-            else:
-                # Если запущено как Python скрипт
-                base_path = os.path.dirname(os.path.abspath(__file__))
-                parent_path = os.path.dirname(base_path)
-                dll_paths.append(os.path.join(parent_path, "x64", "Debug", "Dll2.dll"))
-                dll_paths.append(os.path.join(base_path, "Dll2.dll"))
-            
-            # Добавим системные пути в поиск
-            dll_paths.append(os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'System32', 'Dll2.dll'))
-            
-            # Пробуем загрузить DLL из каждого возможного пути
-            dll_loaded = False
-            dll_path = None
-            
-            debug_print(f"Начинаем поиск DLL-файла в следующих путях: {dll_paths}")
-            
-            for path in dll_paths:
-                debug_print(f"Проверка пути: {path}")
-                if os.path.exists(path):
-                    try:
-                        debug_print(f"Попытка загрузки DLL из {path}")
-                        self.process_dll = ctypes.WinDLL(path)
-                        dll_path = path
-                        dll_loaded = True
-                        debug_print(f"DLL успешно загружена из {path}")
-                        break
-                    except Exception as e:
-                        debug_print(f"Ошибка загрузки из {path}: {e}")
-            
-            if not dll_loaded:
-                debug_print(f"DLL не найдена в путях: {dll_paths}")
-                raise FileNotFoundError("DLL не найдена в доступных путях")
-            
-            debug_print(f"DLL успешно загружена из {dll_path}")
-            
-            # Определяем структуру ProcessInfo из DLL
-            class ProcessInfoStruct(ctypes.Structure):
-                _fields_ = [
-                    ("processName", ctypes.c_wchar * 260),
-                    ("cpuUsage", ctypes.c_double),
-                    ("memoryUsage", ctypes.c_size_t),
-                    ("diskReadRate", ctypes.c_double),
-                    ("diskWriteRate", ctypes.c_double),
-                    ("networkSent", ctypes.c_double),
-                    ("networkReceived", ctypes.c_double)
-                ]
-            
-            # Настраиваем функцию GetProcessInfo
-            self.process_dll.GetProcessInfo.argtypes = [ctypes.c_ulong]
-            self.process_dll.GetProcessInfo.restype = ProcessInfoStruct
-            self.ProcessInfoStruct = ProcessInfoStruct
-            self.use_dll = True
-            debug_print("DLL успешно настроена и готова к использованию")
-        except Exception as e:
-            debug_print(f"Ошибка загрузки DLL: {e}")
-            self.use_dll = False
-            debug_print("Система не сможет работать без DLL")
-            
-    def get_processes_from_dll(self):
-        """Получает информацию о всех процессах через WinAPI и DLL"""
-        if not self.use_dll or not self.process_dll:
-            debug_print("DLL не загружена, невозможно получить данные")
-            return []
-        
-        processes = []
-        
-        try:
-            # Получаем список всех процессов через WinAPI
-            process_ids = (wintypes.DWORD * 4096)()
-            cb_needed = wintypes.DWORD()
-            
-            # Получаем список PID всех процессов
-            if not ctypes.windll.psapi.EnumProcesses(
-                ctypes.byref(process_ids),
-                ctypes.sizeof(process_ids),
-                ctypes.byref(cb_needed)
-            ):
-                debug_print("Не удалось перечислить процессы")
-                return []
-            
-            # Количество возвращенных процессов
-            num_processes = cb_needed.value // ctypes.sizeof(wintypes.DWORD)
-            debug_print(f"Найдено {num_processes} процессов")
-            
-            # Переменные для подсчета общих метрик системы
-            total_cpu_usage = 0.0
-            total_memory_usage = 0
-            total_disk_read = 0.0
-            total_disk_write = 0.0
-            total_network_sent = 0.0
-            total_network_recv = 0.0
-            
-            current_time = time.time()
-            
-            # Для каждого процесса получаем информацию из DLL
-            for i in range(num_processes):
-                pid = process_ids[i]
-                if pid <= 0:
-                    continue
-                
-                try:
-                    # Получаем информацию из DLL
-                    proc_info = self.process_dll.GetProcessInfo(pid)
-                    
-                    # Проверяем, что имя процесса не пустое и процесс существует
-                    if proc_info.processName and proc_info.processName != "":
-                        # Добавляем в список процессов
-                        processes.append({
-                            'pid': pid,
-                            'name': proc_info.processName,
-                            'cpu_percent': proc_info.cpuUsage,
-                            'memory_info': {
-                                'rss': proc_info.memoryUsage
-                            },
-                            'disk_read': proc_info.diskReadRate,
-                            'disk_write': proc_info.diskWriteRate,
-                            'network_sent': proc_info.networkSent,
-                            'network_recv': proc_info.networkReceived,
-                            # Добавляем флаг для системных процессов
-                            'is_system': pid < 100 or proc_info.processName.lower() in ['system', 'registry', 'smss.exe', 'csrss.exe', 'wininit.exe', 'services.exe']
-                        })
-                        
-                        # Суммируем для общей статистики
-                        total_cpu_usage += proc_info.cpuUsage
-                        total_memory_usage += proc_info.memoryUsage
-                        total_disk_read += proc_info.diskReadRate
-                        total_disk_write += proc_info.diskWriteRate
-                        total_network_sent += proc_info.networkSent
-                        total_network_recv += proc_info.networkReceived
-                except Exception as e:
-                    debug_print(f"Ошибка получения информации о процессе {pid}: {e}")
-                    continue
-            
-            # Обновляем общие метрики системы
-            self._system_cpu_usage = min(total_cpu_usage, 100.0)  # Ограничиваем 100%
-            
-            # Оцениваем общий объем памяти по сумме использования
-            total_memory = total_memory_usage * 1.2  # Предполагаем, что занято ~80%
-            available_memory = total_memory - total_memory_usage
-            memory_percent = (total_memory_usage / total_memory) * 100 if total_memory > 0 else 0
-            
-            self._system_memory = {
-                "total": total_memory,
-                "available": available_memory,
-                "percent": memory_percent
-            }
-            
-            self._system_disk_io = {
-                "read_bytes": total_disk_read,
-                "write_bytes": total_disk_write
-            }
-            
-            self._system_network_io = {
-                "bytes_sent": total_network_sent,
-                "bytes_recv": total_network_recv
-            }
-            
-            self._last_system_update = current_time
-            
-            debug_print(f"Успешно получено {len(processes)} процессов через DLL")
-            return processes
-            
-        except Exception as e:
-            debug_print(f"Ошибка при получении процессов: {e}")
-            return []
-
-    def get_cpu_usage(self) -> float:
-        """Возвращает общую загрузку процессора в процентах"""
-        if time.time() - self._last_system_update > 1.0:
-            # Обновляем все метрики, если прошло более 1 секунды
-            self.get_processes()
-        return self._system_cpu_usage
-
-    def get_memory_info(self) -> dict:
-        """Возвращает информацию об использовании памяти"""
-        if time.time() - self._last_system_update > 1.0:
-            # Обновляем все метрики, если прошло более 1 секунды
-            self.get_processes()
-        return self._system_memory
-
-    def get_disk_io(self) -> dict:
-        """Возвращает информацию о дисковой активности"""
-        if time.time() - self._last_system_update > 1.0:
-            # Обновляем все метрики, если прошло более 1 секунды
-            self.get_processes()
-        return self._system_disk_io
-
-    def get_network_io(self) -> dict:
-        """Возвращает информацию о сетевой активности"""
-        if time.time() - self._last_system_update > 1.0:
-            # Обновляем все метрики, если прошло более 1 секунды
-            self.get_processes()
-        return self._system_network_io
-
-    def get_cpu_freq(self) -> dict:
-        """Оценивает частоту процессора (используем фиксированное значение)"""
-        return {'current': 2400.0}  # Приблизительное значение в MHz
-
-    def get_boot_time(self) -> float:
-        """Возвращает примерное время загрузки системы"""
-        return time.time() - ctypes.windll.kernel32.GetTickCount64() / 1000.0
-
-    def get_processes(self) -> list:
-        """Возвращает список процессов с информацией"""
-        current_time = time.time()
-        
-        # Обновляем данные только если прошло достаточно времени
-        if current_time - self._last_update_time > 1.0:
-            processes = self.get_processes_from_dll()
-            self._process_data_cache = processes
-            self._last_update_time = current_time
-        
-        return self._process_data_cache
+# Базовые периоды выборки по группам метрик (секунды)
+SAMPLING_INTERVALS = {
+    'system': SYSTEM_REFRESH_INTERVAL,  # Системные метрики из агрегатов ядра
+    'processes': 1.0,                   # Полное сканирование процессов
+}
+BACKOFF_MINIMIZED = 4.0       # Окно свернуто: все выборки реже
+BACKOFF_HIDDEN = 4.0          # Вкладка, показывающая группу, скрыта
+BACKOFF_HOST_LOAD = 2.0       # Система нагружена: не добавляем нагрузки
+HOST_LOAD_THRESHOLD = 90.0    # Загрузка ЦП (%), начиная с которой система нагружена
+ALERT_NOTIFICATION_LINES = 5  # Сколько оповещений такта показывать в одном уведомлении
+STATISTICS_SPAN = 300.0       # Окно квантилей под графиком (секунды)
+TREE_SIGNAL_COST = 16         # Цена сигнала строк дерева в строках снимка, без обхода постоянных индексов
 
 class DataCollector(QThread):
-    data_updated = pyqtSignal(dict)
+    # Сигнал без данных: снимок GUI-поток сам забирает из ящика (take_snapshot),
+    # поэтому при занятом GUI сигналы со снимками не копятся в очереди
+    snapshot_ready = pyqtSignal()
+    # События оповещений (список AlertEvent) для показа в GUI
+    alerts_raised = pyqtSignal(list)
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, hub=None, alerts=None, statistics=None):
         super().__init__(parent)
         self._stop_flag = threading.Event()
-        self.interval = 1.0
-        self._cache = {}
-        self._process_lock = threading.Lock()
-        self.executor = ThreadPoolExecutor(max_workers=2)
-        self._last_full_update = 0
-        self.metrics = SystemMetrics()
+        self.mailbox = SnapshotMailbox()
+        # Базовые уровни и квантили метрик; None - без статистики
+        self.statistics = statistics
+        # Правила оповещений проверяются на каждом снимке в потоке сборщика
+        self.alerts = alerts
+        self._emit_alerts = self.alerts_raised.emit
+        if alerts is not None:
+            alerts.subscribe(self._emit_alerts)
+        # Общий для процесса источник снимков: один SystemMetrics на всех
+        self.hub = hub if hub is not None else MetricsHub.instance()
+        self.metrics = self.hub.metrics
+        self.hub.subscribe(self._on_snapshot)
+        
+        # Своя периодичность для каждой группы метрик
+        self.scheduler = SamplingScheduler()
+        if self.metrics.sampler is not None:
+            self.scheduler.add('system', SAMPLING_INTERVALS['system'],
+                               lambda: self.hub.refresh(scan_processes=False))
+        self.scheduler.add('processes', SAMPLING_INTERVALS['processes'],
+                           lambda: self.hub.refresh(scan_processes=True))
+        
+        # Состояние окна; меняется из GUI-потока, применяется в потоке сборщика
+        self._minimized = False
+        self._processes_visible = True
         
     def run(self):
         while not self._stop_flag.is_set():
             try:
-                system_info = self.collect_system_info()
-                self.data_updated.emit(system_info)
-                time.sleep(max(0, self.interval - (time.time() % self.interval)))
+                # Новый снимок доставляется подписчикам через _on_snapshot
+                self._apply_backoff()
+                self.scheduler.wait(self.scheduler.run_pending())
             except Exception as e:
                 debug_print(f"Ошибка в DataCollector.run: {e}")
                 continue
                 
     def stop(self):
         self._stop_flag.set()
-        self.executor.shutdown(wait=False)
+        self.scheduler.wake()
+        self.hub.unsubscribe(self._on_snapshot)
+        if self.alerts is not None:
+            self.alerts.unsubscribe(self._emit_alerts)
+        
+    def set_view_state(self, minimized=None, processes_visible=None):
+        """Сообщает сборщику, что сейчас видно пользователю"""
+        if minimized is not None:
+            self._minimized = minimized
+        if processes_visible is not None:
+            self._processes_visible = processes_visible
+        self.scheduler.wake()
+        
+    def _apply_backoff(self):
+        """Пересчитывает множители периодов по состоянию окна и загрузке системы"""
+        factor = BACKOFF_MINIMIZED if self._minimized else 1.0
+        if self.hub.latest().cpu_percent >= HOST_LOAD_THRESHOLD:
+            factor *= BACKOFF_HOST_LOAD
+        if self.metrics.sampler is not None:
+            self.scheduler.set_factor('system', factor)
+            self.metrics.set_backoff('system', factor)
+        if not self._processes_visible:
+            factor *= BACKOFF_HIDDEN
+        self.scheduler.set_factor('processes', factor)
+        self.metrics.set_backoff('processes', factor)
+        
+    def sampling_stats(self) -> dict:
+        """Статистика планировщика: периоды, опоздания и пропущенные сроки;
+        для доставки в GUI - забранные и вытесненные непрочитанными снимки"""
+        stats = self.scheduler.stats()
+        stats['gui_delivery'] = {
+            'interval_ms': 0.0,
+            'runs': self.mailbox.delivered,
+            'missed': self.mailbox.skipped,
+            'jitter_avg_ms': 0.0,
+            'jitter_max_ms': 0.0,
+            'last_duration_ms': 0.0,
+        }
+        return stats
+        
+    def _on_snapshot(self, snapshot):
+        if self.alerts is not None:
+            self.alerts.evaluate(snapshot)
+        if self.statistics is not None:
+            self.statistics.update(snapshot)
+        with trace('signal_emit'):
+            # Сигнал нужен, только если GUI еще не разбужен предыдущим снимком
+            if self.mailbox.post(snapshot):
+                self.snapshot_ready.emit()
+        
+    def take_snapshot(self):
+        """Новейший снимок, не забранный GUI, или None"""
+        return self.mailbox.take()
         
     def collect_system_info(self) -> dict:
-        current_time = time.time()
-        
-        # Получаем все данные только от DLL
-        processes = self.metrics.get_processes()
-        
-        info = {
-            'cpu_percent': self.metrics.get_cpu_usage(),
-            'memory': self.metrics.get_memory_info(),
-            'disk': self.metrics.get_disk_io(),
-            'network': self.metrics.get_network_io(),
-            'cpu_freq': self.metrics.get_cpu_freq(),
-            'boot_time': self.metrics.get_boot_time(),
-            'last_update': current_time,
-            'processes': processes
-        }
+        """Собирает снимок сейчас, включая сканирование процессов"""
+        return self.hub.refresh(scan_processes=True).as_dict()
+
+# Сколько первых строк таблицы процессов держать точно упорядоченными;
+# None - упорядочена вся таблица
+PROCESS_TOP_K = None
+
+# Системные процессы Windows, выделяемые цветом в таблице "Процессы"
+SYSTEM_PROCESS_NAMES = frozenset([
+    "System",
+    "Registry",
+    "smss.exe",  # Session Manager Subsystem
+    "csrss.exe",  # Client Server Runtime Subsystem
+    "wininit.exe",  # Windows Initialization Process
+    "services.exe",  # Services Control Manager
+    "svchost.exe",  # Service Host
+    "lsass.exe",  # Local Security Authority Subsystem Service
+    "winlogon.exe",  # Windows Logon Process
+    "explorer.exe"  # Windows Explorer
+])
+
+def _baseline_lines(statistics, pid) -> list:
+    """Строки подсказки с обычным уровнем процесса по его статистике"""
+    summary = statistics.process_summary(pid) if statistics is not None else None
+    if not summary:
+        return []
+    lines = []
+    for column, title, scale, unit in (('cpu', "ЦП", 1.0, "%"), ('rss', "Память", 1024 * 1024, " МБ")):
+        stats = summary.get(column)
+        if stats is None or stats['samples'] < MIN_SAMPLES:
+            continue
+        lines.append(f"{title}: обычно {stats['mean'] / scale:.1f} ± {stats['std'] / scale:.1f}{unit}, "
+                     f"p95 {stats['p95'] / scale:.1f}{unit}")
+    return lines
+
+def _contiguous_ranges(rows):
+    """Разбивает отсортированный список номеров строк на непрерывные диапазоны"""
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return ranges
+
+class ProcessTableModel(QAbstractTableModel):
+    """Модель таблицы процессов поверх колоночного снимка ProcessTable.
+    
+    Порядок строк задает поддерживаемый индекс сортировки SortIndex; значения
+    ячеек читаются из снимка в data() и только для строк, которые
+    представление действительно рисует. Фильтр поиска сужает индекс до
+    подходящих процессов: строки, не прошедшие фильтр, в модель не попадают.
+    """
+    HEADERS = ["Имя", "ЦП", "Память", "Диск", "Сеть"]
+    SORT_KEYS = ['name', 'cpu', 'rss', 'disk', 'network']
+    PID_ROLE = Qt.UserRole + 1
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._table = ProcessTable()
+        self._index = SortIndex('name', False, PROCESS_TOP_K)
+        self._search = ProcessSearchIndex()
+        # Индекс поиска ведется, только пока задан фильтр; без него он
+        # устаревает и перестраивается при вводе запроса
+        self._search_stale = True
+        self._query = ''       # Текущий запрос поиска ('' - без фильтра)
+        self._matches = None   # PID, прошедшие фильтр при его установке; None - все
+        self.generation = None  # Поколение отображаемого снимка
+        self.statistics = None  # MetricStatistics: выделение необычных значений
+        self.set_dark_theme(False)
+        
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._index)
+        
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+        
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+        
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        pid = self._index.pid_at(index.row())
+        if role == self.PID_ROLE:
+            return pid
+            
+        table = self._table
+        row = table.row_of(pid)
+        if row is None:
+            return None
+        col = index.column()
         
-        self._cache = info
-        return info
+        if role == Qt.DisplayRole:
+            if col == 0:
+                return table.name_of(row)
+            if col == 1:
+                return f"{table.cpu[row]:.1f}%"
+            if col == 2:
+                return f"{table.rss[row] / (1024*1024):.1f} МБ"
+            if col == 3:
+                return f"{table.disk_read[row] + table.disk_write[row]:.3f} МБ/с"
+            return f"{table.net_sent[row] + table.net_recv[row]:.3f} МБ/с"
+        
+        if role == Qt.ToolTipRole:
+            # Командная строка и путь известны, если источник ведет кэш сведений
+            lines = [f"PID {pid}, потоков {table.threads[row]}, дескрипторов {table.handles[row]}"]
+            exe = table.exe_of(row)
+            if exe:
+                lines.append(exe)
+            cmdline = table.cmdline_of(row)
+            if cmdline:
+                lines.append(cmdline)
+            lines.extend(_baseline_lines(self.statistics, pid))
+            return "\n".join(lines)
+        
+        if role == Qt.BackgroundRole and col in (1, 2) and self.statistics is not None:
+            # Значение далеко от обычного уровня этого процесса
+            anomalies = self.statistics.anomalies.get(pid)
+            if anomalies and any(anomaly.column == self.SORT_KEYS[col] for anomaly in anomalies):
+                return self._anomaly_color
+        
+        if role == Qt.ForegroundRole and col == 0:
+            # Задаем цвет для системных процессов
+            if table.name_of(row) in SYSTEM_PROCESS_NAMES or pid == 0 or pid == 4:
+                return self._system_color
+            return self._normal_color
+        
+        return None
+        
+    def set_dark_theme(self, is_dark):
+        # Используем разные цвета для разных тем
+        self._system_color = QColor("#2d89ef" if is_dark else "#0078d7")
+        self._normal_color = QColor("#ffffff" if is_dark else "#000000")
+        self._anomaly_color = QColor("#5c4a1a" if is_dark else "#fff1b8")
+        rows = len(self._index)
+        if rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(rows - 1, 0), [Qt.ForegroundRole])
+            
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Переключает активную колонку индекса сортировки"""
+        self._relayout(lambda: (
+            self._index.configure(self.SORT_KEYS[column], order == Qt.DescendingOrder),
+            self._index.rebuild(self._table, self._matches)
+        ))
+        
+    def set_filter(self, text):
+        """Оставляет в модели только процессы, подходящие под запрос поиска"""
+        query = normalize_query(text)
+        if query == self._query:
+            return
+        self._query = query
+        self.beginResetModel()
+        if query and self._search_stale:
+            self._search.rebuild(self._table)
+            self._search_stale = False
+        self._matches = self._search.search(query) if query else None
+        # Сузившийся запрос только отбирает строки из уже упорядоченного индекса
+        if self._matches is None or not self._index.restrict(self._matches):
+            self._index.rebuild(self._table, self._matches)
+        self.endResetModel()
+        
+    def _accepts(self, pid):
+        return not self._query or self._search.matches(pid, self._query)
+        
+    def _relayout(self, change):
+        """Выполняет change() внутри layoutAboutToBeChanged/layoutChanged,
+        перенося постоянные индексы (выделение) вслед за их PID"""
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        pids = [self._index.pid_at(i.row()) for i in persistent]
+        change()
+        moved = []
+        for pid, old in zip(pids, persistent):
+            if pid in self._index:
+                moved.append(self.index(self._index.position_of(pid), old.column()))
+            else:
+                moved.append(QModelIndex())
+        self.changePersistentIndexList(persistent, moved)
+        self.layoutChanged.emit()
+        
+    def reset(self, table, generation):
+        """Полностью перестраивает модель по снимку"""
+        self.beginResetModel()
+        self._table = table
+        if self._query:
+            self._search.rebuild(table)
+            self._search_stale = False
+        else:
+            self._search_stale = True
+        self._matches = self._search.search(self._query) if self._query else None
+        self._index.rebuild(table, self._matches)
+        self.generation = generation
+        self.endResetModel()
+        
+    def apply_delta(self, table, delta):
+        """Применяет дельту: удаление и вставка строк, затем починка порядка"""
+        self._table = table
+        index = self._index
+        root = QModelIndex()
+        
+        # Индекс поиска обновляется только при заданном фильтре и только для
+        # новых, завершившихся и переименованных процессов
+        if self._query:
+            renamed = self._search.apply(table, delta)
+        else:
+            renamed = ()
+            self._search_stale = True
+        removed = [pid for pid in delta.removed if pid in index]
+        added = [pid for pid in delta.added if self._accepts(pid)]
+        if self._query:
+            # Переименованный процесс мог войти в фильтр или выйти из него
+            for pid in renamed:
+                accepted = self._accepts(pid)
+                if pid in index and not accepted:
+                    removed.append(pid)
+                elif accepted and pid not in index:
+                    added.append(pid)
+            if self._matches is not None:
+                self._matches.difference_update(removed)
+                self._matches.update(added)
+        
+        # Удаляем завершившиеся процессы диапазонами с конца
+        if removed:
+            positions = sorted(index.position_of(pid) for pid in removed)
+            for first, last in reversed(_contiguous_ranges(positions)):
+                self.beginRemoveRows(root, first, last)
+                for position in range(last, first - 1, -1):
+                    index.remove_at(position)
+                self.endRemoveRows()
+                
+        # Новые процессы добавляются в конец, место в порядке получат при починке
+        if added:
+            added.sort()
+            start = len(index)
+            self.beginInsertRows(root, start, start + len(added) - 1)
+            for pid in added:
+                index.append(pid, index.key_of(table, table.row_of(pid)))
+            self.endInsertRows()
+            
+        # Новые ключи сортировки только для изменившихся процессов
+        changed = {}
+        for pid in delta.changed:
+            if pid in index:
+                key = index.key_of(table, table.row_of(pid))
+                if key != index.key(pid):
+                    changed[pid] = key
+                    
+        if changed or added:
+            # Порядок изменился: чиним индекс на месте
+            self._relayout(lambda: index.repair(changed))
+        elif delta.changed:
+            # Порядок прежний: сообщаем об изменившихся строках диапазонами
+            positions = sorted(index.position_of(pid) for pid in delta.changed if pid in index)
+            last_column = len(self.HEADERS) - 1
+            for first, last in _contiguous_ranges(positions):
+                self.dataChanged.emit(self.index(first, 0), self.index(last, last_column))
+                
+        self.generation = delta.generation
 
-class NumericTableWidgetItem(QTableWidgetItem):
-    def __lt__(self, other):
+class _TreeRowNotifier(TreeObserver):
+    """Переводит структурные шаги ProcessTree.apply в сигналы строк модели дерева.
+        
+    Попутно собирает узлы, у которых могли измениться ключи сортировки, и
+    родителей, к детям которых строки добавлены в конец.
+    """
+        
+    def __init__(self, model):
+        self.model = model
+        self.touched = set()   # Узлы с изменившимся именем или суммами
+        self.appended = set()  # Родители (None - корни) с добавленными в конец детьми
+        self._step = None
+        
+    def begin_remove(self, pid):
+        model = self.model
+        parent = model._tree.parent(pid)
+        row = model._position(parent, pid)
+        self._step = (parent, row)
+        self.touched.add(parent)
+        model.beginRemoveRows(model._parent_index(parent), row, row)
+        
+    def end_remove(self, pid):
+        model = self.model
+        model._take(*self._step)
+        model._order.pop(pid, None)
+        model._rows.pop(pid, None)
+        model.endRemoveRows()
+        
+    def begin_insert(self, parent, pids):
+        model = self.model
+        start = model._child_count(parent)
+        self.touched.add(parent)
+        self.appended.add(parent)
+        model.beginInsertRows(model._parent_index(parent), start, start + len(pids) - 1)
+        
+    def end_insert(self, parent, pids):
+        self.model._put(parent, pids)
+        self.model.endInsertRows()
+        
+    def begin_move(self, pid, parent):
+        model = self.model
+        source = model._tree.parent(pid)
+        row = model._position(source, pid)
+        self._step = (source, row)
+        self.touched.update((source, parent))
+        self.appended.add(parent)
+        model.beginMoveRows(
+            model._parent_index(source), row, row,
+            model._parent_index(parent), model._child_count(parent)
+        )
+        
+    def end_move(self, pid, parent):
+        model = self.model
+        model._take(*self._step)
+        model._put(parent, [pid])
+        model.endMoveRows()
+        
+class ProcessTreeModel(QAbstractItemModel):
+    """Модель дерева процессов поверх ProcessTree.
+    
+    Числовые колонки показывают суммы по поддереву процесса. Порядок детей
+    одного родителя вычисляется лениво, только для узлов, которые
+    представление раскрывает. Дельта снимка сообщается вставкой, удалением
+    и переносом строк; новые строки добавляются в конец детей, а порядок
+    пересчитывается только у родителей, чьи дети действительно сменили места.
+    Если сигналов строк с их обходом постоянных индексов выйдет дороже
+    перестройки, дельта сообщается сменой раскладки.
+    """
+    HEADERS = ProcessTableModel.HEADERS
+    SORT_KEYS = ProcessTableModel.SORT_KEYS
+    PID_ROLE = ProcessTableModel.PID_ROLE
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._table = ProcessTable()
+        self._previous = None  # Прежний снимок, пока применяется дельта
+        self._tree = ProcessTree()
+        self._sort_column = 0
+        self._descending = False
+        self._order = {}  # pid родителя (None - корни) -> дети в порядке показа
+        self._rows = {}   # pid родителя -> {pid ребенка: строка}
+        self.generation = None  # Поколение отображаемого снимка
+        self.statistics = None  # MetricStatistics для подсказок
+        self.set_dark_theme(False)
+        
+    def _source(self, pid):
+        """(снимок, строка) процесса; пока применяется дельта, завершившиеся
+        процессы еще в дереве, и их данные берутся из прежнего снимка"""
+        table = self._table
+        row = table.row_of(pid)
+        if row is None and self._previous is not None:
+            table = self._previous
+            row = table.row_of(pid)
+        return table, row
+        
+    def _lower_name(self, pid):
+        table, row = self._source(pid)
+        return table.lower_name_of(row)
+        
+    def _sort_key(self):
+        tree = self._tree
+        if self._sort_column == 0:
+            return lambda pid: (self._lower_name(pid), pid)
+        column = self._sort_column - 1
+        return lambda pid: (tree.value(pid, column), pid)
+        
+    def _ordered(self, parent_pid):
+        order = self._order.get(parent_pid)
+        if order is None:
+            tree = self._tree
+            pids = tree.roots if parent_pid is None else tree.children(parent_pid)
+            order = sorted(pids, key=self._sort_key(), reverse=self._descending)
+            self._order[parent_pid] = order
+        return order
+        
+    def _child_count(self, parent_pid):
+        tree = self._tree
+        return len(tree.roots) if parent_pid is None else len(tree.children(parent_pid))
+        
+    def _parent_index(self, parent_pid):
+        if parent_pid is None:
+            return QModelIndex()
+        return self.createIndex(self._row_of(parent_pid), 0, parent_pid)
+        
+    def _position(self, parent_pid, pid):
+        """Строка pid среди детей parent_pid до структурного шага"""
+        rows = self._rows.get(parent_pid)
+        if rows is not None:
+            return rows[pid]
+        # Порядок вычисляется и для свернутых узлов: представление может
+        # запросить его, получив сигнал о начале шага
+        return self._ordered(parent_pid).index(pid)
+        
+    def _take(self, parent_pid, row):
+        """Убирает строку row из вычисленного порядка детей parent_pid"""
+        order = self._order.get(parent_pid)
+        if order is not None:
+            pid = order.pop(row)
+            rows = self._rows.get(parent_pid)
+            if rows is not None:
+                del rows[pid]
+                rows.update(zip(order[row:], range(row, len(order))))
+        
+    def _put(self, parent_pid, pids):
+        """Добавляет pids в конец вычисленного порядка детей parent_pid"""
+        order = self._order.get(parent_pid)
+        if order is not None:
+            rows = self._rows.get(parent_pid)
+            if rows is not None:
+                rows.update(zip(pids, range(len(order), len(order) + len(pids))))
+            order.extend(pids)
+        
+    def _row_of(self, pid):
+        parent_pid = self._tree.parent(pid)
+        rows = self._rows.get(parent_pid)
+        if rows is None:
+            order = self._ordered(parent_pid)
+            rows = self._rows[parent_pid] = dict(zip(order, range(len(order))))
+        return rows[pid]
+        
+    def index(self, row, column, parent=QModelIndex()):
+        parent_pid = parent.internalId() if parent.isValid() else None
+        order = self._ordered(parent_pid)
+        if 0 <= row < len(order) and 0 <= column < len(self.HEADERS):
+            return self.createIndex(row, column, order[row])
+        return QModelIndex()
+        
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent_pid = self._tree.parent(index.internalId())
+        if parent_pid is None:
+            return QModelIndex()
+        return self.createIndex(self._row_of(parent_pid), 0, parent_pid)
+        
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self._tree.roots)
+        if parent.column() > 0:
+            return 0
+        return len(self._tree.children(parent.internalId()))
+        
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+        
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+        
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        pid = index.internalId()
+        if role == self.PID_ROLE:
+            return pid
+        if pid not in self._tree:
+            return None
+        col = index.column()
+        
+        if role == Qt.DisplayRole:
+            if col == 0:
+                table, row = self._source(pid)
+                return table.name_of(row)
+            # Суммы поддерживаются прибавлением разниц, отбрасываем погрешность ниже нуля
+            value = max(self._tree.value(pid, col - 1), 0)
+            if col == 1:
+                return f"{value:.1f}%"
+            if col == 2:
+                return f"{value / (1024*1024):.1f} МБ"
+            return f"{value:.3f} МБ/с"
+        
+        if role == Qt.ToolTipRole:
+            cpu, rss, disk, network = self._tree.own(pid)
+            lines = [f"PID {pid}", f"Сам процесс: ЦП {cpu:.1f}%, память {rss / (1024*1024):.1f} МБ, "
+                                   f"диск {disk:.3f} МБ/с, сеть {network:.3f} МБ/с"]
+            lines.extend(_baseline_lines(self.statistics, pid))
+            return "\n".join(lines)
+        
+        if role == Qt.ForegroundRole and col == 0:
+            table, row = self._source(pid)
+            if table.name_of(row) in SYSTEM_PROCESS_NAMES or pid == 0 or pid == 4:
+                return self._system_color
+            return self._normal_color
+        
+        return None
+        
+    def set_dark_theme(self, is_dark):
+        self._system_color = QColor("#2d89ef" if is_dark else "#0078d7")
+        self._normal_color = QColor("#ffffff" if is_dark else "#000000")
+        self._repaint()
+        
+    def _repaint(self):
+        # Представление перерисовывает видимую область целиком, включая раскрытые узлы
+        roots = len(self._tree.roots)
+        if roots:
+            self.dataChanged.emit(self.index(0, 0), self.index(roots - 1, len(self.HEADERS) - 1))
+            
+    def sort(self, column, order=Qt.AscendingOrder):
+        def change():
+            self._sort_column = column
+            self._descending = order == Qt.DescendingOrder
+        self._relayout(change)
+        
+    def _relayout(self, change=None, parents=None):
+        """Выполняет change() внутри layoutAboutToBeChanged/layoutChanged и
+        сбрасывает порядок детей parents (None - всех узлов), перенося
+        постоянные индексы (выделение, раскрытые узлы) вслед за их PID"""
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        pids = [i.internalId() for i in persistent]
+        if change is not None:
+            change()
+        if parents is None:
+            self._order.clear()
+            self._rows.clear()
+        else:
+            for parent_pid in parents:
+                self._order.pop(parent_pid, None)
+                self._rows.pop(parent_pid, None)
+        moved = []
+        for pid, old in zip(pids, persistent):
+            if pid in self._tree:
+                moved.append(self.createIndex(self._row_of(pid), old.column(), pid))
+            else:
+                moved.append(QModelIndex())
+        self.changePersistentIndexList(persistent, moved)
+        self.layoutChanged.emit()
+        
+    def reset(self, table, generation):
+        """Полностью перестраивает дерево по снимку"""
+        self.beginResetModel()
+        self._table = table
+        self._tree.rebuild(table)
+        self._order.clear()
+        self._rows.clear()
+        self.generation = generation
+        self.endResetModel()
+        
+    def apply_delta(self, table, delta):
+        """Применяет дельту к дереву: строки вставляются, удаляются и переносятся
+        по шагам дерева, затем чинится порядок детей, где он нарушился"""
+        tree = self._tree
+        steps = len(delta.added) + len(delta.removed)
+        if steps * (len(self.persistentIndexList()) + TREE_SIGNAL_COST) > len(table):
+            # Каждый сигнал строк Qt обходит все постоянные индексы (раскрытые
+            # узлы, выделение), а смена раскладки - один раз весь снимок
+            def change():
+                self._table = table
+                tree.apply(table, delta)
+            self._relayout(change)
+            self.generation = delta.generation
+            return
+        
+        self._previous = self._table
+        self._table = table
+        notifier = _TreeRowNotifier(self)
         try:
-            return float(self.data(Qt.UserRole)) < float(other.data(Qt.UserRole))
-        except (ValueError, TypeError):
-            return self.text() < other.text()
+            tree.apply(table, delta, notifier)
+        finally:
+            self._previous = None
+        
+        # Ключ сортировки узла - имя или сумма по поддереву; сумма меняется
+        # и у всех предков изменившегося узла
+        touched = notifier.touched
+        touched.update(delta.changed)
+        parent_of = tree.parent
+        level = {parent_of(pid) for pid in touched if pid in tree}
+        parents = level | notifier.appended
+        if self._sort_column != 0:
+            while level:
+                level = {parent_of(pid) for pid in level if pid is not None}
+                level -= parents
+                parents |= level
+        
+        # Порядок сбрасывается только у вычисленных ранее родителей, чьи
+        # дети поменялись местами
+        key = self._sort_key()
+        unordered = []
+        for parent_pid in parents & self._order.keys():
+            order = self._order[parent_pid]
+            if sorted(order, key=key, reverse=self._descending) != order:
+                unordered.append(parent_pid)
+        if unordered:
+            self._relayout(parents=unordered)
+        elif delta:
+            self._repaint()
+        self.generation = delta.generation
+
+# Окна истории на вкладке "Производительность":
+# (подпись, длина окна в секундах, формат времени на оси X)
+HISTORY_VIEWS = (
+    ("1 мин", 60, "hh:mm:ss"),
+    ("1 ч", 3600, "hh:mm"),
+    ("24 ч", 86400, "hh:mm"),
+)
+
+# Ширина области графика до первой отрисовки (пиксели)
+DEFAULT_CHART_WIDTH = 600
 
 class PerformanceTab(QWidget):
     def __init__(self, parent=None):
@@ -341,15 +772,20 @@ class PerformanceTab(QWidget):
         self.init_ui()
         
     def init_data(self):
-        # Используем deque для эффективного управления размером списка
-        self.values = {
-            metric: deque(maxlen=60) 
-            for metric in ['cpu', 'memory', 'disk', 'network']
-        }
+        # История метрик фиксированного размера с агрегатами 1 с / 10 с / 1 мин
+        self.history = TimeSeriesStore(['cpu', 'memory', 'disk', 'network'])
         self.current_metric = 'cpu'
+        self.current_view = 0  # Индекс в HISTORY_VIEWS
+        self.statistics = None  # MetricStatistics для строки квантилей под графиком
+        # Нарисованные корзины графика и параметры, с которыми они построены
+        self._chart_buckets = deque()
+        self._chart_layout_key = None
+        self._visible_max = None
         self._prev_values = {}
         self._last_update = 0
-        self._update_interval = 0.5  # Обновление графика каждые 0.5 секунды
+        # График не чаще, чем обновляются системные метрики; половина периода -
+        # запас на дрожание сроков, снимки процессов сразу за системными пропускаются
+        self._update_interval = SYSTEM_REFRESH_INTERVAL / 2
         
     def init_ui(self):
         layout = QVBoxLayout(self)
@@ -418,6 +854,21 @@ class PerformanceTab(QWidget):
         right_layout = QVBoxLayout(right_panel)
         right_layout.setContentsMargins(10, 10, 10, 10)
         
+        # Кнопки выбора окна истории
+        view_panel = QHBoxLayout()
+        view_panel.addStretch()
+        self.view_buttons = []
+        for i, (label, _, _) in enumerate(HISTORY_VIEWS):
+            btn = QPushButton(label)
+            btn.setCheckable(True)
+            btn.setFixedHeight(24)
+            btn.setFont(QFont('Segoe UI', 9))
+            btn.clicked.connect(lambda checked, v=i: self.switch_view(v))
+            self.view_buttons.append(btn)
+            view_panel.addWidget(btn)
+        self.view_buttons[self.current_view].setChecked(True)
+        right_layout.addLayout(view_panel)
+        
         # График
         self.chart = QChart()
         self.chart.setAnimationOptions(QChart.NoAnimation)
@@ -438,14 +889,14 @@ class PerformanceTab(QWidget):
         self.chart.addSeries(self.series)
         
         # Настройка осей
-        self.axis_x = QValueAxis()
-        self.axis_x.setRange(0, 60)
+        self.axis_x = QDateTimeAxis()
         self.axis_x.setVisible(True)
         self.axis_x.setLabelsVisible(True)
         self.axis_x.setGridLineVisible(True)
         self.axis_x.setMinorGridLineVisible(False)
-        self.axis_x.setTitleText("Время (с)")
-        self.axis_x.setLabelFormat("%d")
+        self.axis_x.setTitleText("Время")
+        self.axis_x.setFormat(HISTORY_VIEWS[self.current_view][2])
+        self.axis_x.setTickCount(7)
         
         self.axis_y = QValueAxis()
         self.axis_y.setRange(0, 100)
@@ -472,6 +923,12 @@ class PerformanceTab(QWidget):
         chart_view.setRenderHint(QPainter.Antialiasing)
         right_layout.addWidget(chart_view)
         
+        # Обычный уровень и квантили текущей метрики
+        self.stats_label = QLabel("")
+        self.stats_label.setFont(QFont('Segoe UI', 9))
+        self.stats_label.setStyleSheet("color: #808080;")
+        right_layout.addWidget(self.stats_label)
+        
         # Информационные метки
         info_widget = QWidget()
         self.info_layout = QGridLayout(info_widget)  # Сохраняем ссылку на layout
@@ -550,63 +1007,99 @@ class PerformanceTab(QWidget):
         self.chart.setTitle(title)
         self.axis_y.setTitleText(y_label)
         
-        # Устанавливаем диапазон оси Y в зависимости от метрики
+        # Ось Y: для процентов фиксированная, для диска и сети - по видимому максимуму
         if metric in ['cpu', 'memory']:
             self.axis_y.setRange(0, 100)
-        else:
-            # Начальный диапазон для диска и сети
-            values = list(self.values[metric])
-            if values:
-                max_value = max(values)
-                if max_value > 5:
-                    # Если есть большие значения, устанавливаем диапазон под них
-                    self.axis_y.setRange(0, max(max_value * 1.2, 10))
-                else:
-                    # Для маленьких значений используем фиксированный диапазон
-                    self.axis_y.setRange(0, 5)
-            else:
-                self.axis_y.setRange(0, 5)
+        self._visible_max = None
         
         # Обновляем данные графика
         self.update_chart()
+        self.update_stats_label()
+
+    def switch_view(self, view):
+        self.current_view = view
+        for i, btn in enumerate(self.view_buttons):
+            btn.setChecked(i == view)
+        
+        self.axis_x.setFormat(HISTORY_VIEWS[view][2])
+        self.update_chart()
+
+    def _chart_layout(self, span):
+        """Параметры прореживания: (метрика, окно, ширина корзины)"""
+        resolution = self.history.series[self.current_metric].tier_for(span).resolution
+        # Не больше двух точек на пиксель ширины области графика
+        width = int(self.chart.plotArea().width()) or DEFAULT_CHART_WIDTH
+        bucket = bucket_width(resolution, span, width // 2)
+        return (self.current_metric, self.current_view, bucket)
 
     def update_chart(self):
-        with self._update_lock:
-            self.series.clear()
-            values = list(self.values[self.current_metric])
-            if not values:
+        with trace('chart_update'), self._update_lock:
+            _, span, _ = HISTORY_VIEWS[self.current_view]
+            _, times, mins, maxs, avgs, counts = self.history.window(self.current_metric, span)
+            if not times:
+                self.series.clear()
+                self._chart_buckets.clear()
                 return
             
-            # Масштабируем значения только если они очень маленькие
-            if self.current_metric in ['disk', 'network']:
-                # Находим максимальное значение для определения диапазона
-                max_value = max(values)
-                
-                # Если максимальное значение слишком маленькое, масштабируем график
-                if max_value < 0.1:
-                    if max_value <= 0:
-                        # Если нет активности, показываем прямую линию на минимальном уровне
-                        values = [0.1] * len(values)
-                    else:
-                        # Масштабируем маленькие значения для видимости
-                        scale = 0.5 / max_value
-                        values = [v * scale for v in values]
+            layout = self._chart_layout(span)
+            _, _, bucket = layout
+            buckets = self._chart_buckets  # (номер корзины, число точек, максимум)
+            
+            if layout != self._chart_layout_key or not buckets:
+                # Полная перестройка при смене метрики, окна или ширины графика
+                decimated = decimate(times, mins, maxs, avgs, counts, bucket)
+                self.series.replace([
+                    QPointF(t * 1000.0, y) for _, points, _ in decimated for t, y in points
+                ])
+                buckets.clear()
+                buckets.extend((key, len(points), peak) for key, points, peak in decimated)
+                self._chart_layout_key = layout
+            else:
+                # Последняя корзина еще накапливается: перерисовываем ее и добавляем новые
+                last_key, last_count, _ = buckets.pop()
+                self.series.removePoints(self.series.count() - last_count, last_count)
+                first = bisect_left(times, last_key * bucket)
+                decimated = decimate(
+                    times[first:], mins[first:], maxs[first:], avgs[first:], counts[first:], bucket
+                )
+                self.series.append([
+                    QPointF(t * 1000.0, y) for _, points, _ in decimated for t, y in points
+                ])
+                buckets.extend((key, len(points), peak) for key, points, peak in decimated)
                 
-                # Если значение превышает диапазон, пересчитываем шкалу
-                if max_value > self.axis_y.max():
-                    new_max = max(max_value * 1.2, 5)
-                    self.axis_y.setRange(0, new_max)
+                # Корзины, ушедшие за левый край окна, удаляем
+                first_key = int(times[0] // bucket)
+                removed = 0
+                while buckets and buckets[0][0] < first_key:
+                    removed += buckets.popleft()[1]
+                if removed:
+                    self.series.removePoints(0, removed)
             
-            # Добавляем точки на график
-            points = []
-            for i, v in enumerate(values):
-                points.append(QPointF(i, v))
+            # Сдвигаем окно оси X к последней выборке
+            self.axis_x.setRange(
+                QDateTime.fromMSecsSinceEpoch(int((times[-1] - span) * 1000)),
+                QDateTime.fromMSecsSinceEpoch(int(times[-1] * 1000))
+            )
             
-            # Устанавливаем новые точки
-            self.series.replace(points)
+            # Шкалу Y пересчитываем только при изменении видимого максимума
+            visible_max = max(peak for _, _, peak in buckets)
+            if visible_max != self._visible_max:
+                self._visible_max = visible_max
+                if self.current_metric in ['disk', 'network']:
+                    self.axis_y.setRange(0, max(visible_max * 1.2, 5))
+
+    def reset_history(self):
+        """Очищает историю графика (например, перед воспроизведением записи)"""
+        self.history = TimeSeriesStore(['cpu', 'memory', 'disk', 'network'])
+        self._last_update = 0
+        self._chart_buckets.clear()
+        self._chart_layout_key = None
+        self._visible_max = None
+        self.update_chart()
 
     def update_data(self, system_info: dict):
-        current_time = time.time()
+        # Время снимка, а не текущее: так же ведет себя воспроизведение записи
+        current_time = system_info.get('last_update') or time.time()
         
         # Проверяем интервал обновления
         if current_time - self._last_update < self._update_interval:
@@ -615,9 +1108,8 @@ class PerformanceTab(QWidget):
         with self._data_lock:
             metrics_data = self.calculate_metrics(system_info)
             
-            # Обновляем значения для всех метрик
-            for metric, value in metrics_data.items():
-                self.values[metric].append(value)
+            # Обновляем историю всех метрик
+            self.history.add(current_time, metrics_data)
             
             # Обновляем график если это текущая метрика
             if self.current_metric in metrics_data:
@@ -668,6 +1160,9 @@ class PerformanceTab(QWidget):
 
     def update_labels(self, system_info: dict, metrics_data: dict):
         with self._update_lock:
+            table = system_info.get('processes')
+            process_count = len(table) if table is not None else 0
+            
             # Обновляем метки
             new_values = {
                 'Использование': f"{metrics_data.get('cpu', 0):.1f}%",
@@ -675,9 +1170,10 @@ class PerformanceTab(QWidget):
                     f"{system_info.get('cpu_freq', {}).get('current', 0) / 1000:.1f} GHz"
                     if system_info.get('cpu_freq') else "N/A"
                 ),
-                'Процессы': str(len(system_info.get('processes', []))),
-                'Потоки': str(sum(1 for p in system_info.get('processes', []))),
-                'Дескрипторы': str(sum(1 for p in system_info.get('processes', []))),
+                'Процессы': str(process_count),
+                # Суммы колонок снимка, собранных тем же сканированием
+                'Потоки': str(table.total('threads')) if table else "0",
+                'Дескрипторы': str(table.total('handles')) if table else "0",
                 'Время работы': self._format_uptime(system_info.get('boot_time', 0))
             }
             
@@ -687,6 +1183,21 @@ class PerformanceTab(QWidget):
                     current = self.info_labels[label].text()
                     if current != value:
                         self.info_labels[label].setText(value)
+            self.update_stats_label()
+
+    def update_stats_label(self):
+        """Строка под графиком: EWMA и квантили текущей метрики за STATISTICS_SPAN"""
+        summary = self.statistics.summary(self.current_metric, STATISTICS_SPAN) if self.statistics else None
+        if summary is None or summary['p50'] is None:
+            self.stats_label.setText("")
+            return
+        unit = '%' if self.current_metric in ('cpu', 'memory') else ' МБ/с'
+        precision = 1 if unit == '%' else 3
+        text = (f"Обычно {summary['mean']:.{precision}f} ± {summary['std']:.{precision}f}{unit} · "
+                + " · ".join(f"{q} {summary[q]:.{precision}f}{unit}" for q in ('p50', 'p95', 'p99'))
+                + f" за {int(STATISTICS_SPAN // 60)} мин")
+        if self.stats_label.text() != text:
+            self.stats_label.setText(text)
 
     def _format_uptime(self, boot_time):
         if not boot_time:
@@ -747,6 +1258,9 @@ class PerformanceTab(QWidget):
         # Принудительно обновляем виджет
         self.repaint()
 
+# Колонки снимка, суммируемые по пользователям
+USER_COLUMNS = ('cpu', 'rss', 'disk', 'network')
+
 class UsersTab(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -754,10 +1268,8 @@ class UsersTab(QWidget):
         self.prev_disk_bytes = {}
         self.prev_net_bytes = {}
         self.last_update = time.time()
-        self.user_cache = {}
-        self.username_cache = {}
-        self.metrics = SystemMetrics()
-        self._current_username = getpass.getuser()
+        self.user_names = UserNames()  # Заменяется кешем источника данных в setup_collector
+        self._table = None
 
     def init_ui(self):
         layout = QVBoxLayout(self)
@@ -779,7 +1291,11 @@ class UsersTab(QWidget):
         layout.addWidget(self.table)
 
     def get_process_username(self, pid):
-        return self._current_username
+        table = self._table
+        row = table.row_of(pid) if table is not None else None
+        if row is None:
+            return None
+        return self.user_names.name(table.uid[row])
 
     def update_data(self, system_info):
         current_time = time.time()
@@ -788,48 +1304,25 @@ class UsersTab(QWidget):
 
         self.last_update = current_time
         
-        # Инициализируем статистику пользователя
-        user_stats = {
-            self._current_username: {
-                'cpu': 0.0,
-                'memory': 0,
-                'disk': 0.0,
-                'network': 0.0
-            }
-        }
-
-        # Собираем данные со всех процессов
-        total_disk_read = 0.0
-        total_disk_write = 0.0
-        total_net_sent = 0.0
-        total_net_recv = 0.0
-        
-        for proc_info in system_info.get('processes', []):
-            try:
-                # Суммируем CPU и память
-                user_stats[self._current_username]['cpu'] += proc_info.get('cpu_percent', 0)
-                user_stats[self._current_username]['memory'] += proc_info.get('memory_info', {}).get('rss', 0)
-                
-                # Суммируем диск и сеть
-                total_disk_read += proc_info.get('disk_read', 0.0)
-                total_disk_write += proc_info.get('disk_write', 0.0)
-                total_net_sent += proc_info.get('network_sent', 0.0)
-                total_net_recv += proc_info.get('network_recv', 0.0)
-            except Exception:
-                continue
-
-        # Конвертируем память в МБ
-        user_stats[self._current_username]['memory'] /= (1024 * 1024)
-        
-        # Общие значения диска и сети
-        disk_total = total_disk_read + total_disk_write
-        net_total = total_net_sent + total_net_recv
+        table = system_info.get('processes')
+        if table is None:
+            return
         
-        user_stats[self._current_username]['disk'] = disk_total
-        user_stats[self._current_username]['network'] = net_total
+        self._table = table
+        with trace('users_update'):
+            # Суммы колонок снимка по UID владельца одной группировкой
+            user_stats = {}
+            for uid, totals in table.group_totals('uid', USER_COLUMNS).items():
+                user_stats[self.user_names.name(uid)] = {
+                    'cpu': totals['cpu'],
+                    'memory': totals['rss'] / (1024 * 1024),  # Конвертируем память в МБ
+                    'disk': totals['disk'],
+                    'network': totals['network']
+                }
+            user_stats = dict(sorted(user_stats.items(), key=lambda item: item[0].lower()))
 
-        # Обновляем таблицу
-        self.update_table(user_stats)
+            # Обновляем таблицу
+            self.update_table(user_stats)
 
     def update_table(self, user_stats):
         self.table.setRowCount(len(user_stats))
@@ -850,11 +1343,115 @@ class UsersTab(QWidget):
                 elif item.text() != value:
                     item.setText(value)
 
+class DiagnosticsTab(QWidget):
+    """Длительности этапов конвейера и статистика планировщика выборок"""
+    
+    STAGE_HEADERS = ["Этап", "Замеров", "p50 (мс)", "p99 (мс)", "Макс (мс)", "Последний (мс)"]
+    SCHEDULER_HEADERS = ["Задача", "Период (мс)", "Запусков", "Пропущено",
+                         "Дрожание ср. (мс)", "Дрожание макс. (мс)"]
+    
+    def __init__(self, sampling_stats, parent=None):
+        super().__init__(parent)
+        self.sampling_stats = sampling_stats  # Функция, возвращающая статистику планировщика
+        self.init_ui()
+        
+        # Таблицы обновляются только пока вкладка видна
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(1000)
+        
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        
+        controls = QHBoxLayout()
+        self.tracing_checkbox = QCheckBox("Трассировка этапов")
+        self.tracing_checkbox.setFont(QFont('Segoe UI', 9))
+        self.tracing_checkbox.setChecked(diagnostics.TRACING)
+        self.tracing_checkbox.toggled.connect(self.set_tracing)
+        controls.addWidget(self.tracing_checkbox)
+        controls.addStretch()
+        
+        clear_button = QPushButton("Сбросить")
+        clear_button.clicked.connect(self.clear)
+        controls.addWidget(clear_button)
+        save_button = QPushButton("Сохранить отчет")
+        save_button.clicked.connect(self.save_report)
+        controls.addWidget(save_button)
+        layout.addLayout(controls)
+        
+        self.stage_table = self._create_table(self.STAGE_HEADERS)
+        layout.addWidget(self.stage_table, 2)
+        self.scheduler_table = self._create_table(self.SCHEDULER_HEADERS)
+        layout.addWidget(self.scheduler_table, 1)
+        
+    def _create_table(self, headers):
+        table = QTableWidget()
+        table.setFont(QFont('Segoe UI', 9))
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        header = table.horizontalHeader()
+        header.setFont(QFont('Segoe UI', 9))
+        for i in range(len(headers)):
+            header.setSectionResizeMode(i, QHeaderView.Stretch)
+        return table
+        
+    def set_tracing(self, enabled):
+        diagnostics.TRACING = enabled
+        self.refresh()
+        
+    def clear(self):
+        diagnostics.SPANS.clear()
+        self.refresh()
+        
+    def _fill(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                text = f"{value:.3f}" if isinstance(value, float) else str(value)
+                item = table.item(row, col)
+                if item is None:
+                    table.setItem(row, col, QTableWidgetItem(text))
+                elif item.text() != text:
+                    item.setText(text)
+        
+    def refresh(self):
+        if not self.isVisible():
+            return
+        
+        stats = diagnostics.SPANS.stats()
+        self._fill(self.stage_table, [
+            (stage, s['count'], s['p50_ms'], s['p99_ms'], s['max_ms'], s['last_ms'])
+            for stage, s in ((stage, stats[stage]) for stage in diagnostics.STAGES if stage in stats)
+        ])
+        self._fill(self.scheduler_table, [
+            (task, s['interval_ms'], s['runs'], s['missed'], s['jitter_avg_ms'], s['jitter_max_ms'])
+            for task, s in self.sampling_stats().items()
+        ])
+        
+    def save_report(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Сохранить отчет", "diagnostics.txt", "Текстовые файлы (*.txt)"
+        )
+        if not path:
+            return
+        try:
+            diagnostics.dump_report(path, {'Планировщик выборок': self.sampling_stats()})
+        except OSError as e:
+            debug_print(f"Не удалось сохранить отчет {path}: {e}")
+
+
 class TaskManagerWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, hub=None, alerts=None):
         super().__init__()
         self.is_dark_theme = False
+        self.hub = hub  # None - общий MetricsHub процесса
+        self.alerts = alerts  # AlertEngine или None - без оповещений
+        self.statistics = MetricStatistics()
+        self.tray_icon = None
         self.data_collector = None
+        self.replaying = False
         
         # Инициализируем UI
         self.init_ui()
@@ -869,27 +1466,115 @@ class TaskManagerWindow(QMainWindow):
         
     def update_window_title(self):
         """Обновляет заголовок окна с количеством процессов"""
+        if self.replaying:
+            return  # Заголовок обновляется снимками записи
         try:
-            if self.data_collector and self.data_collector._cache:
-                process_count = len(self.data_collector._cache.get('processes', []))
+            snapshot = self.data_collector.hub.latest() if self.data_collector else None
+            if snapshot is not None and snapshot.generation:
+                process_count = len(snapshot.processes)
                 self.setWindowTitle(f"Диспетчер задач - {process_count} процессов")
         except:
             self.setWindowTitle("Диспетчер задач")
         
+    def start_replay(self, reader, speed=1.0, start=None):
+        """Воспроизводит журнал снимков вместо живых данных.
+        
+        speed - множитель скорости относительно записи; 0 - без пауз.
+        """
+        # Живой сбор останавливаем, чтобы его снимки не смешивались с записью
+        if self.data_collector is not None and not self.replaying:
+            self.data_collector.snapshot_ready.disconnect(self.on_snapshot_ready)
+            self.data_collector.stop()
+        self.replaying = True
+        self.replay_speed = speed
+        self._replay_frames = reader.frames(start)
+        self._replay_next = next(self._replay_frames, None)
+        
+        # Первый снимок записи перестраивает таблицу и историю с нуля
+        self.process_model.generation = None
+        self.process_tree_model.generation = None
+        self._shown_processes = None
+        self.performance_tab.reset_history()
+        self.set_statistics(MetricStatistics())
+        
+        self._replay_timer = QTimer(self)
+        self._replay_timer.setSingleShot(True)
+        self._replay_timer.timeout.connect(self._replay_step)
+        self._replay_timer.start(0)
+        
+    def _replay_step(self):
+        snapshot = self._replay_next
+        if snapshot is None:
+            debug_print("Воспроизведение журнала завершено")
+            return
+        self.statistics.update(snapshot)
+        self.update_data(snapshot.as_dict())
+        
+        # Следующий снимок - через записанный интервал с учетом скорости
+        self._replay_next = next(self._replay_frames, None)
+        if self._replay_next is not None:
+            delay = 0.0
+            if self.replay_speed > 0:
+                delay = (self._replay_next.timestamp - snapshot.timestamp) / self.replay_speed
+            self._replay_timer.start(int(max(0.0, delay) * 1000))
+        
+    def set_statistics(self, statistics):
+        """Подключает статистику метрик к вкладкам"""
+        self.statistics = statistics
+        self.process_model.statistics = statistics
+        self.process_tree_model.statistics = statistics
+        self.performance_tab.statistics = statistics
+        
     def setup_collector(self):
-        self.data_collector = DataCollector(self)
-        self.data_collector.data_updated.connect(self.update_data)
+        self.set_statistics(self.statistics)
+        self.data_collector = DataCollector(self, self.hub, self.alerts, self.statistics)
+        self.users_tab.user_names = self.data_collector.metrics.user_names
+        self.data_collector.snapshot_ready.connect(self.on_snapshot_ready)
+        self.data_collector.alerts_raised.connect(self.on_alerts)
         self.data_collector.start()
         
+    def on_alerts(self, events):
+        """Показывает сработавшие оповещения уведомлением рабочего стола"""
+        firing = [event for event in events if event.state == FIRING]
+        if not firing:
+            return
+        lines = [event.describe() for event in firing[:ALERT_NOTIFICATION_LINES]]
+        if len(firing) > ALERT_NOTIFICATION_LINES:
+            lines.append(f"и еще {len(firing) - ALERT_NOTIFICATION_LINES}")
+        if self.tray_icon is None and QSystemTrayIcon.isSystemTrayAvailable():
+            self.tray_icon = QSystemTrayIcon(self.style().standardIcon(QStyle.SP_MessageBoxWarning), self)
+            self.tray_icon.show()
+        if self.tray_icon is not None:
+            self.tray_icon.showMessage("Оповещения диспетчера задач", "\n".join(lines),
+                                       QSystemTrayIcon.Warning)
+        else:
+            # Без области уведомлений - в строке состояния окна
+            self.statusBar().showMessage("; ".join(lines), 30000)
+        
     def closeEvent(self, event):
         self.data_collector.stop()
         super().closeEvent(event)
         
+    def changeEvent(self, event):
+        # Свернутое окно не требует частых выборок
+        if event.type() == QEvent.WindowStateChange and self.data_collector is not None:
+            self.data_collector.set_view_state(minimized=self.isMinimized())
+        super().changeEvent(event)
+        
+    def on_tab_changed(self, index):
+        # Список процессов нужен вкладкам "Процессы" и "Пользователи"
+        if self.data_collector is not None:
+            self.data_collector.set_view_state(
+                processes_visible=self.tab_widget.widget(index) is not self.performance_tab
+            )
+        
     def init_ui(self):
         self.setWindowTitle("Диспетчер задач")
         self.setGeometry(100, 100, 1000, 600)
         self.sort_column = 0
         self.sort_order = Qt.AscendingOrder
+        self.tree_mode = False
+        self._shown_processes = None  # (снимок, поколение) последнего обновления
 
         # Создание центрального виджета
         central_widget = QWidget()
@@ -904,20 +1589,56 @@ class TaskManagerWindow(QMainWindow):
         process_tab = QWidget()
         process_layout = QVBoxLayout(process_tab)
 
+        # Модель процессов сама сортирует и фильтрует строки, прокси не нужна
+        self.process_model = ProcessTableModel(self)
+        
+        # Поиск по мере ввода: модель сужается по индексу поиска, а не перебором строк
+        self.search_edit = QLineEdit()
+        self.search_edit.setFont(QFont('Segoe UI', 9))
+        self.search_edit.setPlaceholderText("Поиск по имени, PID или командной строке")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.process_model.set_filter)
+        
         # Создание таблицы
-        self.table = QTableWidget()
+        self.table = QTableView()
         self.table.setFont(QFont('Segoe UI', 9))
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels([
-            "Имя", "ЦП", "Память", "Диск", "Сеть"
-        ])
+        self.table.setModel(self.process_model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        
+        # Фиксированная высота строк: представлению не нужно измерять каждую строку
+        vertical_header = self.table.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.Fixed)
+        vertical_header.setDefaultSectionSize(24)
         
         # Настройка таблицы
         header = self.table.horizontalHeader()
         header.sectionClicked.connect(self.on_header_clicked)
+        header.setSortIndicatorShown(True)
         header.setFont(QFont('Segoe UI', 9))
         for i in range(5):
             header.setSectionResizeMode(i, QHeaderView.Stretch)
+        self.process_model.sort(self.sort_column, self.sort_order)
+        header.setSortIndicator(self.sort_column, self.sort_order)
+        
+        # Дерево процессов с суммами по поддеревьям, скрыто до переключения
+        self.process_tree_model = ProcessTreeModel(self)
+        self.tree_view = QTreeView()
+        self.tree_view.setFont(QFont('Segoe UI', 9))
+        self.tree_view.setModel(self.process_tree_model)
+        self.tree_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tree_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tree_view.setUniformRowHeights(True)
+        tree_header = self.tree_view.header()
+        tree_header.setSectionsClickable(True)
+        tree_header.sectionClicked.connect(self.on_header_clicked)
+        tree_header.setSortIndicatorShown(True)
+        tree_header.setFont(QFont('Segoe UI', 9))
+        for i in range(5):
+            tree_header.setSectionResizeMode(i, QHeaderView.Stretch)
+        self.process_tree_model.sort(self.sort_column, self.sort_order)
+        tree_header.setSortIndicator(self.sort_column, self.sort_order)
+        self.tree_view.hide()
         
         # Нижняя панель с кнопками
         bottom_panel = QWidget()
@@ -933,11 +1654,20 @@ class TaskManagerWindow(QMainWindow):
         kill_button.setFont(QFont('Segoe UI', 9))
         kill_button.clicked.connect(self.kill_selected_process)
         
+        # Переключение между списком и деревом процессов
+        self.tree_button = QPushButton("Дерево процессов")
+        self.tree_button.setFont(QFont('Segoe UI', 9))
+        self.tree_button.setCheckable(True)
+        self.tree_button.toggled.connect(self.set_tree_mode)
+        
         bottom_layout.addWidget(self.theme_button)
+        bottom_layout.addWidget(self.tree_button)
         bottom_layout.addStretch()
         bottom_layout.addWidget(kill_button)
         
+        process_layout.addWidget(self.search_edit)
         process_layout.addWidget(self.table)
+        process_layout.addWidget(self.tree_view)
         process_layout.addWidget(bottom_panel)
         
         # Вкладка производительности
@@ -946,18 +1676,22 @@ class TaskManagerWindow(QMainWindow):
         # Вкладка пользователей
         self.users_tab = UsersTab()
         
+        # Вкладка диагностики
+        self.diagnostics_tab = DiagnosticsTab(
+            lambda: self.data_collector.sampling_stats() if self.data_collector else {}
+        )
+        
         # Добавление вкладок
         self.tab_widget.addTab(process_tab, "ПРОЦЕССЫ")
         self.tab_widget.addTab(self.performance_tab, "ПРОИЗВОДИТЕЛЬНОСТЬ")
         self.tab_widget.addTab(self.users_tab, "ПОЛЬЗОВАТЕЛИ")
+        self.tab_widget.addTab(self.diagnostics_tab, "ДИАГНОСТИКА")
         
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
         main_layout.addWidget(self.tab_widget)
 
         # Применяем тему
         self.apply_theme()
-        
-        # Инициализируем пустую таблицу
-        self.table.setRowCount(0)
 
     def toggle_theme(self):
         self.is_dark_theme = not self.is_dark_theme
@@ -979,17 +1713,17 @@ class TaskManagerWindow(QMainWindow):
                     background-color: #1e1e1e;
                     color: #ffffff;
                 }
-                QTableWidget {
+                QTableView, QTreeView {
                     background-color: #1e1e1e;
                     color: #ffffff;
                     gridline-color: #333333;
                     border: none;
                 }
-                QTableWidget::item {
+                QTableView::item, QTreeView::item {
                     padding: 5px;
                     border-bottom: 1px solid #333333;
                 }
-                QTableWidget::item:selected {
+                QTableView::item:selected, QTreeView::item:selected {
                     background-color: #094771;
                     color: #ffffff;
                 }
@@ -1011,6 +1745,12 @@ class TaskManagerWindow(QMainWindow):
                 QPushButton:hover {
                     background-color: #3d3d3d;
                 }
+                QLineEdit {
+                    background-color: #1e1e1e;
+                    color: #ffffff;
+                    border: 1px solid #3d3d3d;
+                    padding: 4px;
+                }
                 QTabWidget::pane {
                     border-top: 1px solid #333333;
                 }
@@ -1034,6 +1774,8 @@ class TaskManagerWindow(QMainWindow):
             
             # Обновляем тему для вкладки производительности
             self.performance_tab.update_theme(True)
+            self.process_model.set_dark_theme(True)
+            self.process_tree_model.set_dark_theme(True)
             
         else:
             self.theme_button.setText("🌙")
@@ -1049,17 +1791,17 @@ class TaskManagerWindow(QMainWindow):
                     background-color: #ffffff;
                     color: #000000;
                 }
-                QTableWidget {
+                QTableView, QTreeView {
                     background-color: #ffffff;
                     color: #000000;
                     gridline-color: #e0e0e0;
                     border: none;
                 }
-                QTableWidget::item {
+                QTableView::item, QTreeView::item {
                     padding: 5px;
                     border-bottom: 1px solid #e0e0e0;
                 }
-                QTableWidget::item:selected {
+                QTableView::item:selected, QTreeView::item:selected {
                     background-color: #cce8ff;
                     color: #000000;
                 }
@@ -1081,6 +1823,12 @@ class TaskManagerWindow(QMainWindow):
                 QPushButton:hover {
                     background-color: #f5f5f5;
                 }
+                QLineEdit {
+                    background-color: #ffffff;
+                    color: #000000;
+                    border: 1px solid #e0e0e0;
+                    padding: 4px;
+                }
                 QTabWidget::pane {
                     border-top: 1px solid #e0e0e0;
                 }
@@ -1104,6 +1852,8 @@ class TaskManagerWindow(QMainWindow):
             
             # Обновляем тему для вкладки производительности
             self.performance_tab.update_theme(False)
+            self.process_model.set_dark_theme(False)
+            self.process_tree_model.set_dark_theme(False)
             
         # Принудительно обновляем все виджеты
         self.repaint()
@@ -1116,182 +1866,74 @@ class TaskManagerWindow(QMainWindow):
         else:
             self.sort_column = logical_index
             self.sort_order = Qt.AscendingOrder
-        self.table.sortItems(self.sort_column, self.sort_order)
+        self.process_model.sort(self.sort_column, self.sort_order)
+        self.process_tree_model.sort(self.sort_column, self.sort_order)
+        self.table.horizontalHeader().setSortIndicator(self.sort_column, self.sort_order)
+        self.tree_view.header().setSortIndicator(self.sort_column, self.sort_order)
+        
+    def set_tree_mode(self, enabled):
+        """Показывает дерево процессов вместо списка или обратно"""
+        self.tree_mode = enabled
+        self.table.setVisible(not enabled)
+        self.tree_view.setVisible(enabled)
+        # Поиск фильтрует только список процессов
+        self.search_edit.setEnabled(not enabled)
+        # Скрытая модель не обновлялась: перестраиваем ее по последнему снимку
+        if self._shown_processes is not None:
+            table, generation = self._shown_processes
+            model = self.process_tree_model if enabled else self.process_model
+            if model.generation != generation:
+                model.reset(table, generation)
 
     def update_process_list(self, system_info: dict):
-        processes = system_info.get('processes', [])
-        if not processes:
+        table = system_info.get('processes')
+        if not table:
             return
             
-        # Обновляем заголовок с количеством процессов
-        self.setWindowTitle(f"Диспетчер задач - {len(processes)} процессов")
+        # Обновляется только видимое представление: список или дерево
+        model = self.process_tree_model if self.tree_mode else self.process_model
+        generation = system_info.get('process_generation')
+        if generation is not None and generation == model.generation:
+            return  # Снимок уже отображен
             
-        # Сохраняем текущие процессы и их порядок
-        current_processes = {}
-        for row in range(self.table.rowCount()):
-            try:
-                item = self.table.item(row, 0)
-                if item:
-                    pid = item.data(Qt.UserRole + 1)
-                    if pid:
-                        current_processes[pid] = row
-            except Exception as e:
-                debug_print(f"Error reading current process: {e}")
-                continue
-            
-        # Создаем список процессов для отображения
-        process_list = []
-        new_processes = []
-        
-        # Системные процессы и их PID
-        system_processes = {
-            "System": 4,
-            "Registry": 8,
-            "smss.exe": None,  # Session Manager Subsystem
-            "csrss.exe": None,  # Client Server Runtime Subsystem
-            "wininit.exe": None,  # Windows Initialization Process
-            "services.exe": None,  # Services Control Manager
-            "svchost.exe": None,  # Service Host
-            "lsass.exe": None,  # Local Security Authority Subsystem Service
-            "winlogon.exe": None,  # Windows Logon Process
-            "explorer.exe": None  # Windows Explorer
-        }
-        
-        for proc_info in processes:
-            try:
-                if not isinstance(proc_info, dict):
-                    continue
-                    
-                name = proc_info.get('name', '')
-                pid = proc_info.get('pid', 0)
-                
-                if not name or not pid:
-                    continue
-                    
-                # Убираем цифры из скобок в имени процесса
-                display_name = name
-                
-                # Проверяем, является ли процесс системным
-                is_system = name in system_processes or pid == 0 or pid == 4
-                
-                cpu = proc_info.get('cpu_percent', 0.0)
-                memory = proc_info.get('memory_info', {}).get('rss', 0) / (1024*1024)
-                
-                # Получаем данные о диске и сети напрямую - суммируем для более заметных значений
-                disk_read = proc_info.get('disk_read', 0.0)
-                disk_write = proc_info.get('disk_write', 0.0)
-                disk_total = disk_read + disk_write  # Уже в МБ/с
-                
-                net_sent = proc_info.get('network_sent', 0.0)
-                net_recv = proc_info.get('network_recv', 0.0)
-                net_total = net_sent + net_recv  # Уже в МБ/с
-                
-                process_data = {
-                    'pid': pid,
-                    'name': display_name,
-                    'cpu': cpu,
-                    'memory': memory,
-                    'disk': disk_total,
-                    'network': net_total,
-                    'is_system': is_system
-                }
-                
-                # Если процесс уже был в списке, сохраняем его позицию
-                if pid in current_processes:
-                    process_data['position'] = current_processes[pid]
-                    process_list.append(process_data)
-                else:
-                    # Новые процессы добавляем в отдельный список
-                    process_data['position'] = 9999  # Высокое значение для сортировки в конец
-                    new_processes.append(process_data)
-            except Exception as e:
-                debug_print(f"Error processing process info: {e}")
-                continue
-                
-        # Сортируем существующие процессы по их текущим позициям
-        process_list.sort(key=lambda x: x['position'])
-        
-        # Добавляем новые процессы в конец
-        process_list.extend(new_processes)
-        
-        # Применяем текущую сортировку, если она есть
-        def get_key_func(col):
-            if col == 0:
-                return lambda x: x['name']  # Сортировка по имени
-            elif col == 1:
-                return lambda x: x['cpu']   # Сортировка по CPU
-            elif col == 2:
-                return lambda x: x['memory']  # Сортировка по памяти
-            elif col == 3:
-                return lambda x: x['disk']    # Сортировка по диску
-            elif col == 4:
-                return lambda x: x['network']  # Сортировка по сети
+        # Обновляем заголовок с количеством процессов
+        self.setWindowTitle(f"Диспетчер задач - {len(table)} процессов")
+        self._shown_processes = (table, generation)
+        
+        # Применяем только изменения, если дельта построена от отображенного снимка
+        with trace('table_update'):
+            delta = system_info.get('delta')
+            if delta is not None and delta.base_generation == model.generation:
+                model.apply_delta(table, delta)
             else:
-                return lambda x: x['position']  # Сортировка по позиции
-        
-        key_func = get_key_func(self.sort_column)
-        reverse = self.sort_order == Qt.DescendingOrder
-        process_list.sort(key=key_func, reverse=reverse)
-        
-        # Обновляем таблицу, сохраняя порядок
-        if self.table.rowCount() < len(process_list):
-            self.table.setRowCount(len(process_list))
-            
-        for row, proc in enumerate(process_list):
-            try:
-                items = [
-                    (0, f"{proc['name']}", proc['name']),
-                    (1, f"{proc['cpu']:.1f}%", proc['cpu']),
-                    (2, f"{proc['memory']:.1f} МБ", proc['memory']),
-                    (3, f"{proc['disk']:.3f} МБ/с", proc['disk']),
-                    (4, f"{proc['network']:.3f} МБ/с", proc['network'])
-                ]
-                
-                for col, text, value in items:
-                    item = self.table.item(row, col)
-                    if item is None:
-                        item = NumericTableWidgetItem(text)
-                        self.table.setItem(row, col, item)
-                    elif item.text() != text:
-                        item.setText(text)
-                    item.setData(Qt.UserRole, value)
-                    
-                    # Сохраняем PID в первой колонке для последующего определения позиции
-                    if col == 0:
-                        item.setData(Qt.UserRole + 1, proc['pid'])
-                        
-                        # Задаем цвет для системных процессов
-                        if proc.get('is_system', False):
-                            # Используем разные цвета для разных тем
-                            color = QColor("#2d89ef" if self.is_dark_theme else "#0078d7")
-                            item.setForeground(color)
-                        else:
-                            # Сбрасываем цвет для обычных процессов
-                            item.setForeground(QColor("#ffffff" if self.is_dark_theme else "#000000"))
-            except Exception as e:
-                debug_print(f"Error updating table row {row}: {e}")
-                continue
+                model.reset(table, generation)
 
     def kill_selected_process(self):
-        selected_items = self.table.selectedItems()
-        if selected_items:
-            row = selected_items[0].row()
-            # Берем PID из дополнительных данных, которые мы сохраняем в Qt.UserRole + 1
-            # вместо попытки извлечь его из текста
-            item = self.table.item(row, 0)
-            pid = item.data(Qt.UserRole + 1)
+        view = self.tree_view if self.tree_mode else self.table
+        selected_rows = view.selectionModel().selectedRows()
+        if selected_rows:
+            # Берем PID из модели по роли PID_ROLE вместо попытки извлечь его из текста
+            pid = selected_rows[0].data(ProcessTableModel.PID_ROLE)
+            if pid and self.replaying:
+                debug_print(f"Процесс {pid} из записи, завершение недоступно")
+                return
             if pid:
                 try:
-                    handle = ctypes.windll.kernel32.OpenProcess(
-                        PROCESS_TERMINATE, False, pid
-                    )
-                    if handle:
-                        ctypes.windll.kernel32.TerminateProcess(handle, -1)
-                        ctypes.windll.kernel32.CloseHandle(handle)
+                    self.data_collector.metrics.terminate_process(pid)
                 except Exception as e:
                     debug_print(f"Ошибка при попытке завершить процесс {pid}: {e}")
 
+    def on_snapshot_ready(self):
+        # Забираем новейший снимок; вытесненные до этого момента пропускаются
+        snapshot = self.data_collector.take_snapshot()
+        if snapshot is not None:
+            self.update_data(snapshot.as_dict())
+        
     def update_data(self, system_info: dict):
+        # Время от снимка до обработки в GUI-потоке: очередь сигналов и занятость GUI
+        if not self.replaying and system_info.get('last_update'):
+            record_span('signal_latency', time.time() - system_info['last_update'])
+        
         # Обновляем все вкладки с новыми данными
         self.performance_tab.update_data(system_info)
         self.users_tab.update_data(system_info)
@@ -1299,6 +1941,24 @@ class TaskManagerWindow(QMainWindow):
 
 
 if __name__ == '__main__':
+    # Дочерний процесс сборщика в собранном exe запускается этим же файлом
+    multiprocessing.freeze_support()
+    
+    parser = argparse.ArgumentParser(description="Диспетчер задач")
+    parser.add_argument('--record', help="записывать снимки в журнал")
+    parser.add_argument('--replay', help="воспроизвести журнал снимков вместо живых данных")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="скорость воспроизведения (0 - без пауз)")
+    parser.add_argument('--collector-process', action='store_true',
+                        help="собирать метрики в отдельном процессе (разделяемая память)")
+    add_exporter_arguments(parser)
+    add_alert_arguments(parser)
+    args, qt_args = parser.parse_known_args()
+    try:
+        alerts = create_alert_engine(args)
+    except (OSError, ValueError) as e:
+        parser.error(f"оповещения: {e}")
+    
     # Проверяем запущено ли приложение с правами администратора
     def is_admin():
         try:
@@ -1307,15 +1967,38 @@ if __name__ == '__main__':
             return False
     
     # Если не запущено с правами администратора, перезапускаем с запросом прав
-    if not is_admin():
+    if sys.platform == 'win32' and not args.replay and not is_admin():
         debug_print("Перезапуск с правами администратора для доступа ко всем процессам...")
         ctypes.windll.shell32.ShellExecuteW(
             None, "runas", sys.executable, " ".join(sys.argv), None, 1
         )
         sys.exit(0)
     
+    if args.collector_process and not args.replay:
+        hub = MetricsHub(create_remote_metrics(intervals=SAMPLING_INTERVALS))
+    else:
+        hub = MetricsHub.instance()
+    
+    if args.record:
+        recorder = SnapshotLogWriter(args.record)
+        hub.subscribe(recorder.append)
+    
+    exporter = None
+    if not args.replay:
+        try:
+            exporter = start_exporter(hub, args)
+        except (OSError, ValueError) as e:
+            debug_print(f"Экспорт метрик не запущен: {e}")
+    
     debug_print("Запуск диспетчера задач с правами администратора")
-    app = QApplication(sys.argv)
-    window = TaskManagerWindow()
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = TaskManagerWindow(hub, alerts)
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    if args.replay:
+        window.start_replay(SnapshotLogReader(args.replay), args.speed)
+    exit_code = app.exec_()
+    if exporter is not None:
+        exporter.close()
+    if hub.metrics.backend is not None:
+        hub.metrics.backend.close()
+    sys.exit(exit_code)
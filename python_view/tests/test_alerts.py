@@ -0,0 +1,120 @@
+import pytest
+
+from alerts import FIRING, RESOLVED, AlertEngine, AlertRule
+from metrics_hub import MetricsSnapshot
+from process_table import NamePool, ProcessDelta, ProcessTable, diff_tables
+
+
+def test_parse_process_rule():
+    rule = AlertRule.parse('cpu_hot: process.cpu >= 80 for 30s')
+    assert (rule.name, rule.scope, rule.metric, rule.op) == ('cpu_hot', 'process', 'cpu', '>=')
+    assert rule.threshold == 80.0
+    assert rule.duration == 30.0
+    assert rule.aggregate is None
+    assert rule.text == 'process.cpu >= 80 for 30s'
+
+
+def test_parse_system_rule_with_aggregate():
+    rule = AlertRule.parse('system.memory.percent avg > 90 for 2m')
+    assert rule.name == 'system.memory.percent'
+    assert (rule.scope, rule.metric, rule.aggregate) == ('system', 'memory.percent', 'avg')
+    assert rule.duration == 120.0
+
+
+def test_parse_multiplier():
+    rule = AlertRule.parse('process.rss > 1.5G')
+    assert rule.threshold == 1.5 * 1024 ** 3
+    assert rule.duration == 0.0
+
+
+@pytest.mark.parametrize('text', [
+    'process.cpu => 5',
+    'process.name > 5',
+    'process.cpu avg > 5',
+    'system.cpu_percent > 5 for 1d',
+])
+def test_parse_rejects(text):
+    with pytest.raises(ValueError):
+        AlertRule.parse(text)
+
+
+def _snapshot(generation, timestamp, table, previous, cpu_percent=0.0):
+    added, removed, changed = diff_tables(previous, table)
+    return MetricsSnapshot(
+        generation, generation, timestamp, cpu_percent, {'percent': 0.0}, {}, {}, {}, 0.0, table,
+        ProcessDelta(generation, generation - 1, added, removed, changed)
+    )
+
+
+class _Feed:
+    """Последовательность снимков процессов с общим пулом имен"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.pool = NamePool()
+        self.previous = None
+        self.generation = 0
+
+    def tick(self, timestamp, cpu, cpu_percent=0.0):
+        table = ProcessTable(self.pool)
+        for pid, value in cpu.items():
+            table.append(pid, f"p{pid}", value, 0, 0.0, 0.0, 0.0, 0.0, False)
+        self.generation += 1
+        snapshot = _snapshot(self.generation, timestamp, table, self.previous, cpu_percent)
+        self.previous = table
+        return [(event.rule.name, event.state, event.pid) for event in self.engine.evaluate(snapshot)]
+
+
+def test_process_rule_holds_then_clears():
+    feed = _Feed(AlertEngine([AlertRule.parse('hot: process.cpu > 50 for 10s')]))
+    assert feed.tick(0, {1: 60, 2: 10}) == []
+    assert feed.tick(5, {1: 70, 2: 10}) == []
+    assert feed.tick(10, {1: 80, 2: 10}) == [('hot', FIRING, 1)]
+    # Уже сработавшее оповещение не повторяется
+    assert feed.tick(15, {1: 90, 2: 10}) == []
+    assert feed.tick(20, {1: 20, 2: 10}) == [('hot', RESOLVED, 1)]
+
+
+def test_process_rule_restarts_hold_after_dip():
+    feed = _Feed(AlertEngine([AlertRule.parse('hot: process.cpu > 50 for 10s')]))
+    feed.tick(0, {1: 60})
+    feed.tick(5, {1: 40})
+    assert feed.tick(8, {1: 60}) == []
+    assert feed.tick(15, {1: 60}) == []
+    assert feed.tick(18, {1: 60}) == [('hot', FIRING, 1)]
+
+
+def test_process_rules_on_one_column():
+    engine = AlertEngine([
+        AlertRule.parse('warm: process.cpu > 30'),
+        AlertRule.parse('hot: process.cpu > 60'),
+        AlertRule.parse('idle: process.cpu < 1 for 5s'),
+    ])
+    feed = _Feed(engine)
+    assert sorted(feed.tick(0, {1: 40, 2: 0.5})) == [('warm', FIRING, 1)]
+    assert sorted(feed.tick(5, {1: 70, 2: 0.5})) == [('hot', FIRING, 1), ('idle', FIRING, 2)]
+    assert sorted(feed.tick(6, {1: 10, 2: 0.5})) == [('hot', RESOLVED, 1), ('warm', RESOLVED, 1)]
+
+
+def test_process_exit_resolves():
+    feed = _Feed(AlertEngine([AlertRule.parse('hot: process.cpu > 50')]))
+    assert feed.tick(0, {1: 60, 2: 60}) == [('hot', FIRING, 1), ('hot', FIRING, 2)]
+    events = feed.engine.evaluate(_snapshot(2, 1, ProcessTable(feed.pool), feed.previous))
+    assert sorted((event.pid, event.state, event.value) for event in events) == [
+        (1, RESOLVED, None), (2, RESOLVED, None)
+    ]
+
+
+def test_skipped_generation_rechecks_whole_snapshot():
+    feed = _Feed(AlertEngine([AlertRule.parse('hot: process.cpu > 50')]))
+    feed.tick(0, {1: 10, 2: 10})
+    # Поколение пропущено: дельта не применима к состоянию движка
+    feed.generation += 1
+    assert feed.tick(1, {1: 10, 2: 90}) == [('hot', FIRING, 2)]
+
+
+def test_system_rule_holds_then_clears():
+    feed = _Feed(AlertEngine([AlertRule.parse('busy: system.cpu_percent > 90 for 4s')]))
+    assert feed.tick(0, {}, 95) == []
+    assert feed.tick(4, {}, 99) == [('busy', FIRING, None)]
+    assert feed.tick(6, {}, 50) == [('busy', RESOLVED, None)]
@@ -0,0 +1,71 @@
+import random
+
+from process_table import NamePool, ProcessDelta, ProcessTable, diff_tables, merge_deltas
+
+
+def _table(rows, pool):
+    table = ProcessTable(pool)
+    for pid, name, cpu in rows:
+        table.append(pid, name, cpu, 1024, 0.0, 0.0, 0.0, 0.0, False)
+    return table
+
+
+def test_diff_tables():
+    pool = NamePool()
+    previous = _table([(1, 'a', 1.0), (2, 'b', 2.0), (3, 'c', 3.0)], pool)
+    current = _table([(3, 'c', 3.0), (2, 'b', 5.0), (4, 'd', 0.0)], pool)
+    assert diff_tables(previous, current) == ({4}, {1}, {2})
+
+
+def test_diff_tables_without_previous():
+    current = _table([(1, 'a', 1.0), (2, 'b', 2.0)], NamePool())
+    assert diff_tables(None, current) == ({1, 2}, set(), set())
+
+
+def _apply(state, delta, values):
+    """Состояние pid -> значение после дельты; values - значения нового снимка"""
+    result = {pid: value for pid, value in state.items() if pid not in delta.removed}
+    for pid in delta.added | delta.changed:
+        result[pid] = values[pid]
+    return result
+
+
+def test_merge_deltas_matches_sequential_apply():
+    rng = random.Random(1)
+    pids = range(40)
+    first = {pid: 0 for pid in rng.sample(pids, 20)}
+    for generation in range(1, 200):
+        second = {pid: rng.randrange(3) for pid in rng.sample(pids, 20)}
+        third = {pid: rng.randrange(3) for pid in rng.sample(pids, 20)}
+        older = _delta(generation, first, second)
+        newer = _delta(generation + 1, second, third)
+        merged = merge_deltas(older, newer)
+
+        assert merged.base_generation == older.base_generation
+        assert merged.generation == newer.generation
+        assert not (merged.added & merged.removed or merged.added & merged.changed
+                    or merged.removed & merged.changed)
+        assert _apply(first, merged, third) == third
+        # Состояние, построенное последовательным применением, совпадает с итогом
+        assert _apply(_apply(first, older, second), newer, third) == third
+        first = second
+
+
+def _delta(generation, before, after):
+    added = after.keys() - before.keys()
+    removed = before.keys() - after.keys()
+    changed = {pid for pid in before.keys() & after.keys() if before[pid] != after[pid]}
+    return ProcessDelta(generation, generation - 1, added, removed, changed)
+
+
+def test_merge_deltas_reused_pid_is_changed():
+    older = ProcessDelta(2, 1, set(), {7}, set())
+    newer = ProcessDelta(3, 2, {7}, set(), set())
+    merged = merge_deltas(older, newer)
+    assert (merged.added, merged.removed, merged.changed) == (set(), set(), {7})
+
+
+def test_merge_deltas_short_lived_process_disappears():
+    older = ProcessDelta(2, 1, {7}, set(), set())
+    newer = ProcessDelta(3, 2, set(), {7}, set())
+    assert not merge_deltas(older, newer)
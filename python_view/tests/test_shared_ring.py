@@ -0,0 +1,62 @@
+import struct
+
+import pytest
+
+from shared_ring import FrameTooLarge, SharedRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing(slots=2, slot_size=64)
+    yield ring
+    ring.close()
+
+
+def test_write_read(ring):
+    assert ring.latest() == 0
+    assert ring.read(0) is None
+    number = ring.write([b'abc', memoryview(b'def')])
+    assert number == ring.latest() == 1
+    with ring.read(number) as frame:
+        assert bytes(frame) == b'abcdef'
+        assert ring.valid(number)
+
+
+def test_overwritten_frame_is_rejected(ring):
+    first = ring.write([b'first'])
+    with ring.read(first):
+        ring.write([b'second'])
+        ring.write([b'third'])  # Ячейка первого кадра
+        # Прочитанное до перезаписи не подтверждается, новое чтение не отдается
+        assert not ring.valid(first)
+        assert ring.read(first) is None
+    with ring.read(3) as frame:
+        assert bytes(frame) == b'third'
+
+
+def test_frame_being_written_is_rejected(ring):
+    number = ring.write([b'frame'])
+    with ring.read(number):
+        # Писатель начал следующий круг по этой ячейке: версия нечетная
+        offset = ring._slot_offset(number)
+        struct.pack_into('<Q', ring._buf, offset, 2 * (number + ring.slots) - 1)
+        assert not ring.valid(number)
+        assert ring.read(number) is None
+        assert ring.read(number + ring.slots) is None
+
+
+def test_reader_attaches(ring):
+    ring.write([b'shared'])
+    reader = SharedRing.attach(ring.name)
+    try:
+        assert reader.latest() == 1
+        with reader.read(1) as frame:
+            assert bytes(frame) == b'shared'
+    finally:
+        reader.close()
+
+
+def test_frame_too_large(ring):
+    with pytest.raises(FrameTooLarge):
+        ring.write([b'x' * 65])
+    assert ring.latest() == 0
@@ -0,0 +1,87 @@
+from backends import SyntheticBackend
+from metrics_hub import MetricsSnapshot
+from process_table import ProcessDelta, ProcessTable, diff_tables
+from snapshot_log import SnapshotLogReader, SnapshotLogWriter
+
+
+_FIELDS = ('pid', 'cpu', 'rss', 'disk_read', 'disk_write', 'net_sent', 'net_recv',
+           'threads', 'handles', 'is_system', 'ppid', 'uid')
+
+
+def _rows(table):
+    rows = {}
+    for row in range(len(table)):
+        values = tuple(getattr(table, field)[row] for field in _FIELDS)
+        rows[table.pid[row]] = (table.name_of(row),) + values
+    return rows
+
+
+def _snapshots(count):
+    backend = SyntheticBackend(200, churn=0.05, seed=11, users=5)
+    previous = None
+    for generation in range(1, count + 1):
+        table = ProcessTable(previous.pool if previous is not None else None)
+        backend.scan(table)
+        added, removed, changed = diff_tables(previous, table)
+        yield MetricsSnapshot(
+            generation, generation, 1000.0 + generation, generation % 100,
+            {'total': 8 << 30, 'available': 4 << 30, 'percent': 50.0},
+            {'read_bytes': 1.5, 'write_bytes': 0.5},
+            {'bytes_sent': 0.25, 'bytes_recv': 2.0},
+            {'current': 2400.0}, 900.0, table,
+            ProcessDelta(generation, generation - 1, added, removed, changed)
+        )
+        previous = table
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'metrics.log')
+    written = list(_snapshots(20))
+    writer = SnapshotLogWriter(path, keyframe_interval=8)
+    for snapshot in written:
+        writer.append(snapshot)
+    writer.close()
+
+    reader = SnapshotLogReader(path)
+    try:
+        assert len(reader) == len(written)
+        assert (reader.start_time, reader.end_time) == (written[0].timestamp, written[-1].timestamp)
+        frames = list(reader.frames())
+        assert len(frames) == len(written)
+        for original, frame in zip(written, frames):
+            assert frame.generation == original.generation
+            assert frame.timestamp == original.timestamp
+            assert frame.cpu_percent == original.cpu_percent
+            assert dict(frame.memory) == dict(original.memory)
+            assert dict(frame.network) == dict(original.network)
+            assert _rows(frame.processes) == _rows(original.processes)
+        # Дельты воспроизведения переводят предыдущий кадр в следующий
+        for previous, frame in zip(frames, frames[1:]):
+            assert frame.delta.base_generation == previous.process_generation
+            added, removed, changed = diff_tables(previous.processes, frame.processes)
+            assert frame.delta.added == added
+            assert frame.delta.removed == removed
+            assert frame.delta.changed >= changed
+    finally:
+        reader.close()
+
+
+def test_seek_and_torn_tail(tmp_path):
+    path = str(tmp_path / 'metrics.log')
+    written = list(_snapshots(20))
+    writer = SnapshotLogWriter(path, keyframe_interval=8)
+    for snapshot in written:
+        writer.append(snapshot)
+    writer.close()
+    # Оборванная последняя запись игнорируется
+    with open(path, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 3)
+
+    reader = SnapshotLogReader(path)
+    try:
+        assert len(reader) == len(written) - 1
+        frames = list(reader.frames(written[12].timestamp))
+        assert [frame.generation for frame in frames] == list(range(13, 20))
+        assert _rows(frames[0].processes) == _rows(written[12].processes)
+    finally:
+        reader.close()
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from sort_index import SortIndex
+
+
+def _order(index):
+    return [index.pid_at(position) for position in range(len(index))]
+
+
+def _expected(keys, descending, top_k=None):
+    entries = sorted((key, pid) for pid, key in keys.items())
+    if descending:
+        entries.reverse()
+    order = [pid for _, pid in entries]
+    return order if top_k is None else order[:top_k]
+
+
+def _fill(index, keys):
+    for pid, key in keys.items():
+        index.append(pid, key)
+    index.repair({})
+
+
+@pytest.mark.parametrize('descending', [False, True])
+@pytest.mark.parametrize('fraction', [0.02, 0.5])
+def test_repair_keeps_full_order(descending, fraction):
+    rng = random.Random(3)
+    keys = {pid: rng.randrange(50) for pid in range(0, 800, 4)}
+    index = SortIndex('cpu', descending)
+    _fill(index, keys)
+    assert _order(index) == _expected(keys, descending)
+
+    for _ in range(30):
+        changed = {pid: rng.randrange(50) for pid in rng.sample(list(keys), int(len(keys) * fraction))}
+        keys.update(changed)
+        index.repair(changed)
+        assert _order(index) == _expected(keys, descending)
+        for position, pid in enumerate(_order(index)):
+            assert index.position_of(pid) == position
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_repair_with_appends_and_removals(descending):
+    rng = random.Random(5)
+    keys = {pid: rng.random() for pid in range(100)}
+    index = SortIndex('cpu', descending)
+    _fill(index, keys)
+    next_pid = 100
+    for _ in range(30):
+        # Удаление по убыванию позиций, как в модели таблицы
+        gone = sorted((index.position_of(pid) for pid in rng.sample(list(keys), 5)), reverse=True)
+        for position in gone:
+            del keys[index.remove_at(position)]
+        for pid in range(next_pid, next_pid + 5):
+            keys[pid] = rng.random()
+            index.append(pid, keys[pid])
+        next_pid += 5
+        changed = {pid: rng.random() for pid in rng.sample(list(keys), 10)}
+        keys.update(changed)
+        index.repair(changed)
+        assert _order(index) == _expected(keys, descending)
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_repair_top_k(descending):
+    rng = random.Random(7)
+    keys = {pid: rng.randrange(1000) for pid in range(300)}
+    index = SortIndex('cpu', descending, top_k=20)
+    _fill(index, keys)
+    for _ in range(40):
+        changed = {pid: rng.randrange(1000) for pid in rng.sample(list(keys), 15)}
+        keys.update(changed)
+        index.repair(changed)
+        assert _order(index)[:20] == _expected(keys, descending, 20)
+        assert sorted(_order(index)) == sorted(keys)
+
+
+def test_repair_ignores_unknown_and_unchanged():
+    index = SortIndex('cpu')
+    _fill(index, {1: 3.0, 2: 1.0, 3: 2.0})
+    index.repair({2: 1.0, 99: 0.0})
+    assert _order(index) == [2, 3, 1]
+    assert 99 not in index
@@ -0,0 +1,174 @@
+"""История метрик с несколькими разрешениями.
+
+Каждый уровень - кольцевой буфер фиксированной емкости на массивах array,
+хранящий агрегаты (минимум, максимум, сумма, число выборок) за интервал
+своего разрешения. Закрытый интервал уровня добавляется в открытый интервал
+следующего, более грубого уровня, так что пики не теряются при прореживании,
+а занимаемая память не зависит от времени работы.
+"""
+from array import array
+from bisect import bisect_left
+
+
+# Уровни истории: (разрешение в секундах, число интервалов)
+DEFAULT_TIERS = (
+    (1.0, 300),      # 1 с за 5 минут
+    (10.0, 2160),    # 10 с за 6 часов
+    (60.0, 10080),   # 1 мин за 7 дней
+)
+
+
+class RollupRing:
+    """Кольцевой буфер агрегатов одного разрешения"""
+
+    __slots__ = (
+        'resolution', 'capacity', 'time', 'min', 'max', 'sum', 'count',
+        '_head', '_size', '_open'
+    )
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.time = array('d', bytes(8 * capacity))    # Начало интервала
+        self.min = array('d', bytes(8 * capacity))
+        self.max = array('d', bytes(8 * capacity))
+        self.sum = array('d', bytes(8 * capacity))
+        self.count = array('d', bytes(8 * capacity))
+        self._head = 0       # Позиция следующей записи
+        self._size = 0
+        # Открытый (еще накапливаемый) интервал: [начало, min, max, sum, count]
+        self._open = None
+
+    def __len__(self):
+        return self._size + (self._open is not None)
+
+    @property
+    def span(self) -> float:
+        """Сколько секунд истории вмещает уровень"""
+        return self.resolution * self.capacity
+
+    @property
+    def latest_time(self):
+        return self._open[0] if self._open is not None else None
+
+    def add(self, timestamp, minimum, maximum, total, count):
+        """Добавляет агрегат в открытый интервал.
+
+        Если timestamp попадает в новый интервал, прежний закрывается и
+        возвращается кортежем (начало, min, max, sum, count) для следующего
+        уровня; иначе возвращается None. Выборки старше открытого интервала
+        отбрасываются.
+        """
+        start = timestamp - timestamp % self.resolution
+        current = self._open
+        if current is not None and start == current[0]:
+            if minimum < current[1]:
+                current[1] = minimum
+            if maximum > current[2]:
+                current[2] = maximum
+            current[3] += total
+            current[4] += count
+            return None
+        if current is not None and start < current[0]:
+            return None
+
+        self._open = [start, minimum, maximum, total, count]
+        if current is None:
+            return None
+
+        head = self._head
+        self.time[head], self.min[head], self.max[head], self.sum[head], self.count[head] = current
+        self._head = (head + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+        return tuple(current)
+
+    def _chronological(self, column):
+        """Закрытые интервалы колонки в хронологическом порядке"""
+        if self._size < self.capacity:
+            return column[:self._size]
+        return column[self._head:] + column[:self._head]
+
+    def window(self, since):
+        """Интервалы, начинающиеся не раньше since, включая открытый.
+
+        Возвращает (times, mins, maxs, avgs, counts) - массивы array('d').
+        """
+        times = self._chronological(self.time)
+        first = bisect_left(times, since)
+        times = times[first:]
+        mins = self._chronological(self.min)[first:]
+        maxs = self._chronological(self.max)[first:]
+        sums = self._chronological(self.sum)[first:]
+        counts = self._chronological(self.count)[first:]
+        avgs = array('d', map(float.__truediv__, sums, counts))
+
+        current = self._open
+        if current is not None and current[0] >= since:
+            times.append(current[0])
+            mins.append(current[1])
+            maxs.append(current[2])
+            avgs.append(current[3] / current[4])
+            counts.append(current[4])
+        return times, mins, maxs, avgs, counts
+
+
+class MultiResolutionSeries:
+    """История одной метрики на нескольких уровнях разрешения"""
+
+    def __init__(self, tiers=DEFAULT_TIERS):
+        self.tiers = [RollupRing(resolution, capacity) for resolution, capacity in tiers]
+
+    def add(self, timestamp, value):
+        item = (timestamp, value, value, value, 1.0)
+        for ring in self.tiers:
+            item = ring.add(*item)
+            if item is None:
+                break
+
+    @property
+    def latest_time(self):
+        return self.tiers[0].latest_time
+
+    def tier_for(self, span) -> RollupRing:
+        """Самый подробный уровень, вмещающий span секунд"""
+        for ring in self.tiers:
+            if ring.span >= span:
+                return ring
+        return self.tiers[-1]
+
+    def window(self, span, now=None):
+        """Последние span секунд истории (по умолчанию до последней выборки).
+
+        Возвращает (resolution, times, mins, maxs, avgs, counts).
+        """
+        if now is None:
+            now = self.latest_time
+        ring = self.tier_for(span)
+        if now is None:
+            empty = array('d')
+            return ring.resolution, empty, array('d'), array('d'), array('d'), array('d')
+        return (ring.resolution,) + ring.window(now - span)
+
+
+class TimeSeriesStore:
+    """История набора метрик с общими уровнями разрешения"""
+
+    def __init__(self, metrics, tiers=DEFAULT_TIERS):
+        self.series = {metric: MultiResolutionSeries(tiers) for metric in metrics}
+
+    def add(self, timestamp, values: dict):
+        """Добавляет выборку метрик values (metric -> значение) на момент timestamp"""
+        for metric, value in values.items():
+            series = self.series.get(metric)
+            if series is not None:
+                series.add(timestamp, value)
+
+    @property
+    def latest_time(self):
+        times = [s.latest_time for s in self.series.values() if s.latest_time is not None]
+        return max(times) if times else None
+
+    def window(self, metric, span, now=None):
+        """Последние span секунд метрики: (resolution, times, mins, maxs, avgs, counts)"""
+        return self.series[metric].window(span, now)
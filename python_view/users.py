@@ -0,0 +1,62 @@
+"""Имена владельцев процессов по UID.
+
+Снимок процессов хранит только числовой UID владельца. Имя разрешается
+через кэш: к базе пользователей (pwd или источнику данных) обращаемся лишь
+при промахе, а UID, для которого имя не нашлось, повторно ищем не чаще
+раза в MISS_RETRY_INTERVAL секунд. На машине с сотнями пользователей
+разрешение имени на каждом такте - обращение к словарю.
+"""
+import time
+
+try:
+    import pwd
+except ImportError:  # Windows
+    pwd = None
+
+from process_table import UNKNOWN_UID
+
+
+# Через сколько секунд повторять поиск UID, для которого имя не нашлось
+MISS_RETRY_INTERVAL = 30.0
+
+
+def lookup_user(uid):
+    """Имя пользователя из базы pwd или None"""
+    if pwd is None or uid == UNKNOWN_UID:
+        return None
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return None
+
+
+class UserNames:
+    """Кэш uid -> имя пользователя, пополняемый при промахах"""
+
+    def __init__(self, lookup=lookup_user, clock=time.monotonic):
+        self._lookup = lookup
+        self._clock = clock
+        self._names = {}
+        self._misses = {}  # uid -> время последнего неудачного поиска
+
+    def name(self, uid) -> str:
+        name = self._names.get(uid)
+        if name is not None:
+            return name
+        now = self._clock()
+        missed = self._misses.get(uid)
+        if missed is None or now - missed >= MISS_RETRY_INTERVAL:
+            try:
+                name = self._lookup(uid)
+            except Exception:
+                name = None
+            if name:
+                self._names[uid] = name
+                self._misses.pop(uid, None)
+                return name
+            self._misses[uid] = now
+        return '?' if uid == UNKNOWN_UID else str(uid)
+
+    def clear(self):
+        self._names.clear()
+        self._misses.clear()